@@ -0,0 +1,103 @@
+# backend/benchmarks/bench_auth.py
+"""
+Benchmark des connexions concurrentes : latence des logins (p50/p99) et
+réactivité de la boucle d'événements pendant la rafale (latence de /health).
+
+Tourne en mémoire (ASGI), sur une base SQLite temporaire :
+
+    python -m backend.benchmarks.bench_auth --logins 200 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    k = min(len(values) - 1, int(round(q * (len(values) - 1))))
+    return values[k]
+
+
+def _summary(values):
+    return {
+        "n": len(values),
+        "p50_ms": round(_percentile(values, 0.50) * 1000, 2),
+        "p99_ms": round(_percentile(values, 0.99) * 1000, 2),
+        "mean_ms": round(statistics.mean(values) * 1000, 2),
+    }
+
+
+async def run(logins: int, concurrency: int) -> dict:
+    import httpx
+
+    from .. import main
+    from ..models.user import User
+
+    User.metadata.create_all(main.engine)
+    main.on_startup()
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        r = await client.post("/api/auth/register", json={
+            "email": "bench@example.com", "username": "bench", "password": "Benchmark123",
+        })
+        r.raise_for_status()
+
+        login_lat, health_lat = [], []
+        sem = asyncio.Semaphore(concurrency)
+        stop = asyncio.Event()
+
+        async def one_login():
+            async with sem:
+                t0 = time.perf_counter()
+                r = await client.post("/api/auth/login", json={
+                    "email_or_username": "bench", "password": "Benchmark123",
+                })
+                login_lat.append(time.perf_counter() - t0)
+                r.raise_for_status()
+
+        async def probe_health():
+            while not stop.is_set():
+                t0 = time.perf_counter()
+                await client.get("/health")
+                health_lat.append(time.perf_counter() - t0)
+                await asyncio.sleep(0.01)
+
+        probe = asyncio.create_task(probe_health())
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one_login() for _ in range(logins)))
+        wall = time.perf_counter() - t0
+        stop.set()
+        await probe
+
+    return {
+        "logins": logins,
+        "concurrency": concurrency,
+        "auth_threads": main.settings.AUTH_THREADS,
+        "wall_sec": round(wall, 3),
+        "logins_per_sec": round(logins / wall, 1),
+        "login": _summary(login_lat),
+        "health_during_burst": _summary(health_lat),
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.logins, args.concurrency)), indent=2))
+
+
+if __name__ == "__main__":
+    # Base et stockage jetables, à définir avant l'import des settings
+    workdir = tempfile.mkdtemp(prefix="readcast-bench-")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{workdir}/bench.db")
+    os.environ.setdefault("LOCAL_STORAGE_PATH", os.path.join(workdir, "data"))
+    main_cli()
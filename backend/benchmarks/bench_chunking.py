@@ -0,0 +1,86 @@
+# backend/benchmarks/bench_chunking.py
+"""
+Benchmark du découpage : nombre de requêtes TTS par livre et temps de calcul
+en fonction de la taille du texte (doit rester linéaire).
+
+    python -m backend.benchmarks.bench_chunking
+"""
+import json
+import random
+import time
+
+from ..services.chunking import iter_chunks
+
+WORDS = (
+    "le la les un une des et est dans pour sur avec par plus comme mais "
+    "livre page lecture chapitre histoire temps monde voix texte audio"
+).split()
+
+
+def legacy_chunk_text(text: str, max_chars: int = 1000):
+    """Ancien découpage (lignes, 1000 caractères), gardé pour comparaison."""
+    parts, buf, count = [], [], 0
+    for line in text.splitlines():
+        if not line.strip():
+            line = "\n"
+        if count + len(line) > max_chars:
+            parts.append(" ".join(buf))
+            buf, count = [], 0
+        buf.append(line)
+        count += len(line)
+    if buf:
+        parts.append(" ".join(buf))
+    return parts
+
+
+def synthetic_page(rng: random.Random, lines: int = 40, width: int = 80) -> str:
+    out, line = [], []
+    for _ in range(lines * 12):
+        word = rng.choice(WORDS)
+        if rng.random() < 0.08:
+            word += rng.choice(".!?")
+        line.append(word)
+        if sum(len(w) + 1 for w in line) >= width:
+            out.append(" ".join(line))
+            line = []
+            if rng.random() < 0.1:
+                out.append("")  # fin de paragraphe
+    out.append(" ".join(line))
+    return "\n".join(out)
+
+
+def synthetic_book(n_pages: int, seed: int = 0):
+    rng = random.Random(seed)
+    return [synthetic_page(rng) for _ in range(n_pages)]
+
+
+def run(max_chars: int = 5000) -> dict:
+    pages = synthetic_book(300)
+    text = "\n\n".join(pages)
+    legacy = legacy_chunk_text(text)
+    new = list(iter_chunks(pages, max_chars=max_chars))
+    result = {
+        "book_pages": len(pages),
+        "book_chars": len(text),
+        "legacy_requests": len(legacy),
+        "legacy_empty_chunks": sum(1 for c in legacy if not c.strip()),
+        "requests": len(new),
+        "max_chunk_chars": max(len(c) for c in new),
+        "scaling": [],
+    }
+
+    # Linéarité : temps par Mo quasi constant quand la taille double
+    base = synthetic_book(100, seed=1)
+    base_chars = sum(len(p) for p in base)
+    for factor in (4, 8, 16, 32):
+        pages_n = base * factor
+        t0 = time.perf_counter()
+        n = sum(1 for _ in iter_chunks(pages_n, max_chars=max_chars))
+        dt = time.perf_counter() - t0
+        mb = base_chars * factor / 1e6
+        result["scaling"].append({"mb": round(mb, 2), "chunks": n, "sec": round(dt, 4), "sec_per_mb": round(dt / mb, 4)})
+    return result
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), indent=2))
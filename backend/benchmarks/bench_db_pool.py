@@ -0,0 +1,166 @@
+# backend/benchmarks/bench_db_pool.py
+"""
+Benchmark de concurrence DB : de nombreux clients SSE (relectures du job)
+et des workers qui écrivent leur progression, en même temps, sur une base
+SQLite fichier.
+
+Compare l'ancienne configuration (un engine par module, pool par défaut,
+journal rollback) à l'engine partagé de models/db.py (pool dimensionné,
+pre-ping, WAL + synchronous=NORMAL).
+
+    python -m backend.benchmarks.bench_db_pool --sse 200 --workers 4 --seconds 10
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(q * len(values)))] * 1000, 2)
+
+
+def _scenario(api_engines, worker_engine, job_ids, sse_clients, workers, seconds, pool_status):
+    from sqlmodel import Session, update
+
+    from ..models.db import Job
+
+    pools = list({id(e): e for e in api_engines}.values())
+    stop = threading.Event()
+    lock = threading.Lock()
+    stats = {"reads": 0, "writes": 0, "errors": {}, "read_lat": [], "write_lat": [], "peak_checked_out": 0}
+
+    def record_error(exc):
+        name = type(exc).__name__
+        with lock:
+            stats["errors"][name] = stats["errors"].get(name, 0) + 1
+
+    def sse_client(n):
+        # Relecture périodique du job, comme load_payload() du flux SSE
+        engine = api_engines[n % len(api_engines)]
+        job_id = job_ids[n % len(job_ids)]
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            try:
+                with Session(engine) as session:
+                    session.get(Job, job_id)
+            except Exception as exc:
+                record_error(exc)
+            else:
+                dt = time.perf_counter() - t0
+                with lock:
+                    stats["reads"] += 1
+                    stats["read_lat"].append(dt)
+            stop.wait(0.01)
+
+    def worker(n):
+        # Écritures de progression d'un worker (ProgressReporter)
+        job_id = job_ids[n % len(job_ids)]
+        i = 0
+        while not stop.is_set():
+            i += 1
+            t0 = time.perf_counter()
+            try:
+                with Session(worker_engine) as session:
+                    session.exec(update(Job).where(Job.id == job_id).values(chunks_done=i, progress=i % 100))
+                    session.commit()
+            except Exception as exc:
+                record_error(exc)
+            else:
+                dt = time.perf_counter() - t0
+                with lock:
+                    stats["writes"] += 1
+                    stats["write_lat"].append(dt)
+            stop.wait(0.005)
+
+    def sampler():
+        while not stop.is_set():
+            out = sum(pool_status(e).get("checked_out", 0) for e in pools)
+            stats["peak_checked_out"] = max(stats["peak_checked_out"], out)
+            stop.wait(0.05)
+
+    threads = [threading.Thread(target=sse_client, args=(n,)) for n in range(sse_clients)]
+    threads += [threading.Thread(target=worker, args=(n,)) for n in range(workers)]
+    threads.append(threading.Thread(target=sampler))
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    return {
+        "reads_per_sec": round(stats["reads"] / seconds, 1),
+        "writes_per_sec": round(stats["writes"] / seconds, 1),
+        "read_p50_ms": _percentile(stats["read_lat"], 0.50),
+        "read_p99_ms": _percentile(stats["read_lat"], 0.99),
+        "write_p50_ms": _percentile(stats["write_lat"], 0.50),
+        "write_p99_ms": _percentile(stats["write_lat"], 0.99),
+        "errors": stats["errors"],
+        "peak_checked_out": stats["peak_checked_out"],
+        "api_pools": [pool_status(e) for e in pools],
+    }
+
+
+def run(sse_clients: int, workers: int, seconds: float, pool_timeout: float) -> dict:
+    from sqlmodel import Session, create_engine
+
+    from ..models import db
+    from ..models.db import Job, create_db_engine, ensure_schema, pool_status
+    from ..settings import settings
+
+    workdir = tempfile.mkdtemp(prefix="readcast-bench-db-")
+    results = {"sse_clients": sse_clients, "workers": workers, "seconds": seconds}
+
+    for name in ("legacy", "shared"):
+        url = f"sqlite:///{os.path.join(workdir, name + '.db')}"
+        settings.DB_POOL_TIMEOUT_SEC = pool_timeout
+        if name == "legacy":
+            # Ancien get_engine : pool par défaut, pas de pragmas, un engine par module
+            def make():
+                return create_engine(url, connect_args={"check_same_thread": False}, pool_timeout=pool_timeout)
+            setup = make()
+            api_engines = [make(), make()]  # main.py + AuthService
+            worker_engine = make()
+        else:
+            setup = create_db_engine(url)
+            db._engines.clear()
+            api_engines = [db.get_engine(url), db.get_engine(url)]  # même objet
+            worker_engine = create_db_engine(url)  # processus worker séparé
+        for e in [setup] + api_engines + [worker_engine]:
+            if not hasattr(e, "pool_metrics"):
+                e.pool_metrics = {}
+
+        ensure_schema(setup)
+        job_ids = [str(uuid.uuid4()) for _ in range(max(1, workers))]
+        with Session(setup) as session:
+            for job_id in job_ids:
+                session.add(Job(id=job_id, input_filename="bench.pdf"))
+            session.commit()
+
+        results[name] = _scenario(api_engines, worker_engine, job_ids, sse_clients, workers, seconds, pool_status)
+        if name == "legacy":
+            results[name]["journal_mode"] = "delete"
+        else:
+            with setup.connect() as conn:
+                results[name]["journal_mode"] = conn.exec_driver_sql("PRAGMA journal_mode").scalar()
+        for e in {id(e): e for e in [setup] + api_engines + [worker_engine]}.values():
+            e.dispose()
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sse", type=int, default=200, help="clients SSE simultanés")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--pool-timeout", type=float, default=5.0)
+    args = parser.parse_args()
+    print(json.dumps(run(args.sse, args.workers, args.seconds, args.pool_timeout), indent=2))
@@ -0,0 +1,399 @@
+# backend/benchmarks/bench_pipeline.py
+"""
+Benchmark de bout en bout du worker, sans aucun service externe :
+  - PDF synthétiques : couche texte, scannés (pages image, OCR) ou mixtes,
+    de 1 à 1000 pages ;
+  - TTS : fake_tts_server (latence paramétrable), provider "fake" ;
+  - S3 : moto ; Redis : fakeredis ; SQLite dans un dossier temporaire.
+
+Chaque scénario crée un job puis exécute, dans ce processus, les vraies
+étapes du worker (extract_stage, synthesize_stage, assemble_stage,
+upload_stage). Par étape : temps réel, CPU (processus et enfants : pool
+d'extraction, tesseract, ffmpeg), pic de RSS (processus et enfants),
+morceaux/s. Le découpage (chunking), fondu dans l'extraction, est mesuré
+seul une seconde fois sur les pages extraites.
+
+    pip install -r backend/requirements-bench.txt
+    python -m backend.benchmarks.bench_pipeline --scenarios text:1,text:100,scanned:10,mixed:50
+    python -m backend.benchmarks.bench_pipeline --scenarios text:1000 --tts-latency-ms 800 --out after.json
+
+Deux JSON (avant / après une modification) se comparent étape par étape :
+une régression d'extraction, de découpage, de ffmpeg ou d'upload s'y lit
+directement.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+from typing import List, Optional
+
+WORDS = (
+    "le", "la", "les", "un", "une", "de", "du", "des", "et", "ou", "mais", "dans", "sur", "avec",
+    "livre", "chapitre", "lecture", "voix", "page", "texte", "histoire", "temps", "monde", "nuit",
+    "jour", "main", "porte", "maison", "ville", "route", "mer", "ciel", "lumiere", "silence",
+    "regarde", "marche", "parle", "attend", "ouvre", "longtemps", "encore", "toujours", "jamais",
+    "petit", "grand", "vieux", "nouveau", "premier", "dernier", "rouge", "blanc", "noir", "calme",
+)
+CHAPTER_EVERY = 20  # un titre « Chapitre N » en haut d'une page sur 20
+SCAN_SIZE = (1275, 1650)  # US Letter à 150 DPI
+SCANNED_RATIO = {"text": 0.0, "scanned": 1.0, "mixed": 0.3}  # part de pages scannées par type
+
+
+# ---------- PDF synthétiques ----------
+
+def _page_lines(rng: random.Random, index: int, words_per_page: int) -> List[str]:
+    lines = [f"Chapitre {index // CHAPTER_EVERY + 1}", ""] if index % CHAPTER_EVERY == 0 else []
+    line = ""
+    remaining = words_per_page
+    while remaining > 0:
+        n = min(remaining, rng.randint(8, 16))
+        remaining -= n
+        sentence = " ".join(rng.choice(WORDS) for _ in range(n))
+        sentence = sentence[0].upper() + sentence[1:] + "."
+        for word in sentence.split():
+            if len(line) + len(word) + 1 > 85:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+    if line:
+        lines.append(line)
+    return lines
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _render_scan(lines: List[str]) -> bytes:
+    """Page « scannée » : le texte rendu en image JPEG (niveaux de gris), sans couche texte."""
+    from PIL import Image, ImageDraw, ImageFont
+
+    img = Image.new("L", SCAN_SIZE, 255)
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.load_default(size=22)
+    y = 90
+    for line in lines:
+        draw.text((100, y), line, fill=0, font=font)
+        y += 29
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=75)
+    return out.getvalue()
+
+
+def make_pdf(path: str, n_pages: int, scanned_ratio: float = 0.0, words_per_page: int = 250,
+             seed: int = 0) -> dict:
+    """
+    PDF de `n_pages` pages ; une page est scannée avec la probabilité
+    `scanned_ratio` (0 : tout en couche texte, 1 : tout scanné).
+    Déterministe pour un `seed` donné.
+    """
+    rng = random.Random(seed)
+    objects: List[bytes] = [b"", b""]  # 1 : catalogue, 2 : arbre des pages (remplis à la fin)
+
+    def add(obj: bytes) -> int:
+        objects.append(obj)
+        return len(objects)
+
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    kids = []
+    scanned = 0
+    for index in range(n_pages):
+        lines = _page_lines(rng, index, words_per_page)
+        if rng.random() < scanned_ratio:
+            jpeg = _render_scan(lines)
+            image = add(
+                b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray "
+                b"/BitsPerComponent 8 /Filter /DCTDecode /Length %d >>\nstream\n" % (*SCAN_SIZE, len(jpeg))
+                + jpeg + b"\nendstream"
+            )
+            content = b"q 612 0 0 792 0 0 cm /Im0 Do Q"
+            resources = b"<< /XObject << /Im0 %d 0 R >> >>" % image
+            scanned += 1
+        else:
+            ops = " ".join(f"({_pdf_escape(line)}) '" for line in lines)
+            content = f"BT /F1 11 Tf 50 760 Td 14 TL {ops} ET".encode("latin-1")
+            resources = b"<< /Font << /F1 %d 0 R >> >>" % font
+        stream = add(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+        kids.append(add(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents %d 0 R /Resources %s >>"
+            % (stream, resources)
+        ))
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % k for k in kids), n_pages)
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, obj in enumerate(objects, 1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n" % number + obj + b"\nendobj\n")
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        f.write(b"".join(b"%010d 00000 n \n" % off for off in offsets))
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return {"pages": n_pages, "scanned_pages": scanned, "pdf_mb": round(os.path.getsize(path) / 1e6, 2)}
+
+
+# ---------- Mesures ----------
+
+def _cpu_sec() -> float:
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+def _tree_pids(pid: int) -> List[int]:
+    """`pid` et ses descendants (Linux : /proc/<pid>/task/<tid>/children)."""
+    pids = [pid]
+    for p in pids:
+        try:
+            for tid in os.listdir(f"/proc/{p}/task"):
+                with open(f"/proc/{p}/task/{tid}/children") as f:
+                    pids.extend(int(c) for c in f.read().split())
+        except OSError:
+            continue
+    return pids
+
+
+def _tree_rss_bytes(pid: int) -> int:
+    page = os.sysconf("SC_PAGE_SIZE")
+    total = 0
+    for p in _tree_pids(pid):
+        try:
+            with open(f"/proc/{p}/statm") as f:
+                total += int(f.read().split()[1]) * page
+        except OSError:
+            continue
+    if total == 0:  # pas de /proc : pic du processus seul depuis son lancement
+        import resource
+        total = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return total
+
+
+class StageMeter:
+    """Temps réel, CPU et pic de RSS (processus et enfants) pendant un bloc `with`."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak_rss = 0
+        self._stop = threading.Event()
+
+    def _sample(self) -> None:
+        pid = os.getpid()
+        while True:
+            self.peak_rss = max(self.peak_rss, _tree_rss_bytes(pid))
+            if self._stop.wait(self.interval):
+                return
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        self._cpu = _cpu_sec()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.wall = time.perf_counter() - self._t0
+        self.cpu = _cpu_sec() - self._cpu
+        self._stop.set()
+        self._thread.join()
+        return False
+
+    def result(self, chunks: Optional[int]) -> dict:
+        return {
+            "wall_sec": round(self.wall, 3),
+            "cpu_sec": round(self.cpu, 3),
+            "peak_rss_mb": round(self.peak_rss / 1e6, 1),
+            "chunks_per_sec": round(chunks / self.wall, 2) if chunks and self.wall > 0 else None,
+        }
+
+
+# ---------- Scénarios ----------
+
+def parse_scenarios(spec: str) -> List[tuple]:
+    """"text:1,scanned:10,mixed:50" -> [("text", 1), ...]"""
+    out = []
+    for item in spec.split(","):
+        kind, _, pages = item.strip().partition(":")
+        if kind not in SCANNED_RATIO or not pages.isdigit() or not 1 <= int(pages) <= 1000:
+            raise ValueError(f"scénario invalide : {item!r} (text|scanned|mixed:1..1000)")
+        out.append((kind, int(pages)))
+    return out
+
+
+def _run_scenario(kind: str, n_pages: int, words_per_page: int, seed: int) -> dict:
+    from sqlmodel import Session
+
+    from ..models.db import Job, JobStatus, get_engine
+    from ..services.chunking import iter_section_chunks
+    from ..services.scheduler import STAGES
+    from ..services.tts import max_chunk_chars
+    from ..settings import settings
+    from ..workers import processor
+    from ..workers.checkpoint import JobCheckpoint
+
+    job_id = uuid.uuid4().hex
+    uploads = os.path.join(settings.LOCAL_STORAGE_PATH, "uploads")
+    os.makedirs(uploads, exist_ok=True)
+    pdf_path = os.path.join(uploads, f"{job_id}.pdf")
+    t0 = time.perf_counter()
+    result = {"scenario": f"{kind}:{n_pages}", **make_pdf(pdf_path, n_pages, SCANNED_RATIO[kind], words_per_page, seed)}
+    result["pdf_gen_sec"] = round(time.perf_counter() - t0, 2)
+
+    engine = get_engine()
+    with Session(engine) as session:
+        session.add(Job(
+            id=job_id, input_filename=f"bench-{kind}-{n_pages}.pdf", lang="fra", voice="bench",
+            user_id="bench", page_count=n_pages, status=JobStatus.PENDING,
+        ))
+        session.commit()
+
+    stages = {}
+    total_wall = total_cpu = 0.0
+    chunks = None
+    for stage in STAGES:
+        with StageMeter() as meter:
+            getattr(processor, f"{stage}_stage")(job_id, pdf_path, "bench", "fra")
+        with Session(engine) as session:
+            job = session.get(Job, job_id)
+        if job.status == JobStatus.ERROR:
+            lines = (job.error or "").strip().splitlines()
+            result["error"] = {"stage": stage, "message": lines[-1] if lines else None}
+            break
+        chunks = job.chunks_total
+        stages[stage] = meter.result(chunks)
+        total_wall += meter.wall
+        total_cpu += meter.cpu
+
+        if stage == "extract":
+            # Découpage seul, sur les pages déjà extraites (checkpoint)
+            pages = list(JobCheckpoint(processor._tmp_dir(job_id)).iter_pages(lambda start: iter(())))
+            with StageMeter() as meter:
+                n = sum(1 for _ in iter_section_chunks(((0, p) for p in pages), max_chars=max_chunk_chars()))
+            stages["chunking"] = meter.result(n)
+            result["chars"] = sum(map(len, pages))
+
+    result.update({
+        "chunks": chunks,
+        "audio_sec": job.duration_sec,
+        "tts_cache": {"hits": job.tts_cache_hits, "misses": job.tts_cache_misses},
+        "stages": stages,
+        "total": {
+            "wall_sec": round(total_wall, 3),
+            "cpu_sec": round(total_cpu, 3),
+            "peak_rss_mb": max((s["peak_rss_mb"] for s in stages.values()), default=None),
+            "chunks_per_sec": round(chunks / total_wall, 2) if chunks and total_wall > 0 else None,
+        },
+    })
+    os.remove(pdf_path)
+    return result
+
+
+def run(scenarios: List[tuple], tts_latency_ms: float, tts_ms_per_char: float, tts_tail_ratio: float,
+        tts_concurrency: int, speech_chars_per_sec: float, words_per_page: int, hls: bool, seed: int,
+        keep: bool = False, tts_cache: bool = False) -> dict:
+    import shutil
+
+    import boto3
+    import fakeredis
+    import httpx
+    from moto import mock_aws
+
+    from ..settings import settings
+    from .fake_tts_server import create_app, serve_in_thread
+
+    workdir = tempfile.mkdtemp(prefix="readcast-bench-pipeline-")
+    # Avant tout import du worker : son moteur SQL est créé à l'import
+    settings.DATABASE_URL = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    settings.LOCAL_STORAGE_PATH = os.path.join(workdir, "storage")
+    settings.JOB_PIPELINE = "stages"
+    settings.TTS_PROVIDER = "fake"
+    settings.TTS_PROVIDERS = None
+    settings.TTS_CACHE_ENABLED = tts_cache  # sinon chaque morceau va au (faux) provider
+    settings.TTS_CONCURRENCY = tts_concurrency
+    settings.HLS_ENABLED = hls
+    settings.S3_BUCKET = "readcast-bench"
+    settings.S3_ENDPOINT_URL = None
+    settings.AWS_REGION = "us-east-1"
+    settings.AWS_ACCESS_KEY_ID = settings.AWS_ACCESS_KEY_ID or "bench"
+    settings.AWS_SECRET_ACCESS_KEY = settings.AWS_SECRET_ACCESS_KEY or "bench"
+
+    from ..models.db import ensure_schema, get_engine
+    from ..services import dedup, events, ratelimit, scheduler, storage
+
+    redis = fakeredis.FakeRedis()
+    events._redis = redis
+    dedup._redis = redis
+    scheduler._scheduler = scheduler.JobScheduler(redis)
+    ratelimit._limiters.clear()
+    ratelimit._limiters["fake"] = ratelimit.TtsLimiter(redis, "fake")
+    ensure_schema(get_engine())
+
+    server, thread, settings.TTS_FAKE_URL = serve_in_thread(create_app(
+        latency_ms=tts_latency_ms, ms_per_char=tts_ms_per_char, tail_ratio=tts_tail_ratio,
+        chars_per_sec=speech_chars_per_sec,
+    ))
+    results = []
+    try:
+        with mock_aws():
+            storage._client = None
+            boto3.client("s3", region_name=settings.AWS_REGION).create_bucket(Bucket=settings.S3_BUCKET)
+            for kind, n_pages in scenarios:
+                # Un scénario répété reprend le même texte (hits du cache TTS avec --tts-cache)
+                results.append(_run_scenario(kind, n_pages, words_per_page, seed + scenarios.index((kind, n_pages))))
+                redis.flushall()  # files RQ des étapes suivantes, état du limiteur
+        tts_stats = httpx.get(f"{settings.TTS_FAKE_URL}/stats").json()
+    finally:
+        server.should_exit = True
+        thread.join()
+        storage._client = None
+        if not keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "config": {
+            "tts_latency_ms": tts_latency_ms,
+            "tts_ms_per_char": tts_ms_per_char,
+            "tts_tail_ratio": tts_tail_ratio,
+            "tts_concurrency": tts_concurrency,
+            "speech_chars_per_sec": speech_chars_per_sec,
+            "words_per_page": words_per_page,
+            "hls": hls,
+            "tts_cache": tts_cache,
+            "cpus": os.cpu_count(),
+        },
+        "scenarios": results,
+        "tts_server": tts_stats,
+        "workdir": workdir if keep else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenarios", default="text:1,text:100,scanned:10,mixed:50",
+                        help="type:pages séparés par des virgules (text|scanned|mixed, 1..1000 pages)")
+    parser.add_argument("--tts-latency-ms", type=float, default=300.0)
+    parser.add_argument("--tts-ms-per-char", type=float, default=0.2)
+    parser.add_argument("--tts-tail-ratio", type=float, default=0.02)
+    parser.add_argument("--tts-concurrency", type=int, default=4)
+    parser.add_argument("--speech-chars-per-sec", type=float, default=15.0, help="durée de l'audio généré")
+    parser.add_argument("--words-per-page", type=int, default=250)
+    parser.add_argument("--no-hls", action="store_true")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--keep", action="store_true", help="garder le dossier de travail (livrables, base)")
+    parser.add_argument("--tts-cache", action="store_true", help="cache TTS actif (répéter un scénario : text:20,text:20)")
+    parser.add_argument("--out", help="écrire le JSON dans ce fichier")
+    args = parser.parse_args()
+    report = run(parse_scenarios(args.scenarios), args.tts_latency_ms, args.tts_ms_per_char,
+                 args.tts_tail_ratio, args.tts_concurrency, args.speech_chars_per_sec,
+                 args.words_per_page, not args.no_hls, args.seed, args.keep, args.tts_cache)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    print(text)
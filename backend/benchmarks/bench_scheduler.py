@@ -0,0 +1,133 @@
+# backend/benchmarks/bench_scheduler.py
+"""
+Simulation (temps discret) de l'ordonnancement des jobs sous charge mixte :
+un utilisateur dépose d'un coup N gros livres pendant que d'autres envoient
+des documents courts et moyens au fil de l'eau.
+
+Compare l'ancienne file RQ unique (FIFO) au JobScheduler réel
+(services/scheduler.py, sur fakeredis) : files par taille dépilées par
+priorité et plafond de jobs actifs par utilisateur. Le temps de traitement
+d'un job est simulé (secondes par page + coût fixe).
+
+    python -m backend.benchmarks.bench_scheduler --workers 4 --big-jobs 20
+"""
+import argparse
+import heapq
+import json
+import random
+
+
+def _make_arrivals(big_jobs: int, big_pages: int, horizon: float, seed: int):
+    rng = random.Random(seed)
+    arrivals = [(0.0, "heavy", big_pages) for _ in range(big_jobs)]
+    t = 0.0
+    n = 0
+    while t < horizon:
+        t += rng.expovariate(1 / 20.0)  # un nouveau document toutes les 20 s en moyenne
+        n += 1
+        pages = rng.randint(1, 10) if rng.random() < 0.8 else rng.randint(40, 150)
+        arrivals.append((t, f"user{n % 25}", pages))
+    arrivals.sort(key=lambda a: a[0])
+    return arrivals
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(q * len(values)))], 1)
+
+
+def _simulate(arrivals, workers: int, sec_per_page: float, overhead: float, policy: str):
+    from ..services.scheduler import JobScheduler, size_class, worker_queues
+    from ..settings import settings
+
+    jobs = {}
+    events = []  # (t, seq, kind, job_id)
+    for seq, (t, user, pages) in enumerate(arrivals):
+        job_id = f"job{seq}"
+        jobs[job_id] = {"user": user, "pages": pages, "arrival": t}
+        heapq.heappush(events, (t, seq, "arrival", job_id))
+    seq = len(arrivals)
+
+    fifo = []
+    if policy == "scheduler":
+        import fakeredis
+        from rq import Queue
+
+        settings.JOB_PIPELINE = "single"  # un job = une tâche, comme la simulation
+        redis = fakeredis.FakeRedis()
+        scheduler = JobScheduler(redis)
+        queues = [Queue(name, connection=redis) for name in worker_queues()]
+
+    def next_job():
+        if policy == "fifo":
+            return fifo.pop(0) if fifo else None
+        for queue in queues:  # même ordre que `rq worker small medium large`
+            job_id = redis.lpop(queue.key)
+            if job_id:
+                return job_id.decode()
+        return None
+
+    idle = workers
+    while events:
+        now, _, kind, job_id = heapq.heappop(events)
+        job = jobs[job_id]
+        if kind == "arrival":
+            if policy == "fifo":
+                fifo.append(job_id)
+            else:
+                scheduler.submit(job_id, job["user"], "/tmp/in.pdf", "voice", "fra", pages=job["pages"])
+        else:
+            job["done"] = now
+            idle += 1
+            if policy == "scheduler":
+                scheduler.release(job["user"], job_id)
+        while idle:
+            nxt = next_job()
+            if nxt is None:
+                break
+            idle -= 1
+            jobs[nxt]["start"] = now
+            seq += 1
+            heapq.heappush(events, (now + overhead + jobs[nxt]["pages"] * sec_per_page, seq, "done", nxt))
+
+    result = {}
+    for size in ("small", "medium", "large"):
+        group = [j for j in jobs.values() if size_class(j["pages"]) == size]
+        waits = [j["start"] - j["arrival"] for j in group]
+        result[size] = {
+            "jobs": len(group),
+            "wait_p50_sec": _percentile(waits, 0.50),
+            "wait_p95_sec": _percentile(waits, 0.95),
+            "wait_max_sec": _percentile(waits, 1.0),
+        }
+    heavy = [j["done"] for j in jobs.values() if j["user"] == "heavy"]
+    result["heavy_user_makespan_sec"] = round(max(heavy), 1) if heavy else None
+    result["makespan_sec"] = round(max(j["done"] for j in jobs.values()), 1)
+    return result
+
+
+def run(workers: int, big_jobs: int, big_pages: int, horizon: float, sec_per_page: float,
+        overhead: float, seed: int) -> dict:
+    arrivals = _make_arrivals(big_jobs, big_pages, horizon, seed)
+    return {
+        "workers": workers,
+        "jobs": len(arrivals),
+        "fifo": _simulate(arrivals, workers, sec_per_page, overhead, "fifo"),
+        "scheduler": _simulate(arrivals, workers, sec_per_page, overhead, "scheduler"),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--big-jobs", type=int, default=20)
+    parser.add_argument("--big-pages", type=int, default=500)
+    parser.add_argument("--horizon", type=float, default=3600.0, help="durée des arrivées (s)")
+    parser.add_argument("--sec-per-page", type=float, default=2.0)
+    parser.add_argument("--overhead", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    print(json.dumps(run(args.workers, args.big_jobs, args.big_pages, args.horizon,
+                         args.sec_per_page, args.overhead, args.seed), indent=2))
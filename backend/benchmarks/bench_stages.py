@@ -0,0 +1,136 @@
+# backend/benchmarks/bench_stages.py
+"""
+Simulation (temps discret) du débit des workers sur une charge mixte :
+PDF texte et PDF scannés (OCR), de 1 à 500 pages.
+
+Compare, à budget CPU égal :
+  - single : JOB_PIPELINE=single, `cores` workers génériques ; un worker est
+    occupé par le job entier (extraction et synthèse en flux, puis ffmpeg
+    et upload), y compris pendant l'attente réseau de la synthèse ;
+  - stages : JOB_PIPELINE=stages, `cores` ocr-workers (extraction, ffmpeg)
+    et `tts_workers` tts-workers (synthèse, upload) qui n'occupent pas de CPU.
+
+Les durées par étape sont des coûts unitaires paramétrables (secondes par
+page ou par morceau), pas des mesures.
+
+    python -m backend.benchmarks.bench_stages --jobs 300 --cores 4 --tts-workers 16
+"""
+import argparse
+import heapq
+import json
+import random
+
+
+def _make_jobs(n: int, scanned_ratio: float, seed: int, rate_per_hour: float, costs: dict):
+    rng = random.Random(seed)
+    jobs = []
+    t = 0.0
+    for _ in range(n):
+        t += rng.expovariate(rate_per_hour / 3600.0)
+        pages = int(min(500, max(1, rng.lognormvariate(3.0, 1.2))))
+        scanned = rng.random() < scanned_ratio
+        chunks = max(1, int(pages * costs["chunks_per_page"]))
+        jobs.append({
+            "arrival": t,
+            "extract": pages * (costs["ocr_sec_per_page"] if scanned else costs["text_sec_per_page"]),
+            # synthèse : TTS_CONCURRENCY requêtes en vol par job
+            "synthesize": chunks * costs["tts_sec_per_chunk"] / costs["tts_concurrency"],
+            "assemble": chunks * costs["encode_sec_per_chunk"],
+            "upload": chunks * costs["upload_sec_per_chunk"],
+        })
+    return jobs
+
+
+def _simulate(jobs, pools: dict, plan) -> dict:
+    """`plan(job)` -> liste d'étapes (pool, durée) ; chaque pool sert en FIFO."""
+    free = dict(pools)
+    waiting = {name: [] for name in pools}
+    events = []
+    seq = 0
+    steps = [plan(job) for job in jobs]
+    busy = {name: 0.0 for name in pools}
+
+    def push(t, kind, idx, step):
+        nonlocal seq
+        seq += 1
+        heapq.heappush(events, (t, seq, kind, idx, step))
+
+    for idx, job in enumerate(jobs):
+        push(job["arrival"], "ready", idx, 0)
+
+    finished = {}
+    while events:
+        now, _, kind, idx, step = heapq.heappop(events)
+        if kind == "done":
+            pool = steps[idx][step][0]
+            free[pool] += 1
+            step += 1
+            if step == len(steps[idx]):
+                finished[idx] = now
+            else:
+                waiting[steps[idx][step][0]].append((idx, step))
+        else:
+            waiting[steps[idx][step][0]].append((idx, step))
+        for pool in pools:
+            while free[pool] and waiting[pool]:
+                j, s = waiting[pool].pop(0)
+                free[pool] -= 1
+                duration = steps[j][s][1]
+                busy[pool] += duration
+                push(now + duration, "done", j, s)
+
+    makespan = max(finished.values())
+    turnaround = sorted(finished[i] - jobs[i]["arrival"] for i in finished)
+    return {
+        "makespan_sec": round(makespan, 1),
+        "jobs_per_hour": round(len(jobs) * 3600 / makespan, 1),
+        "turnaround_p50_sec": round(turnaround[len(turnaround) // 2], 1),
+        "turnaround_p95_sec": round(turnaround[int(len(turnaround) * 0.95)], 1),
+        "utilization": {name: round(busy[name] / (pools[name] * makespan), 2) for name in pools},
+    }
+
+
+def run(n_jobs: int, cores: int, tts_workers: int, scanned_ratio: float, rate_per_hour: float,
+        seed: int, costs: dict) -> dict:
+    jobs = _make_jobs(n_jobs, scanned_ratio, seed, rate_per_hour, costs)
+    single = _simulate(jobs, {"worker": cores}, lambda j: [
+        ("worker", max(j["extract"], j["synthesize"]) + j["assemble"] + j["upload"]),
+    ])
+    stages = _simulate(jobs, {"ocr": cores, "tts": tts_workers}, lambda j: [
+        ("ocr", j["extract"]), ("tts", j["synthesize"]), ("ocr", j["assemble"]), ("tts", j["upload"]),
+    ])
+    return {
+        "jobs": n_jobs,
+        "cores": cores,
+        "tts_workers": tts_workers,
+        "costs": costs,
+        "single": single,
+        "stages": stages,
+        "throughput_gain": round(stages["jobs_per_hour"] / single["jobs_per_hour"], 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=300)
+    parser.add_argument("--cores", type=int, default=4, help="workers CPU (single : workers tout court)")
+    parser.add_argument("--tts-workers", type=int, default=16)
+    parser.add_argument("--scanned-ratio", type=float, default=0.3)
+    parser.add_argument("--rate", type=float, default=600.0, help="jobs déposés par heure")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--ocr-sec-per-page", type=float, default=2.5)
+    parser.add_argument("--text-sec-per-page", type=float, default=0.05)
+    parser.add_argument("--tts-sec-per-chunk", type=float, default=3.0)
+    parser.add_argument("--tts-concurrency", type=int, default=4)
+    args = parser.parse_args()
+    costs = {
+        "ocr_sec_per_page": args.ocr_sec_per_page,
+        "text_sec_per_page": args.text_sec_per_page,
+        "chunks_per_page": 0.6,
+        "tts_sec_per_chunk": args.tts_sec_per_chunk,
+        "tts_concurrency": args.tts_concurrency,
+        "encode_sec_per_chunk": 0.15,
+        "upload_sec_per_chunk": 0.03,
+    }
+    print(json.dumps(run(args.jobs, args.cores, args.tts_workers, args.scanned_ratio, args.rate,
+                         args.seed, costs), indent=2))
@@ -0,0 +1,88 @@
+# backend/benchmarks/bench_storage.py
+"""
+Benchmark d'upload S3 des livrables d'un job, contre un S3 local (moto).
+
+Compare l'ancien chemin (nouveau client boto3 par appel, uploads en série,
+TransferConfig par défaut) au chemin actuel (client partagé, multipart
+parallèle, fichiers envoyés en parallèle).
+
+    python -m backend.benchmarks.bench_storage --mp3-mb 200 --m4b-mb 140
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+
+def _make_file(path: str, size_mb: int) -> None:
+    block = os.urandom(1024 * 1024)
+    with open(path, "wb") as f:
+        for _ in range(size_mb):
+            f.write(block)
+
+
+def run(mp3_mb: int, m4b_mb: int, rounds: int = 2) -> dict:
+    import boto3
+    from botocore.config import Config
+    from moto import mock_aws
+
+    from ..services import storage
+    from ..settings import settings
+
+    workdir = tempfile.mkdtemp(prefix="readcast-bench-s3-")
+    files = [
+        (os.path.join(workdir, "output.mp3"), mp3_mb),
+        (os.path.join(workdir, "output.m4b"), m4b_mb),
+    ]
+    for path, size in files:
+        _make_file(path, size)
+    chapters = os.path.join(workdir, "chapters.json")
+    with open(chapters, "w") as f:
+        json.dump({"chapters": []}, f)
+    items = [(p, f"outputs/bench/{os.path.basename(p)}") for p, _ in files] + [(chapters, "outputs/bench/chapters.json")]
+    total_mb = mp3_mb + m4b_mb
+
+    def legacy_upload():
+        # Ancien comportement : session + client par appel, envois en série
+        for src, dst in items:
+            session = boto3.session.Session(
+                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                region_name=settings.AWS_REGION,
+            )
+            client = session.client("s3", config=Config(s3={"addressing_style": "auto"}))
+            client.upload_file(src, settings.S3_BUCKET, dst)
+            client.generate_presigned_url("get_object", Params={"Bucket": settings.S3_BUCKET, "Key": dst}, ExpiresIn=3600)
+
+    results = {}
+    with mock_aws():
+        settings.S3_BUCKET = "readcast-bench"
+        settings.AWS_REGION = "us-east-1"
+        settings.AWS_ACCESS_KEY_ID = settings.AWS_ACCESS_KEY_ID or "bench"
+        settings.AWS_SECRET_ACCESS_KEY = settings.AWS_SECRET_ACCESS_KEY or "bench"
+        settings.S3_ENDPOINT_URL = None
+        storage._client = None
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket=settings.S3_BUCKET)
+
+        for name, fn in (("legacy_serial", legacy_upload), ("pooled_parallel", lambda: storage.upload_files(items))):
+            best = None
+            for _ in range(rounds):
+                t0 = time.perf_counter()
+                fn()
+                dt = time.perf_counter() - t0
+                best = dt if best is None else min(best, dt)
+            results[name] = {"sec": round(best, 3), "mb_per_sec": round(total_mb / best, 1)}
+
+    results["total_mb"] = total_mb
+    results["speedup"] = round(results["legacy_serial"]["sec"] / results["pooled_parallel"]["sec"], 2)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mp3-mb", type=int, default=200)
+    parser.add_argument("--m4b-mb", type=int, default=140)
+    parser.add_argument("--rounds", type=int, default=2)
+    args = parser.parse_args()
+    print(json.dumps(run(args.mp3_mb, args.m4b_mb, args.rounds), indent=2))
@@ -0,0 +1,90 @@
+# backend/benchmarks/bench_tts_router.py
+"""
+Latence de queue de la synthèse d'un job, contre le faux serveur TTS
+(fake_tts_server, lancé dans ce processus) : sans réseau.
+
+Compare la synthèse d'un même job sans puis avec relance (hedging) au-delà
+du p95 ; les lenteurs du serveur sont déterministes, les deux passes voient
+donc la même traîne.
+
+    python -m backend.benchmarks.bench_tts_router --chunks 400 --tail-ratio 0.02
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+
+
+def _percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def run(n_chunks: int, chunk_chars: int, concurrency: int, latency_ms: float, tail_ratio: float,
+        tail_factor: float) -> dict:
+    from ..services import tts
+    from ..settings import settings
+    from .fake_tts_server import create_app, serve_in_thread
+
+    settings.TTS_PROVIDER = "fake"
+    settings.TTS_PROVIDERS = None
+    settings.TTS_CACHE_ENABLED = False
+    settings.TTS_LIMIT_ENABLED = False
+    settings.TTS_CONCURRENCY = concurrency
+
+    synthesize = tts.synthesize
+    chunks = [f"{i:06d} " + "lorem ipsum " * (chunk_chars // 12) for i in range(n_chunks)]
+    results = {"chunks": n_chunks, "concurrency": concurrency, "tail_ratio": tail_ratio, "tail_factor": tail_factor}
+    try:
+        for name, hedge in (("no_hedge", False), ("hedge", True)):
+            # Serveur neuf à chaque passe : même séquence de requêtes lentes
+            server, thread, settings.TTS_FAKE_URL = serve_in_thread(create_app(
+                latency_ms=latency_ms, ms_per_char=0.0, tail_ratio=tail_ratio, tail_factor=tail_factor,
+            ))
+            settings.TTS_HEDGE_ENABLED = hedge
+            tts._latency.clear()
+            latencies = []
+
+            async def timed(*args, **kwargs):
+                t0 = time.perf_counter()
+                await synthesize(*args, **kwargs)
+                latencies.append(time.perf_counter() - t0)
+
+            tts.synthesize = timed
+            t0 = time.perf_counter()
+            try:
+                asyncio.run(tts.synthesize_stream(chunks, "bench", tempfile.mkdtemp(prefix="readcast-bench-tts-")))
+            finally:
+                server.should_exit = True
+                thread.join()
+            wall = time.perf_counter() - t0
+            stats = tts.latency_stats("fake")
+            results[name] = {
+                "wall_sec": round(wall, 2),
+                "chunk_p50_sec": round(_percentile(latencies, 0.5), 3),
+                "chunk_p95_sec": round(_percentile(latencies, 0.95), 3),
+                "chunk_p99_sec": round(_percentile(latencies, 0.99), 3),
+                "chunk_max_sec": round(max(latencies), 3),
+                "hedges": stats.hedges,
+                "hedge_wins": stats.hedge_wins,
+            }
+    finally:
+        tts.synthesize = synthesize
+
+    results["wall_gain"] = round(results["no_hedge"]["wall_sec"] / results["hedge"]["wall_sec"], 2)
+    results["p99_gain"] = round(results["no_hedge"]["chunk_p99_sec"] / results["hedge"]["chunk_p99_sec"], 2)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=400)
+    parser.add_argument("--chunk-chars", type=int, default=600)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--tail-ratio", type=float, default=0.02)
+    parser.add_argument("--tail-factor", type=float, default=10.0)
+    args = parser.parse_args()
+    print(json.dumps(run(args.chunks, args.chunk_chars, args.concurrency, args.latency_ms,
+                         args.tail_ratio, args.tail_factor), indent=2))
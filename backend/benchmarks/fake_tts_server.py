@@ -0,0 +1,133 @@
+# backend/benchmarks/fake_tts_server.py
+"""
+Faux serveur TTS déterministe, compatible avec l'API text-to-speech
+d'ElevenLabs (provider "fake", TTS_FAKE_URL) : le pipeline complet tourne et
+se mesure sans réseau.
+
+Pour un texte donné, tout est reproductible :
+  - latence : `latency_ms` + `ms_per_char` × caractères ; la n-ième requête
+    d'un même texte est lente (× `tail_factor`) selon un hash de (texte, n),
+    pour `tail_ratio` des requêtes — une requête de relance tombe donc
+    rarement elle aussi dans la traîne ;
+  - audio : un MP3 (sinusoïde) de len(texte) / `chars_per_sec` secondes ;
+  - 429 avec Retry-After au-delà de `max_concurrency` requêtes en vol.
+
+    python -m backend.benchmarks.fake_tts_server --port 8765 --tail-ratio 0.05
+    TTS_PROVIDER=fake TTS_FAKE_URL=http://127.0.0.1:8765 rq worker ...
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from functools import lru_cache
+
+from fastapi import FastAPI, Request, Response
+from starlette.requests import ClientDisconnect
+
+
+@lru_cache(maxsize=None)
+def tone_mp3(duration: float) -> bytes:
+    """MP3 d'une sinusoïde de `duration` secondes (un encodage ffmpeg par durée)."""
+    fd, path = tempfile.mkstemp(suffix=".mp3")
+    os.close(fd)
+    try:
+        subprocess.run([
+            "ffmpeg", "-y", "-nostdin", "-loglevel", "error",
+            "-f", "lavfi", "-i", f"sine=frequency=220:sample_rate=24000:duration={duration}",
+            "-ac", "1", "-codec:a", "libmp3lame", "-b:a", "48k", "-write_xing", "0", path,
+        ], check=True)
+        with open(path, "rb") as f:
+            return f.read()
+    finally:
+        os.remove(path)
+
+
+def _fraction(text: str, n: int) -> float:
+    digest = hashlib.sha256(f"{n}:{text}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") / 2 ** 64
+
+
+def create_app(latency_ms: float = 300.0, ms_per_char: float = 0.5, tail_ratio: float = 0.05,
+               tail_factor: float = 8.0, max_concurrency: int = 64, retry_after: float = 1.0,
+               chars_per_sec: float = 15.0) -> FastAPI:
+    app = FastAPI(title="fake-tts")
+    state = {"in_flight": 0, "requests": 0, "throttled": 0, "slow": 0, "chars": 0}
+    seen: dict = {}
+
+    @app.post("/v1/text-to-speech/{voice_id}")
+    async def text_to_speech(voice_id: str, request: Request):
+        try:
+            body = await request.json()
+        except ClientDisconnect:
+            # Requête de relance perdante annulée par le client
+            return Response(status_code=499)
+        text = body.get("text") or ""
+        state["requests"] += 1
+        if state["in_flight"] >= max_concurrency:
+            state["throttled"] += 1
+            return Response(
+                content='{"detail":{"status":"too_many_concurrent_requests"}}',
+                status_code=429, media_type="application/json",
+                headers={"Retry-After": f"{retry_after:g}"},
+            )
+        n = seen[text] = seen.get(text, 0) + 1
+        delay = (latency_ms + ms_per_char * len(text)) / 1000.0
+        if _fraction(text, n) < tail_ratio:
+            state["slow"] += 1
+            delay *= tail_factor
+        state["in_flight"] += 1
+        try:
+            await asyncio.sleep(delay)
+            duration = max(0.5, round(len(text) / chars_per_sec * 2) / 2)
+            audio = await asyncio.to_thread(tone_mp3, duration)
+        finally:
+            state["in_flight"] -= 1
+        state["chars"] += len(text)
+        return Response(content=audio, media_type="audio/mpeg")
+
+    @app.get("/stats")
+    async def stats():
+        return dict(state)
+
+    return app
+
+
+def serve_in_thread(app) -> tuple:
+    """Lance `app` sur un port libre dans un thread ; retourne (serveur, thread, url)."""
+    import uvicorn
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread, f"http://127.0.0.1:{port}"
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--ms-per-char", type=float, default=0.5)
+    parser.add_argument("--tail-ratio", type=float, default=0.05, help="part des requêtes lentes")
+    parser.add_argument("--tail-factor", type=float, default=8.0)
+    parser.add_argument("--max-concurrency", type=int, default=64, help="au-delà : 429")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--chars-per-sec", type=float, default=15.0, help="débit de parole simulé")
+    args = parser.parse_args()
+    uvicorn.run(
+        create_app(args.latency_ms, args.ms_per_char, args.tail_ratio, args.tail_factor,
+                   args.max_concurrency, args.retry_after, args.chars_per_sec),
+        host=args.host, port=args.port, log_level="warning",
+    )
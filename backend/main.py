@@ -1,24 +1,40 @@
 from __future__ import annotations
 
 import asyncio
+import base64
+import functools
+import hashlib
 import os
 import time
 import uuid
+from datetime import datetime
 from typing import Optional
 
-from fastapi import Depends, FastAPI, File, HTTPException, UploadFile, Form, status
+import anyio
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import and_, func, or_, select
 from sse_starlette.sse import EventSourceResponse
 
 from .settings import settings
-from .models.db import Job, JobStatus, get_engine, get_session_maker
+from .models.db import (
+    Job, JobStatus, ensure_schema, get_async_engine, get_async_session_maker, get_engine, pool_status,
+)
 from .models.user import User, UserSession
-from .workers.processor import process_job
+from .services.dedup import (
+    claim as dedup_claim, copy_outcome, dedup_key, done_jobs_query, recheck_follower,
+    take_over as dedup_take_over,
+)
+from .services.events import JobEventHub, job_payload, job_progress
+from .services.extract import count_pages
+from .services.scheduler import JobScheduler
+from .services.storage import (
+    UPLOAD_FORM_OVERHEAD, InvalidUpload, UploadTooLarge, output_url, receive_upload, signed_url, warm_up_s3,
+)
 
 # RQ / Redis
-from rq import Queue
 from redis import Redis
 
 # Pydantic (v2)
@@ -36,27 +52,39 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # -------------------------------------------------
 # DB
 # -------------------------------------------------
-engine = get_engine(settings.DATABASE_URL)
-SessionLocal = get_session_maker(engine)
-
-def db_session():
-    """Dependency simple pour ouvrir/fermer une session DB."""
-    session = SessionLocal()
-    try:
+engine = get_engine()  # partagé avec AuthService (models/db.py) ; schéma au démarrage
+# Endpoints jobs et SSE : sessions asynchrones, aucune requête ne bloque la boucle
+async_engine = get_async_engine()
+AsyncSessionLocal = get_async_session_maker(async_engine)
+
+async def db_session():
+    """Dependency simple pour ouvrir/fermer une session DB asynchrone."""
+    async with AsyncSessionLocal() as session:
         yield session
-    finally:
-        session.close()
+
+# -------------------------------------------------
+# Travail bloquant (bcrypt, requêtes SQL synchrones, signatures S3)
+# -------------------------------------------------
+# Pool de threads borné dédié : une rafale de connexions occupe au plus
+# AUTH_THREADS threads (bcrypt relâche le GIL) sans geler la boucle d'événements.
+auth_limiter = anyio.CapacityLimiter(settings.AUTH_THREADS)
+
+async def run_blocking(fn, *args, **kwargs):
+    """Exécute une fonction synchrone hors de la boucle d'événements."""
+    return await anyio.to_thread.run_sync(functools.partial(fn, *args, **kwargs), limiter=auth_limiter)
 
 # -------------------------------------------------
 # Redis / RQ
 # -------------------------------------------------
 redis_conn = Redis.from_url(settings.REDIS_URL)
-rq_queue = Queue(settings.RQ_QUEUE_NAME, connection=redis_conn)
+scheduler = JobScheduler(redis_conn)  # files RQ par taille + plafond par utilisateur
+job_events = JobEventHub(settings.REDIS_URL)
 
 # -------------------------------------------------
 # Sécurité
@@ -116,13 +144,26 @@ class JobCreateResponse(BaseModel):
     id: str
     status: str
 
+class JobProgress(BaseModel):
+    stage: Optional[str] = None
+    chunks_done: int = 0
+    chunks_total: Optional[int] = None
+    percent: int = 0
+    eta_sec: Optional[int] = None
+
 class JobGetResponse(BaseModel):
     id: str
     status: str
     input_filename: Optional[str] = None
     output_mp3_url: Optional[str] = None
     output_m4b_url: Optional[str] = None
+    chapters_json_url: Optional[str] = None
+    download_mp3_url: Optional[str] = None
+    download_m4b_url: Optional[str] = None
     error: Optional[str] = None
+    progress: Optional[JobProgress] = None
+    encode_sec: Optional[float] = None
+    hls_url: Optional[str] = None  # lecture progressive, disponible pendant la synthèse
 
 # -------------------------------------------------
 # Startup: créer tables + dossiers
@@ -131,8 +172,8 @@ class JobGetResponse(BaseModel):
 def on_startup():
     # Créer tables si besoin
     try:
-        from sqlmodel import SQLModel
-        SQLModel.metadata.create_all(engine)
+        # Tables SQLModel + colonnes ajoutées depuis (progression, ...)
+        ensure_schema(engine)
         
         # Créer aussi les tables des modèles personnalisés
         User.metadata.create_all(engine)
@@ -147,12 +188,23 @@ def on_startup():
     os.makedirs(os.path.join(settings.LOCAL_STORAGE_PATH, "outputs"), exist_ok=True)
     os.makedirs(os.path.join(settings.LOCAL_STORAGE_PATH, "tmp"), exist_ok=True)
 
+    # Client S3 créé ici (identifiants, endpoint) plutôt qu'à la première signature d'URL
+    try:
+        warm_up_s3()
+    except Exception:
+        pass
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await job_events.close()
+    await async_engine.dispose()
+
 # -------------------------------------------------
 # Health
 # -------------------------------------------------
 @app.get("/health")
 def health():
-    return {"ok": True}
+    return {"ok": True, "db_pool": pool_status(engine), "db_async_pool": pool_status(async_engine)}
 
 # -------------------------------------------------
 # Authentification
@@ -163,7 +215,8 @@ async def register(user_data: UserCreate):
     # Import lazy pour éviter les imports circulaires
     from .services.auth import auth_service
     
-    success, result = auth_service.register_user(
+    success, result = await run_blocking(
+        auth_service.register_user,
         email=user_data.email,
         username=user_data.username,
         password=user_data.password,
@@ -184,7 +237,8 @@ async def login(login_data: UserLogin):
     # Import lazy pour éviter les imports circulaires
     from .services.auth import auth_service
     
-    success, result = auth_service.authenticate_user(
+    success, result = await run_blocking(
+        auth_service.authenticate_user,
         email_or_username=login_data.email_or_username,
         password=login_data.password
     )
@@ -203,7 +257,10 @@ async def refresh_token(refresh_token: str):
     # Import lazy pour éviter les imports circulaires
     from .services.auth import auth_service
     
-    success, result = auth_service.refresh_access_token(refresh_token)
+    success, result = await run_blocking(
+        auth_service.refresh_access_token,
+        refresh_token
+    )
     
     if not success:
         raise HTTPException(
@@ -227,7 +284,8 @@ async def update_profile(
     # Import lazy pour éviter les imports circulaires
     from .services.auth import auth_service
     
-    success, result = auth_service.update_user_profile(
+    success, result = await run_blocking(
+        auth_service.update_user_profile,
         user_id=current_user["id"],
         **profile_data
     )
@@ -250,7 +308,8 @@ async def change_password(
     # Import lazy pour éviter les imports circulaires
     from .services.auth import auth_service
     
-    success, result = auth_service.change_password(
+    success, result = await run_blocking(
+        auth_service.change_password,
         user_id=current_user["id"],
         current_password=current_password,
         new_password=new_password
@@ -275,53 +334,141 @@ async def logout(current_user: dict = Depends(get_current_user)):
 # -------------------------------------------------
 @app.post("/api/jobs", response_model=JobCreateResponse)
 async def create_job(
-    file: UploadFile = File(...),
-    voice: Optional[str] = Form(None),
-    lang: str = Form("fra"),
+    request: Request,
     session=Depends(db_session),
     current_user: dict = Depends(get_current_user)
 ):
+    """
+    Formulaire multipart : `file` (PDF), `voice` et `lang` optionnels.
+    Le corps est lu ici, en flux, et non par l'analyse de formulaire de
+    FastAPI (qui recopie tout le corps dans un fichier temporaire avant le
+    moindre contrôle) : la taille est vérifiée à chaque bloc reçu.
+    """
+    max_bytes = settings.MAX_UPLOAD_MB * 1024 * 1024
+    too_large = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Fichier trop volumineux (max {settings.MAX_UPLOAD_MB} Mo).",
+    )
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + UPLOAD_FORM_OVERHEAD:
+        raise too_large
+
+    # Enregistrer fichier en local, en flux (mémoire bornée, I/O hors boucle)
+    job_id = str(uuid.uuid4())
+    input_dir = os.path.join(settings.LOCAL_STORAGE_PATH, "inputs")
+    os.makedirs(input_dir, exist_ok=True)
+    part_path = os.path.join(input_dir, f"{job_id}.upload")
+
+    hasher = hashlib.sha256()  # calculé pendant la réception, pour la déduplication
+    try:
+        upload = await receive_upload(
+            request.stream(), request.headers.get("content-type"), part_path, max_bytes,
+            chunk_size=settings.UPLOAD_CHUNK_KB * 1024, hasher=hasher,
+        )
+    except UploadTooLarge:
+        raise too_large
+    except InvalidUpload as e:
+        raise HTTPException(status_code=400, detail=f"Formulaire invalide : {e}")
+
     # Sécuriser type MIME
-    if not file.content_type or "pdf" not in file.content_type:
+    if "pdf" not in (upload["content_type"] or ""):
+        await run_blocking(os.remove, part_path)
         raise HTTPException(status_code=400, detail="Veuillez envoyer un PDF.")
+    filename = upload["filename"]
+    voice = upload["fields"].get("voice") or None
+    lang = upload["fields"].get("lang") or "fra"
+    local_path = os.path.join(input_dir, f"{job_id}_{os.path.basename(filename or 'input.pdf')}")
+    await run_blocking(os.replace, part_path, local_path)
 
-    # Créer Job en DB
-    job_id = str(uuid.uuid4())
     job = Job(
         id=job_id,
         status=JobStatus.PENDING,
-        input_filename=file.filename,
+        input_filename=filename,
         lang=lang,
         voice=voice or settings.ELEVENLABS_VOICE_ID,
-        user_id=current_user["id"]  # Associer le job à l'utilisateur
+        user_id=current_user["id"],  # Associer le job à l'utilisateur
+        content_hash=hasher.hexdigest(),
+        pipeline_version=settings.PIPELINE_VERSION,
     )
-    session.add(job)
-    session.commit()
 
-    # Enregistrer fichier en local
-    input_dir = os.path.join(settings.LOCAL_STORAGE_PATH, "inputs")
-    os.makedirs(input_dir, exist_ok=True)
-    local_path = os.path.join(input_dir, f"{job_id}_{file.filename}")
+    # Nombre de pages (lecture de l'arbre de pages seulement) : choisit la file RQ
+    try:
+        page_count = await run_blocking(count_pages, local_path)
+    except Exception:
+        page_count = None
 
-    with open(local_path, "wb") as f:
-        content = await file.read()
-        f.write(content)
+    # Créer Job en DB (une fois le fichier complet sur disque), avant toute
+    # réservation de déduplication : un dépôt identique concurrent doit
+    # toujours trouver la ligne du job de référence
+    job.page_count = page_count
+    session.add(job)
+    await session.commit()
+
+    # Même PDF, même voix, même langue : résultat existant ou job en cours
+    if settings.DEDUP_ENABLED and await _deduplicate(session, job):
+        await run_blocking(os.remove, local_path)
+        return JobCreateResponse(id=job_id, status=job.status.value)
 
-    # Enqueue le traitement dans RQ (worker)
-    rq_queue.enqueue(process_job, job_id, local_path, job.voice, job.lang)
+    # Mise en file RQ (ou attente si l'utilisateur a déjà assez de jobs actifs)
+    await run_blocking(
+        scheduler.submit,
+        job_id, current_user["id"], local_path, job.voice, job.lang, pages=page_count,
+    )
 
     return JobCreateResponse(id=job_id, status=job.status.value)
 
+
+async def _deduplicate(session, job: Job) -> bool:
+    """
+    Termine `job` (déjà enregistré, PENDING) avec le résultat d'un job
+    identique déjà fini, ou le fait suivre le job identique en cours.
+    Retourne False si `job` doit être traité normalement (il devient alors
+    le job de référence de sa clé).
+    """
+    source = (await session.exec(done_jobs_query(job.content_hash, job.voice, job.lang))).first()
+    if source is not None:
+        copy_outcome(job, source)
+        job.source_job_id = source.source_job_id or source.id  # le job qui a produit les fichiers
+        session.add(job)
+        await session.commit()
+        return True
+
+    key = dedup_key(job.content_hash, job.voice, job.lang)
+    leader_id = await run_blocking(dedup_claim, redis_conn, key, job.id)
+    if leader_id is None:
+        return False
+    leader = await session.get(Job, leader_id, populate_existing=True)
+    if leader is None:
+        await run_blocking(dedup_take_over, redis_conn, key, job.id)
+        return False
+
+    job.source_job_id = leader_id
+    session.add(job)
+    await session.commit()
+    # Le job de référence a pu se terminer avant l'enregistrement du suiveur
+    await session.refresh(leader)
+    if leader.status in (JobStatus.DONE, JobStatus.ERROR) and job.status == JobStatus.PENDING:
+        copy_outcome(job, leader)
+        await session.commit()
+    return True
+
 # -------------------------------------------------
 # Récupérer un job (protégé par authentification)
 # -------------------------------------------------
+def _download_url(key: Optional[str], input_filename: Optional[str], ext: str) -> Optional[str]:
+    """URL de téléchargement (Content-Disposition: attachment), signée à la demande."""
+    if not key:
+        return None
+    stem = os.path.splitext(os.path.basename(input_filename or "readcast"))[0]
+    return signed_url(key, filename=f"{stem}.{ext}", as_attachment=True)
+
 @app.get("/api/jobs/{job_id}", response_model=JobGetResponse)
-def get_job(
+async def get_job(
     job_id: str, 
     session=Depends(db_session),
     current_user: dict = Depends(get_current_user)
 ):
-    job = session.get(Job, job_id)
+    job = await session.get(Job, job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job introuvable")
     
@@ -331,38 +478,103 @@ def get_job(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Accès non autorisé à ce job"
         )
+    await recheck_follower(session, job)  # job dédupliqué dont la référence a été perdue
+    return await run_blocking(_job_response, job)
 
+def _job_response(job: Job) -> JobGetResponse:
+    """Réponse de GET /api/jobs/{id} (signature des URLs : hors boucle d'événements)."""
     return JobGetResponse(
         id=job.id,
         status=job.status.value,
         input_filename=job.input_filename,
-        output_mp3_url=job.output_mp3_url,
-        output_m4b_url=job.output_m4b_url,
+        output_mp3_url=output_url(job.output_mp3_key, job.output_mp3_url),
+        output_m4b_url=output_url(job.output_m4b_key, job.output_m4b_url),
+        chapters_json_url=output_url(job.chapters_json_key, job.chapters_json_url),
+        download_mp3_url=_download_url(job.output_mp3_key, job.input_filename, "mp3"),
+        download_m4b_url=_download_url(job.output_m4b_key, job.input_filename, "m4b"),
         error=job.error,
+        progress=JobProgress(**job_progress(job)),
+        encode_sec=job.encode_sec,
+        hls_url=None if job.status in (JobStatus.DONE, JobStatus.ERROR) else output_url(job.hls_playlist_key),
     )
 
 # -------------------------------------------------
 # Lister les jobs de l'utilisateur
 # -------------------------------------------------
+# Colonnes renvoyées par la liste (pas de preview_text ni de traceback complet)
+_JOB_LIST_COLUMNS = (
+    Job.id, Job.status, Job.input_filename, Job.created_at,
+    Job.output_mp3_key, Job.output_mp3_url,
+    Job.output_m4b_key, Job.output_m4b_url,
+    Job.chapters_json_key, Job.chapters_json_url,
+    Job.stage, Job.chunks_done, Job.chunks_total, Job.progress, Job.eta_sec,
+)
+JOB_LIST_ERROR_CHARS = 300
+
+
+def _encode_cursor(created_at: datetime, job_id: str) -> str:
+    raw = f"{created_at.isoformat()}|{job_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, job_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), job_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Curseur invalide")
+
+
 @app.get("/api/jobs")
-def list_user_jobs(
+async def list_user_jobs(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    status_filter: Optional[JobStatus] = Query(None, alias="status"),
     session=Depends(db_session),
     current_user: dict = Depends(get_current_user)
 ):
-    """Lister tous les jobs de l'utilisateur connecté."""
-    jobs = session.query(Job).filter(Job.user_id == current_user["id"]).all()
-    
+    """
+    Lister les jobs de l'utilisateur connecté, du plus récent au plus ancien.
+    Pagination par curseur (index composite user_id, created_at) : passer la
+    valeur de l'en-tête `X-Next-Cursor` en `?cursor=` pour la page suivante.
+    """
+    stmt = (
+        select(*_JOB_LIST_COLUMNS, func.substr(Job.error, 1, JOB_LIST_ERROR_CHARS).label("error"))
+        .where(Job.user_id == current_user["id"])
+    )
+    if status_filter is not None:
+        stmt = stmt.where(Job.status == status_filter)
+    if cursor:
+        created_at, job_id = _decode_cursor(cursor)
+        stmt = stmt.where(or_(
+            Job.created_at < created_at,
+            and_(Job.created_at == created_at, Job.id < job_id),
+        ))
+    stmt = stmt.order_by(Job.created_at.desc(), Job.id.desc()).limit(limit + 1)
+
+    rows = (await session.execute(stmt)).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = _encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    return await run_blocking(_job_list_items, rows)
+
+def _job_list_items(rows) -> list:
     return [
         {
             "id": job.id,
             "status": job.status.value,
             "input_filename": job.input_filename,
             "created_at": job.created_at.isoformat() if job.created_at else None,
-            "output_mp3_url": job.output_mp3_url,
-            "output_m4b_url": job.output_m4b_url,
+            "output_mp3_url": output_url(job.output_mp3_key, job.output_mp3_url),
+            "output_m4b_url": output_url(job.output_m4b_key, job.output_m4b_url),
+            "chapters_json_url": output_url(job.chapters_json_key, job.chapters_json_url),
             "error": job.error,
+            "progress": job_progress(job),
         }
-        for job in jobs
+        for job in rows
     ]
 
 # -------------------------------------------------
@@ -374,45 +586,53 @@ async def stream_job_events(
     current_user: dict = Depends(get_current_user)
 ):
     """
-    SSE très simple: on poll la DB toutes les 1s et on envoie l'état.
-    Côté front, EventSource reçoit ces événements.
+    SSE poussé par Redis : le worker publie chaque changement d'état sur
+    `job-events:{job_id}`, on relaie. La DB n'est lue qu'à l'ouverture du
+    flux, puis toutes les SSE_RESYNC_SEC secondes sans événement (filet de
+    sécurité si un message Redis est perdu), SSE_POLL_SEC si Redis est coupé.
     """
-    async def event_generator():
-        last_payload = None
-        while True:
-            # Lire DB (via nouvelle session par itération pour éviter les connexions bloquées)
-            session = SessionLocal()
-            job = session.get(Job, job_id)
+    async def load_payload():
+        async with AsyncSessionLocal() as session:
+            job = await session.get(Job, job_id)
             if not job:
-                session.close()
+                return None, None
+            await recheck_follower(session, job)
+            return job.user_id, await run_blocking(job_payload, job)
+
+    async def event_generator():
+        # On s'abonne avant de lire la DB : aucun événement ne peut passer entre les deux
+        async with job_events.subscribe(job_id) as queue:
+            owner_id, payload = await load_payload()
+            if payload is None:
                 yield {"event": "error", "data": "Job introuvable"}
                 return
-            
+
             # Vérifier que l'utilisateur est propriétaire du job
-            if job.user_id != current_user["id"]:
-                session.close()
+            if owner_id != current_user["id"]:
                 yield {"event": "error", "data": "Accès non autorisé"}
                 return
 
-            payload = {
-                "id": job.id,
-                "status": job.status.value,
-                "mp3": job.output_mp3_url,
-                "m4b": job.output_m4b_url,
-                "error": job.error,
-            }
-
-            # N'émettre que si changement (pour éviter le spam)
-            if payload != last_payload:
-                last_payload = payload
-                yield {"event": "update", "data": JSONResponse(content=payload).body.decode()}
-
-                # Stopper si terminé/erreur
-                if job.status in (JobStatus.DONE, JobStatus.ERROR):
-                    session.close()
-                    return
-
-            session.close()
-            await asyncio.sleep(1.0)
+            last_payload = None
+            while True:
+                # N'émettre que si changement (pour éviter le spam), et jamais un
+                # état plus ancien que le dernier envoyé (événement resté en file)
+                stale = last_payload is not None and payload.get("version", 0) < last_payload.get("version", 0)
+                if payload != last_payload and not stale:
+                    last_payload = payload
+                    yield {"event": "update", "data": JSONResponse(content=payload).body.decode()}
+
+                    # Stopper si terminé/erreur
+                    if payload["status"] in (JobStatus.DONE.value, JobStatus.ERROR.value):
+                        return
+
+                # Redis coupé : aucun événement n'arrivera, on relit la DB plus souvent
+                timeout = settings.SSE_RESYNC_SEC if job_events.connected else settings.SSE_POLL_SEC
+                try:
+                    payload = await asyncio.wait_for(queue.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    _, payload = await load_payload()
+                    if payload is None:
+                        yield {"event": "error", "data": "Job introuvable"}
+                        return
 
     return EventSourceResponse(event_generator(), ping=15000)
@@ -1,10 +1,15 @@
 from __future__ import annotations
+import threading
 from datetime import datetime
 from enum import Enum
-from typing import Optional
+from typing import Dict, Optional
 
 from pydantic import ConfigDict
+from sqlalchemy import Index, event, inspect, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from sqlmodel import SQLModel, Field, Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from ..settings import settings
 
@@ -16,29 +21,201 @@ class JobStatus(str, Enum):
 
 class Job(SQLModel, table=True):
     model_config = ConfigDict(arbitrary_types_allowed=True)
+    # Liste paginée des jobs d'un utilisateur (main.list_user_jobs)
+    __table_args__ = (
+        Index("ix_job_user_id_created_at", "user_id", "created_at"),
+        # Déduplication des documents (services/dedup.py)
+        Index("ix_job_dedup", "content_hash", "voice", "lang", "pipeline_version"),
+    )
     id: str = Field(primary_key=True, index=True)
     created_at: datetime = Field(default_factory=datetime.utcnow, nullable=False)
+    # Dernière écriture : ordonne les événements SSE (services/events.py, job_version)
+    updated_at: Optional[datetime] = Field(default_factory=datetime.utcnow, sa_column_kwargs={"onupdate": datetime.utcnow})
     status: JobStatus = Field(default=JobStatus.PENDING, nullable=False)
 
     input_filename: str
     lang: Optional[str] = None
     voice: Optional[str] = None
     user_id: Optional[str] = None  # ID de l'utilisateur propriétaire
+    page_count: Optional[int] = None  # compté à l'upload, choisit la file RQ
+
+    # Déduplication : sha256 du PDF, version du pipeline, job dont on reprend le résultat
+    content_hash: Optional[str] = None
+    pipeline_version: Optional[str] = None
+    source_job_id: Optional[str] = Field(default=None, index=True)
 
     error: Optional[str] = None
     duration_sec: int = 0
 
+    # Progression (écrite par lots par le worker, voir workers/progress.py)
+    stage: Optional[str] = None  # extract / synthesize / assemble / upload
+    chunks_done: Optional[int] = 0
+    chunks_total: Optional[int] = None  # estimé tant que l'extraction n'est pas finie
+    progress: Optional[int] = 0  # 0..100
+    eta_sec: Optional[int] = None
+
+    encode_sec: Optional[float] = None  # temps ffmpeg (mesure loudnorm + encodage)
+    # Morceaux servis par le cache TTS / synthétisés par un provider (services/tts_cache.py)
+    tts_cache_hits: Optional[int] = None
+    tts_cache_misses: Optional[int] = None
+
+    # Clés S3 des livrables ; les URLs sont signées à la lecture (services/storage.py).
+    # Les colonnes *_url ne servent plus qu'aux jobs créés avant ce changement.
+    output_mp3_key: Optional[str] = None
+    output_m4b_key: Optional[str] = None
+    chapters_json_key: Optional[str] = None
+    hls_playlist_key: Optional[str] = None  # playlist HLS, écoutable avant la fin du job
     output_mp3_url: Optional[str] = None
     output_m4b_url: Optional[str] = None
     chapters_json_url: Optional[str] = None
     preview_text: Optional[str] = None
 
+# Un seul engine (donc un seul pool) par URL et par processus : l'API,
+# AuthService et le worker passent tous par get_engine().
+_engines: Dict[str, object] = {}
+_engines_lock = threading.Lock()
+
+def _is_sqlite_memory(url: str) -> bool:
+    return url.startswith("sqlite") and (":memory:" in url or url.rstrip("/") in ("sqlite:", "sqlite:/"))
+
+def _configure_sqlite(engine) -> None:
+    """WAL + synchronous à chaque nouvelle connexion : lecteurs (SSE, API) et
+    écrivain (worker) ne se bloquent plus mutuellement."""
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        if settings.SQLITE_WAL:
+            cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+        cur.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        cur.close()
+
+def _track_pool(engine) -> None:
+    stats = engine.pool_metrics = {"connects": 0, "checkouts": 0}
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(*_):
+        stats["connects"] += 1
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(*_):
+        stats["checkouts"] += 1
+
+def create_db_engine(db_url: str | None = None):
+    """Construit un engine configuré (pool, pre-ping, pragmas SQLite)."""
+    url = db_url or settings.DATABASE_URL
+    kwargs = {"pool_pre_ping": True}
+    if url.startswith("sqlite"):
+        kwargs["connect_args"] = {"check_same_thread": False}
+    if not _is_sqlite_memory(url):
+        kwargs.update(
+            poolclass=QueuePool,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT_SEC,
+            pool_recycle=settings.DB_POOL_RECYCLE_SEC,
+        )
+    engine = create_engine(url, **kwargs)
+    if url.startswith("sqlite"):
+        _configure_sqlite(engine)
+    _track_pool(engine)
+    return engine
+
 def get_engine(db_url: str | None = None):
+    """Engine partagé du processus pour cette URL (créé au premier appel)."""
     url = db_url or settings.DATABASE_URL
-    connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
-    return create_engine(url, connect_args=connect_args)
+    engine = _engines.get(url)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.get(url)
+            if engine is None:
+                engine = _engines[url] = create_db_engine(url)
+    return engine
+
+# Pilotes asynchrones équivalents aux URLs synchrones de DATABASE_URL
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "postgresql+psycopg": "postgresql+asyncpg",
+}
+
+def async_db_url(url: str) -> str:
+    """sqlite:///x.db -> sqlite+aiosqlite:///x.db, postgresql://... -> postgresql+asyncpg://..."""
+    scheme, sep, rest = url.partition("://")
+    return _ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+_async_engines: Dict[str, object] = {}
+
+def get_async_engine(db_url: str | None = None):
+    """
+    Engine asynchrone partagé (endpoints jobs et SSE de l'API) : mêmes
+    réglages de pool et mêmes pragmas SQLite que get_engine().
+    """
+    url = async_db_url(db_url or settings.DATABASE_URL)
+    engine = _async_engines.get(url)
+    if engine is not None:
+        return engine
+    with _engines_lock:
+        engine = _async_engines.get(url)
+        if engine is None:
+            kwargs = {"pool_pre_ping": True}
+            if not _is_sqlite_memory(url):
+                kwargs.update(
+                    poolclass=AsyncAdaptedQueuePool,
+                    pool_size=settings.DB_POOL_SIZE,
+                    max_overflow=settings.DB_MAX_OVERFLOW,
+                    pool_timeout=settings.DB_POOL_TIMEOUT_SEC,
+                    pool_recycle=settings.DB_POOL_RECYCLE_SEC,
+                )
+            engine = create_async_engine(url, **kwargs)
+            if url.startswith("sqlite"):
+                _configure_sqlite(engine.sync_engine)
+            _track_pool(engine.sync_engine)
+            _async_engines[url] = engine
+    return engine
+
+def get_async_session_maker(engine):
+    # expire_on_commit=False : les objets restent lisibles après commit sans I/O implicite
+    return async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+def pool_status(engine) -> dict:
+    """Métriques du pool (exposées par /health)."""
+    engine = getattr(engine, "sync_engine", engine)
+    pool = engine.pool
+    status = {"class": type(pool).__name__, **getattr(engine, "pool_metrics", {})}
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+            max_overflow=pool._max_overflow,
+        )
+    return status
 
 def get_session_maker(engine):
     def _session():
         return Session(engine)
     return _session
+
+def ensure_schema(engine) -> None:
+    """
+    Crée les tables manquantes et ajoute les colonnes nullables et les index
+    apparus depuis (pas d'outil de migration : les nouveaux champs sont optionnels).
+    """
+    SQLModel.metadata.create_all(engine)
+    insp = inspect(engine)
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            if not insp.has_table(table.name):
+                continue
+            existing = {c["name"] for c in insp.get_columns(table.name)}
+            for col in table.columns:
+                if col.name in existing or not col.nullable:
+                    continue
+                col_type = col.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {col.name} {col_type}'))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
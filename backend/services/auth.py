@@ -1,30 +1,184 @@
-from typing import Optional, Tuple
+from typing import Dict, Optional, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
 from ..models.user import User, UserSession, create_access_token, create_refresh_token, verify_token
 from ..models.db import get_session_maker
 from datetime import datetime, timedelta
+import json
 import re
+import threading
+import time
+from .utils import TTLCache
+
+# Invalidations publiées aux autres processus API (avec AUTH_CACHE_REDIS)
+INVALIDATE_CHANNEL = "auth:invalidate"
 
 class AuthService:
     def __init__(self):
         # Ne pas créer le session maker ici pour éviter les imports circulaires
         self.SessionLocal = None
+        # Caches de get_current_user : tokens décodés et fiches utilisateur
+        self._token_cache = TTLCache(max_entries=10000)
+        self._user_cache = TTLCache(max_entries=10000)
+        self._redis = None
+        self._invalidations = None  # thread d'abonnement à INVALIDATE_CHANNEL
+        self._generations: Dict[str, int] = {}  # par utilisateur, voir _generation()
+        self._gen_lock = threading.Lock()
 
     def _get_session_maker(self):
         """Obtenir le session maker de manière lazy pour éviter les imports circulaires."""
         if self.SessionLocal is None:
-            from ..models.db import get_session_maker
-            from ..settings import settings
-            from ..models.db import get_engine
-            engine = get_engine(settings.DATABASE_URL)
-            self.SessionLocal = get_session_maker(engine)
+            from ..models.db import get_engine, get_session_maker
+            # Engine partagé avec l'API : un seul pool de connexions par processus
+            self.SessionLocal = get_session_maker(get_engine())
         return self.SessionLocal
 
     def _get_session(self) -> Session:
         """Obtenir une nouvelle session de base de données."""
         return self._get_session_maker()()
 
+    # ---------- Cache des utilisateurs authentifiés ----------
+
+    def _get_redis(self):
+        """Client Redis du cache partagé (AUTH_CACHE_REDIS), ou None."""
+        from ..settings import settings
+        if not settings.AUTH_CACHE_REDIS:
+            return None
+        if self._redis is None:
+            from redis import Redis
+            self._redis = Redis.from_url(settings.REDIS_URL)
+        if self._invalidations is None:
+            self._invalidations = self._listen_invalidations(self._redis)
+        return self._redis
+
+    def _listen_invalidations(self, redis):
+        """Thread de fond : oublie les fiches invalidées par les autres processus."""
+        def _drop(message):
+            user_id = message["data"]
+            self._drop_local(user_id.decode() if isinstance(user_id, bytes) else user_id)
+
+        def _on_error(exc, pubsub, thread):
+            # Redis coupé : on réessaie (réabonnement automatique à la reconnexion)
+            time.sleep(1.0)
+
+        try:
+            pubsub = redis.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{INVALIDATE_CHANNEL: _drop})
+            return pubsub.run_in_thread(sleep_time=1.0, daemon=True, exception_handler=_on_error)
+        except Exception:
+            return None
+
+    @staticmethod
+    def _user_cache_key(user_id: str) -> str:
+        return f"auth:user:{user_id}"
+
+    @staticmethod
+    def _user_gen_key(user_id: str) -> str:
+        return f"auth:user:{user_id}:gen"
+
+    # Chaque invalidation incrémente la génération de l'utilisateur (locale et
+    # Redis). Une fiche lue en base n'est mise en cache que si la génération
+    # n'a pas bougé depuis la lecture : une requête concurrente d'une
+    # modification ne remet pas l'ancienne fiche en cache.
+
+    def _generation(self, user_id: str) -> Tuple[int, Optional[int]]:
+        """Génération (locale, Redis) à relever avant de lire la fiche en base."""
+        with self._gen_lock:
+            local = self._generations.get(user_id, 0)
+        redis = self._get_redis()
+        if redis is None:
+            return local, None
+        try:
+            return local, int(redis.get(self._user_gen_key(user_id)) or 0)
+        except Exception:
+            return local, None
+
+    def _cached_user(self, user_id: str) -> Optional[dict]:
+        """Fiche utilisateur actif en cache : mémoire locale, puis Redis."""
+        user = self._user_cache.get(user_id)
+        if user is not None:
+            return user
+        redis = self._get_redis()
+        if redis is None:
+            return None
+        try:
+            raw, gen = redis.mget(self._user_cache_key(user_id), self._user_gen_key(user_id))
+        except Exception:
+            return None
+        if raw is None:
+            return None
+        from ..settings import settings
+        entry = json.loads(raw)
+        if entry.get("gen") != int(gen or 0):
+            return None  # écrite avant la dernière invalidation
+        with self._gen_lock:
+            self._user_cache.set(user_id, entry["user"], ttl=settings.AUTH_CACHE_TTL_SEC)
+        return entry["user"]
+
+    def _cache_user(self, user: dict, generation: Tuple[int, Optional[int]]) -> None:
+        from ..settings import settings
+        user_id = user["id"]
+        local, remote = generation
+        with self._gen_lock:
+            if self._generations.get(user_id, 0) != local:
+                return
+            self._user_cache.set(user_id, user, ttl=settings.AUTH_CACHE_TTL_SEC)
+        redis = self._get_redis()
+        if redis is None or remote is None:
+            return
+        gen_key = self._user_gen_key(user_id)
+        try:
+            with redis.pipeline() as pipe:
+                pipe.watch(gen_key)
+                if int(pipe.get(gen_key) or 0) != remote:
+                    return
+                pipe.multi()
+                pipe.set(self._user_cache_key(user_id), json.dumps({"gen": remote, "user": user}),
+                         ex=settings.AUTH_CACHE_REDIS_TTL_SEC)
+                pipe.execute()
+        except Exception:
+            pass  # WatchError : invalidée entre-temps, on ne cache pas
+
+    def _drop_local(self, user_id: str) -> None:
+        with self._gen_lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            self._user_cache.pop(user_id)
+
+    def invalidate_user(self, user_id: str) -> None:
+        """
+        Oublie la fiche en cache (locale + Redis) et prévient les autres
+        processus API via INVALIDATE_CHANNEL. Sans AUTH_CACHE_REDIS, ils
+        gardent au plus AUTH_CACHE_TTL_SEC secondes leur copie locale.
+        À appeler après le commit de la modification.
+        """
+        self._drop_local(user_id)
+        redis = self._get_redis()
+        if redis is not None:
+            try:
+                with redis.pipeline() as pipe:
+                    pipe.incr(self._user_gen_key(user_id))
+                    pipe.expire(self._user_gen_key(user_id), 2 * 24 * 3600)
+                    pipe.delete(self._user_cache_key(user_id))
+                    pipe.publish(INVALIDATE_CHANNEL, user_id)
+                    pipe.execute()
+            except Exception:
+                pass
+
+    def _decode_access_token(self, token: str) -> Optional[dict]:
+        payload = self._token_cache.get(token)
+        if payload is not None:
+            return payload
+        payload = verify_token(token)
+        if not payload or payload.get("type") != "access" or not payload.get("sub"):
+            return None
+        from ..settings import settings
+        ttl = settings.AUTH_CACHE_TTL_SEC
+        exp = payload.get("exp")
+        if exp is not None:
+            ttl = min(ttl, float(exp) - time.time())
+        self._token_cache.set(token, payload, ttl=ttl)
+        return payload
+
     def _validate_email(self, email: str) -> bool:
         """Valider le format d'un email."""
         pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
@@ -150,6 +304,7 @@ class AuthService:
             # Mettre à jour la dernière connexion
             user.update_last_login()
             session.commit()
+            self.invalidate_user(user.id)  # fiche en cache : last_login périmé
             
             # Créer les tokens
             access_token = create_access_token(data={"sub": user.id, "email": user.email})
@@ -205,16 +360,22 @@ class AuthService:
             return False, {"error": f"Erreur lors du rafraîchissement: {str(e)}"}
 
     def get_current_user(self, token: str) -> Tuple[bool, dict]:
-        """Récupérer l'utilisateur actuel à partir du token."""
+        """
+        Récupérer l'utilisateur actuel à partir du token.
+        Token décodé et fiche utilisateur sont mis en cache (AUTH_CACHE_TTL_SEC) :
+        en régime établi, aucune requête SQL par appel authentifié.
+        """
         try:
             # Vérifier le token
-            payload = verify_token(token)
-            if not payload or payload.get("type") != "access":
+            payload = self._decode_access_token(token)
+            if not payload:
                 return False, {"error": "Token d'accès invalide"}
             
             user_id = payload.get("sub")
-            if not user_id:
-                return False, {"error": "Token d'accès invalide"}
+            cached = self._cached_user(user_id)
+            if cached is not None:
+                return True, {"user": cached}
+            generation = self._generation(user_id)  # avant la lecture en base
             
             # Récupérer l'utilisateur
             session = self._get_session()
@@ -224,9 +385,11 @@ class AuthService:
                 session.close()
                 return False, {"error": "Utilisateur non trouvé ou désactivé"}
             
+            user_dict = user.to_dict()
             session.close()
+            self._cache_user(user_dict, generation)
             
-            return True, {"user": user.to_dict()}
+            return True, {"user": user_dict}
             
         except Exception as e:
             if 'session' in locals():
@@ -260,6 +423,7 @@ class AuthService:
             session.commit()
             
             session.close()
+            self.invalidate_user(user_id)
             
             return True, {"message": "Mot de passe modifié avec succès"}
             
@@ -290,6 +454,7 @@ class AuthService:
             session.refresh(user)
             
             session.close()
+            self.invalidate_user(user_id)
             
             return True, {
                 "message": "Profil mis à jour avec succès",
@@ -316,6 +481,7 @@ class AuthService:
             session.commit()
             
             session.close()
+            self.invalidate_user(user_id)
             
             return True, {"message": "Utilisateur désactivé avec succès"}
             
@@ -0,0 +1,183 @@
+# backend/services/chapters.py
+"""
+Chapitres d'un livre : détection dans le PDF et métadonnées audio.
+
+1. Table des matières du PDF (signets / outline), via pdfplumber/pdfminer.
+2. À défaut, heuristique sur les titres en haut de page ("Chapitre 3", ...).
+
+Les morceaux TTS ne chevauchent jamais deux chapitres (voir
+chunking.iter_section_chunks) : la position d'un chapitre dans l'audio est
+la somme des durées réelles des morceaux qui le précèdent.
+"""
+import json
+import re
+import subprocess
+from typing import Dict, List, Optional
+
+import pdfplumber
+
+_HEADING = re.compile(
+    r"^(chapitre|chapter|cap[ií]tulo|partie|part|livre|book)\s+"
+    r"([0-9]+|[ivxlcdm]+|premi[eè]re?|un|une|deux|trois|quatre|cinq|six|sept|huit|neuf|dix|"
+    r"one|two|three|four|five|seven|eight|nine|ten)\b.{0,60}$",
+    re.IGNORECASE,
+)
+_STANDALONE_HEADING = re.compile(
+    r"^(prologue|[ée]pilogue|introduction|conclusion|pr[ée]face|avant-propos|postface|foreword|afterword)\.?$",
+    re.IGNORECASE,
+)
+
+
+# ---------- Détection ----------
+
+def _dest_page(doc, dest, action, page_ids: Dict[int, int]) -> Optional[int]:
+    from pdfminer.pdftypes import PDFObjRef, resolve1
+    from pdfminer.psparser import PSLiteral
+
+    if dest is None and action is not None:
+        action = resolve1(action)
+        if isinstance(action, dict):
+            dest = action.get("D")
+    dest = resolve1(dest)
+    if isinstance(dest, PSLiteral):
+        dest = dest.name
+    if isinstance(dest, (str, bytes)):
+        dest = resolve1(doc.get_dest(dest))
+    if isinstance(dest, dict):
+        dest = resolve1(dest.get("D"))
+    if isinstance(dest, list) and dest and isinstance(dest[0], PDFObjRef):
+        return page_ids.get(dest[0].objid)
+    return None
+
+
+def extract_outline(path: str, max_level: int = 1) -> Dict[int, str]:
+    """
+    Signets du PDF jusqu'au niveau `max_level` : {index de page: titre}.
+    Dictionnaire vide si le PDF n'a pas de table des matières exploitable.
+    """
+    from pdfminer.pdfdocument import PDFNoOutlines
+
+    starts: Dict[int, str] = {}
+    with pdfplumber.open(path) as pdf:
+        page_ids = {page.page_obj.pageid: i for i, page in enumerate(pdf.pages)}
+        try:
+            outlines = list(pdf.doc.get_outlines())
+        except PDFNoOutlines:
+            return {}
+        except Exception:
+            return {}
+        for level, title, dest, action, _ in outlines:
+            if level > max_level or not title:
+                continue
+            try:
+                page_index = _dest_page(pdf.doc, dest, action, page_ids)
+            except Exception:
+                continue
+            if page_index is not None and page_index not in starts:
+                starts[page_index] = " ".join(str(title).split())
+    return starts
+
+
+def detect_heading(page_text: str, max_lines: int = 3) -> Optional[str]:
+    """Titre de chapitre en haut de page (heuristique), ou None."""
+    seen = 0
+    for line in page_text.splitlines():
+        line = " ".join(line.split())
+        if not line:
+            continue
+        if _HEADING.match(line) or _STANDALONE_HEADING.match(line):
+            return line
+        seen += 1
+        if seen >= max_lines:
+            break
+    return None
+
+
+def _normalize_title(title: str) -> str:
+    return " ".join(title.split()).casefold()
+
+
+class ChapterTracker:
+    """
+    Attribue un numéro de chapitre à chaque page, dans l'ordre du flux.
+    Utilise les signets s'il y en a, sinon l'heuristique de titres.
+    """
+
+    def __init__(self, outline: Dict[int, str], default_title: str):
+        self.outline = outline
+        self.titles: List[str] = []
+        self.default_title = default_title
+
+    def section_for(self, page_index: int, page_text: str) -> int:
+        if self.outline:
+            title = self.outline.get(page_index)
+        else:
+            title = detect_heading(page_text)
+            # En-tête courant (titre répété en haut de chaque page) : même section
+            if title and self.titles and _normalize_title(title) == _normalize_title(self.titles[-1]):
+                title = None
+        if title or not self.titles:
+            self.titles.append(title or self.default_title)
+        return len(self.titles) - 1
+
+
+# ---------- Durées et métadonnées ----------
+
+def audio_duration(path: str) -> float:
+    """Durée (secondes) d'un fichier audio, via ffprobe."""
+    out = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=nw=1:nk=1", path],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+    )
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr)
+    return float(out.stdout.strip())
+
+
+def build_chapters(titles: List[str], chunk_sections: List[int], durations: List[float]) -> List[dict]:
+    """
+    Chapitres avec positions en secondes et plage de morceaux
+    (`first_chunk`/`last_chunk`, index à partir de 1).
+    """
+    chapters: List[dict] = []
+    t = 0.0
+    for i, (section, dur) in enumerate(zip(chunk_sections, durations), start=1):
+        if not chapters or chapters[-1]["index"] != section:
+            chapters.append({
+                "index": section,
+                "title": titles[section],
+                "start_sec": round(t, 3),
+                "end_sec": round(t, 3),
+                "first_chunk": i,
+                "last_chunk": i,
+            })
+        t += dur
+        chapters[-1]["end_sec"] = round(t, 3)
+        chapters[-1]["last_chunk"] = i
+    return chapters
+
+
+def _ffmeta_escape(value: str) -> str:
+    return re.sub(r"([=;#\\\n])", r"\\\1", value)
+
+
+def write_ffmetadata(chapters: List[dict], out_path: str, title: Optional[str] = None) -> None:
+    lines = [";FFMETADATA1"]
+    if title:
+        lines.append(f"title={_ffmeta_escape(title)}")
+    for ch in chapters:
+        lines += [
+            "",
+            "[CHAPTER]",
+            "TIMEBASE=1/1000",
+            f"START={int(ch['start_sec'] * 1000)}",
+            f"END={int(ch['end_sec'] * 1000)}",
+            f"title={_ffmeta_escape(ch['title'])}",
+        ]
+    with open(out_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def write_chapters_json(chapters: List[dict], out_path: str) -> None:
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump({"chapters": chapters}, f, ensure_ascii=False, indent=2)
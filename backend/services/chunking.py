@@ -0,0 +1,129 @@
+# backend/services/chunking.py
+"""
+Découpage du texte en morceaux pour la synthèse vocale.
+
+Le texte arrive page par page (flux) ; on reconstitue les paragraphes
+(y compris ceux coupés par un saut de page), on les découpe en phrases,
+puis on remplit chaque morceau jusqu'à la limite du provider TTS.
+Tout est linéaire en taille du texte et rien n'est jamais tronqué :
+une phrase trop longue est coupée sur une ponctuation ou un espace.
+"""
+import itertools
+import re
+from typing import Iterable, Iterator, List, Tuple
+
+# Fin de phrase : ponctuation finale + guillemets/parenthèses fermants éventuels
+_SENTENCE_END = re.compile(r'[.!?…]+["»”’)\]]*(?=\s|$)')
+_PARAGRAPH_BREAK = re.compile(r"\n[ \t\f\v]*\n")
+_CLAUSE_BREAKS = ("; ", ": ", ", ", " – ", " - ")
+
+
+def _join_lines(paragraph: str) -> str:
+    """Recolle les lignes d'un paragraphe (et les mots coupés par un tiret en fin de ligne)."""
+    out: List[str] = []
+    for line in paragraph.splitlines():
+        line = " ".join(line.split())
+        if not line:
+            continue
+        if out and out[-1].endswith("-") and line[0].islower():
+            out[-1] = out[-1][:-1] + line
+        else:
+            out.append(line)
+    return " ".join(out)
+
+
+def _ends_sentence(text: str) -> bool:
+    return bool(_SENTENCE_END.search(text[-8:]))
+
+
+def iter_paragraphs(pages: Iterable[str], max_carry: int = 5000) -> Iterator[str]:
+    """
+    Paragraphes normalisés, dans l'ordre. Un paragraphe non terminé en bas de
+    page est recollé au premier paragraphe de la page suivante (borné par
+    `max_carry` pour rester linéaire sur du texte sans ponctuation).
+    """
+    carry = ""
+    for page in pages:
+        paras = [p for p in (_join_lines(raw) for raw in _PARAGRAPH_BREAK.split(page)) if p]
+        if not paras:
+            continue
+        if carry:
+            paras[0] = f"{carry} {paras[0]}"
+            carry = ""
+        if not _ends_sentence(paras[-1]) and len(paras[-1]) < max_carry:
+            carry = paras.pop()
+        yield from paras
+    if carry:
+        yield carry
+
+
+def split_sentences(paragraph: str) -> Iterator[str]:
+    start = 0
+    for m in _SENTENCE_END.finditer(paragraph):
+        sentence = paragraph[start:m.end()].strip()
+        if sentence:
+            yield sentence
+        start = m.end()
+    tail = paragraph[start:].strip()
+    if tail:
+        yield tail
+
+
+def _split_long(sentence: str, max_chars: int) -> Iterator[str]:
+    """Coupe une phrase plus longue que `max_chars` : ponctuation > espace > coupe franche."""
+    while len(sentence) > max_chars:
+        window = sentence[:max_chars]
+        cut = -1
+        for sep in _CLAUSE_BREAKS:
+            pos = window.rfind(sep)
+            if pos >= max_chars // 2:
+                cut = pos + len(sep.rstrip())
+                break
+        if cut < 0:
+            cut = window.rfind(" ")
+        if cut <= 0:
+            cut = max_chars
+        yield sentence[:cut].strip()
+        sentence = sentence[cut:].strip()
+    if sentence:
+        yield sentence
+
+
+def _pack(pages: Iterable[str], max_chars: int) -> Iterator[str]:
+    buf: List[str] = []
+    size = 0
+    for para in iter_paragraphs(pages, max_carry=max_chars):
+        new_para = True
+        for sentence in split_sentences(para):
+            for piece in _split_long(sentence, max_chars):
+                sep = ("\n\n" if new_para else " ") if buf else ""
+                if size + len(sep) + len(piece) > max_chars:
+                    yield "".join(buf)
+                    buf, size, sep = [], 0, ""
+                buf.append(sep + piece)
+                size += len(sep) + len(piece)
+                new_para = False
+    if buf:
+        yield "".join(buf)
+
+
+def iter_chunks(pages: Iterable[str], max_chars: int = 5000) -> Iterator[str]:
+    """
+    Morceaux prêts pour le TTS : au plus `max_chars` caractères, jamais vides.
+    Le remplissage glouton par phrases regroupe d'office les petits fragments
+    (titres, lignes isolées) avec leurs voisins.
+    """
+    for chunk in _pack(pages, max_chars):
+        if chunk.strip():
+            yield chunk
+
+
+def iter_section_chunks(sections: Iterable[Tuple[int, str]], max_chars: int = 5000) -> Iterator[Tuple[int, str]]:
+    """
+    Comme `iter_chunks`, pour des pages étiquetées par section (chapitre) :
+    `(index_de_section, texte_de_page)` avec un index croissant. Aucun
+    morceau ne chevauche deux sections. Émet `(index_de_section, morceau)`.
+    """
+    for section, group in itertools.groupby(sections, key=lambda item: item[0]):
+        for chunk in iter_chunks((text for _, text in group), max_chars=max_chars):
+            yield section, chunk
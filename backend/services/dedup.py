@@ -0,0 +1,192 @@
+# backend/services/dedup.py
+"""
+Déduplication des documents entiers.
+
+Un job est identifié par (sha256 du PDF, voix, langue, PIPELINE_VERSION) :
+  - si un job identique est déjà terminé, le nouveau job reprend ses clés S3
+    et se termine immédiatement (les objets S3 sont partagés, jamais
+    supprimés) ;
+  - si un job identique est en cours, le nouveau job le suit
+    (`source_job_id`) : le worker du job de référence termine aussi ses
+    suiveurs (settle_followers), en succès comme en erreur.
+
+Le job de référence d'une clé « en cours » est réservé dans Redis
+(SET NX, DEDUP_CLAIM_TTL_SEC), ce qui départage deux dépôts simultanés du
+même fichier. Un suiveur dont le job de référence a disparu, est déjà
+terminé, ou n'a pas fini après DEDUP_CLAIM_TTL_SEC (worker tué) est réglé
+à la lecture par l'API (recheck_follower) et par les workers (settle_orphans).
+Augmenter PIPELINE_VERSION quand la sortie change (modèle TTS, encodage...).
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+
+from redis import Redis
+from sqlalchemy import or_, update
+from sqlalchemy.orm import aliased
+from sqlmodel import select
+
+from ..models.db import Job, JobStatus
+from ..settings import settings
+from .events import publish_job_event
+
+INFLIGHT_PREFIX = "dedup:inflight:"
+ORPHAN_ERROR = "Le traitement de référence de ce fichier a été perdu : déposez-le à nouveau."
+
+# Colonnes recopiées du job de référence vers un job dédupliqué
+_OUTCOME_FIELDS = (
+    "status", "error", "duration_sec", "stage", "chunks_done", "chunks_total", "progress",
+    "eta_sec", "encode_sec", "page_count", "preview_text",
+    "output_mp3_key", "output_m4b_key", "chapters_json_key",
+    "output_mp3_url", "output_m4b_url", "chapters_json_url",
+)
+
+
+def dedup_key(content_hash: str, voice: Optional[str], lang: Optional[str]) -> str:
+    return f"{content_hash}:{voice}:{lang}:{settings.PIPELINE_VERSION}"
+
+
+def copy_outcome(target: Job, source: Job) -> None:
+    """Le job `target` prend l'état final (livrables ou erreur) de `source`."""
+    for field in _OUTCOME_FIELDS:
+        setattr(target, field, getattr(source, field))
+
+
+def done_jobs_query(content_hash: str, voice: Optional[str], lang: Optional[str]):
+    """Dernier job terminé réutilisable (index ix_job_dedup)."""
+    return (
+        select(Job)
+        .where(
+            Job.content_hash == content_hash,
+            Job.voice == voice,
+            Job.lang == lang,
+            Job.pipeline_version == settings.PIPELINE_VERSION,
+            Job.status == JobStatus.DONE,
+            Job.output_mp3_key.is_not(None),
+        )
+        .order_by(Job.created_at.desc())
+        .limit(1)
+    )
+
+
+# ---------- Réservation du job de référence (Redis) ----------
+
+def claim(redis: Redis, key: str, job_id: str) -> Optional[str]:
+    """
+    Réserve la clé pour `job_id`. Retourne None si `job_id` devient le job de
+    référence, sinon l'id du job déjà en cours pour cette clé.
+    """
+    name = INFLIGHT_PREFIX + key
+    for _ in range(2):
+        if redis.set(name, job_id, nx=True, ex=settings.DEDUP_CLAIM_TTL_SEC):
+            return None
+        leader = redis.get(name)
+        if leader is not None:
+            return leader.decode()
+    return None
+
+
+def take_over(redis: Redis, key: str, job_id: str) -> None:
+    """Le job de référence réservé n'existe plus : `job_id` le remplace."""
+    redis.set(INFLIGHT_PREFIX + key, job_id, ex=settings.DEDUP_CLAIM_TTL_SEC)
+
+
+_redis: Optional[Redis] = None
+
+
+def _release_claim(job: Job) -> None:
+    global _redis
+    if not job.content_hash:
+        return
+    try:
+        if _redis is None:
+            _redis = Redis.from_url(settings.REDIS_URL)
+        name = INFLIGHT_PREFIX + dedup_key(job.content_hash, job.voice, job.lang)
+        if _redis.get(name) == job.id.encode():
+            _redis.delete(name)
+    except Exception:
+        pass
+
+
+# ---------- Fin du job de référence (worker) ----------
+
+def settle_followers(session, source: Job) -> int:
+    """
+    Propage l'état final de `source` (DONE ou ERROR) aux jobs qui le suivent,
+    puis libère la réservation. Retourne le nombre de suiveurs terminés.
+    """
+    follower_ids = list(session.exec(
+        select(Job.id).where(
+            Job.source_job_id == source.id,
+            Job.status.in_([JobStatus.PENDING, JobStatus.RUNNING]),
+        )
+    ))
+    if follower_ids:
+        values = {field: getattr(source, field) for field in _OUTCOME_FIELDS}
+        session.execute(update(Job).where(Job.id.in_(follower_ids)).values(**values))
+        session.commit()
+    for follower_id in follower_ids:
+        follower = session.get(Job, follower_id)
+        if follower is not None:
+            publish_job_event(follower)
+    _release_claim(source)
+    try:
+        settle_orphans(session)  # suiveurs d'autres jobs de référence perdus (worker tué)
+    except Exception:
+        session.rollback()
+    return len(follower_ids)
+
+
+# ---------- Suiveurs orphelins ----------
+
+def _resolve_follower(follower: Job, leader: Optional[Job]) -> bool:
+    """
+    Règle `follower` si son job de référence ne le fera pas : terminé
+    (résultat recopié), disparu ou bloqué depuis DEDUP_CLAIM_TTL_SEC (erreur).
+    Retourne True si `follower` a changé.
+    """
+    if leader is not None and leader.status in (JobStatus.DONE, JobStatus.ERROR):
+        copy_outcome(follower, leader)
+        return True
+    stale_before = datetime.utcnow() - timedelta(seconds=settings.DEDUP_CLAIM_TTL_SEC)
+    if leader is None or leader.created_at < stale_before:
+        follower.status = JobStatus.ERROR
+        follower.error = ORPHAN_ERROR
+        return True
+    return False
+
+
+async def recheck_follower(session, job: Job) -> bool:
+    """API (session asynchrone) : vérifie le job de référence d'un suiveur en attente."""
+    if job.source_job_id is None or job.status not in (JobStatus.PENDING, JobStatus.RUNNING):
+        return False
+    leader = await session.get(Job, job.source_job_id, populate_existing=True)
+    if not _resolve_follower(job, leader):
+        return False
+    session.add(job)
+    await session.commit()
+    return True
+
+
+def settle_orphans(session, limit: int = 100) -> int:
+    """Worker : règle les suiveurs en attente dont le job de référence ne les terminera pas."""
+    leader = aliased(Job)
+    rows = session.exec(
+        select(Job, leader)
+        .join(leader, leader.id == Job.source_job_id, isouter=True)
+        .where(
+            Job.source_job_id.is_not(None),
+            Job.status.in_([JobStatus.PENDING, JobStatus.RUNNING]),
+            or_(
+                leader.id.is_(None),
+                leader.status.in_([JobStatus.DONE, JobStatus.ERROR]),
+                leader.created_at < datetime.utcnow() - timedelta(seconds=settings.DEDUP_CLAIM_TTL_SEC),
+            ),
+        )
+        .limit(limit)
+    ).all()
+    settled = [follower for follower, lead in rows if _resolve_follower(follower, lead)]
+    if settled:
+        session.commit()
+        for follower in settled:
+            publish_job_event(follower)
+    return len(settled)
@@ -0,0 +1,172 @@
+# backend/services/events.py
+"""
+Événements de job via Redis pub/sub.
+
+Le worker publie l'état du job sur `job-events:{job_id}` à chaque changement ;
+côté API, un seul abonnement Redis par processus (JobEventHub) redistribue
+les messages aux flux SSE ouverts. La base n'est plus sollicitée par les
+clients qui suivent un job.
+"""
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Dict, Optional, Set
+
+from redis import Redis
+
+from ..settings import settings
+
+CHANNEL_PREFIX = "job-events:"
+
+
+def job_channel(job_id: str) -> str:
+    return f"{CHANNEL_PREFIX}{job_id}"
+
+
+def job_version(updated_at: Optional[datetime]) -> float:
+    """
+    Version d'un état de job (Job.updated_at en secondes) : le flux SSE
+    écarte un événement plus ancien que l'état déjà envoyé.
+    """
+    if updated_at is None:
+        return 0.0
+    return updated_at.replace(tzinfo=timezone.utc).timestamp()
+
+
+def job_payload(job) -> dict:
+    """État d'un job tel qu'envoyé aux clients (SSE)."""
+    from ..models.db import JobStatus
+    from .storage import output_url
+
+    finished = job.status in (JobStatus.DONE, JobStatus.ERROR)
+    return {
+        "id": job.id,
+        "status": job.status.value,
+        "mp3": output_url(job.output_mp3_key, job.output_mp3_url),
+        "m4b": output_url(job.output_m4b_key, job.output_m4b_url),
+        "hls": None if finished else output_url(job.hls_playlist_key),  # segments signés, périmés après coup
+        "error": job.error,
+        "progress": job_progress(job),
+        "version": job_version(job.updated_at),
+    }
+
+
+def job_progress(job) -> dict:
+    return {
+        "stage": job.stage,
+        "chunks_done": job.chunks_done or 0,
+        "chunks_total": job.chunks_total,
+        "percent": job.progress or 0,
+        "eta_sec": job.eta_sec,
+    }
+
+
+# ---------- Publication (worker, synchrone) ----------
+
+_redis: Optional[Redis] = None
+
+
+def publish_payload(job_id: str, payload: dict) -> None:
+    """Publie un état de job. Ne lève jamais : l'événement est un bonus, la DB fait foi."""
+    global _redis
+    try:
+        if _redis is None:
+            _redis = Redis.from_url(settings.REDIS_URL)
+        _redis.publish(job_channel(job_id), json.dumps(payload))
+    except Exception:
+        pass
+
+
+def publish_job_event(job) -> None:
+    publish_payload(job.id, job_payload(job))
+
+
+# ---------- Abonnement (API, asynchrone) ----------
+
+class JobEventHub:
+    """
+    Un abonnement Redis par processus, redistribué à des files asyncio par job.
+    Si Redis est injoignable ou coupe la connexion, l'abonnement est repris
+    en arrière-plan ; en attendant (`connected` faux), les flux SSE relisent
+    la base toutes les SSE_POLL_SEC secondes.
+    """
+
+    def __init__(self, redis_url: str):
+        self.redis_url = redis_url
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.connected = False
+
+    def _ensure_listener(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        from redis import asyncio as aioredis
+
+        backoff = 1.0
+        while True:
+            client = aioredis.from_url(self.redis_url)
+            pubsub = client.pubsub()
+            try:
+                await pubsub.psubscribe(f"{CHANNEL_PREFIX}*")
+                self.connected = True
+                backoff = 1.0
+                await self._listen(pubsub)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass
+            finally:
+                self.connected = False
+                try:
+                    await pubsub.aclose()
+                    await client.aclose()
+                except Exception:
+                    pass
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+
+    async def _listen(self, pubsub) -> None:
+        async for msg in pubsub.listen():
+            if msg.get("type") != "pmessage":
+                continue
+            channel = msg["channel"]
+            if isinstance(channel, bytes):
+                channel = channel.decode()
+            queues = self._subscribers.get(channel[len(CHANNEL_PREFIX):])
+            if not queues:
+                continue
+            try:
+                payload = json.loads(msg["data"])
+            except ValueError:
+                continue
+            for q in list(queues):
+                if q.full():
+                    q.get_nowait()  # client lent : on garde le plus récent
+                q.put_nowait(payload)
+
+    @asynccontextmanager
+    async def subscribe(self, job_id: str):
+        """File d'événements d'un job, le temps du bloc `async with`."""
+        self._ensure_listener()
+        q: asyncio.Queue = asyncio.Queue(maxsize=100)
+        self._subscribers.setdefault(job_id, set()).add(q)
+        try:
+            yield q
+        finally:
+            subs = self._subscribers.get(job_id)
+            if subs is not None:
+                subs.discard(q)
+                if not subs:
+                    del self._subscribers[job_id]
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
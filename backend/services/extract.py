@@ -1,18 +1,99 @@
-import io, pdfplumber, pytesseract
+import io, multiprocessing, os, pdfplumber, pytesseract
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 from PIL import Image
-from typing import List
+from typing import Iterator, Optional
 
-def extract_text_from_pdf(path: str, lang: str = "fra") -> str:
-    texts: List[str] = []
+from ..settings import settings
+
+# PDF ouvert une seule fois par processus du pool (voir _init_worker)
+_worker_pdf = None
+
+
+def _page_text(page, lang: str, dpi: int) -> str:
+    """Texte d'une page : couche texte si présente, sinon OCR."""
+    txt = page.extract_text() or ""
+    if txt.strip():
+        return txt
+    im = page.to_image(resolution=dpi).original
+    if not isinstance(im, Image.Image):
+        im = Image.open(io.BytesIO(im.tobytes()))
+    return pytesseract.image_to_string(im, lang=lang)
+
+
+def _init_worker(path: str) -> None:
+    global _worker_pdf
+    _worker_pdf = pdfplumber.open(path)
+
+
+def _extract_page(args) -> str:
+    index, lang, dpi = args
+    page = _worker_pdf.pages[index]
+    try:
+        return _page_text(page, lang, dpi)
+    finally:
+        page.close()  # libère le cache d'objets de la page
+
+
+def _worker_count(n_pages: int, workers: Optional[int]) -> int:
+    n = workers if workers is not None else settings.EXTRACT_WORKERS
+    if n <= 0:
+        n = os.cpu_count() or 1
+    return max(1, min(n, n_pages))
+
+
+def count_pages(path: str) -> int:
     with pdfplumber.open(path) as pdf:
-        for page in pdf.pages:
-            txt = page.extract_text() or ""
-            if txt.strip():
-                texts.append(txt)
-            else:
-                im = page.to_image(resolution=300).original
-                if not isinstance(im, Image.Image):
-                    im = Image.open(io.BytesIO(im.tobytes()))
-                ocr = pytesseract.image_to_string(im, lang=lang)
-                texts.append(ocr)
-    return "\n\n".join(texts)
+        return len(pdf.pages)
+
+
+def iter_pages(
+    path: str,
+    lang: str = "fra",
+    workers: Optional[int] = None,
+    dpi: Optional[int] = None,
+    start_page: int = 0,
+) -> Iterator[str]:
+    """
+    Générateur : texte de chaque page (à partir de `start_page`), dans l'ordre
+    des pages, dès qu'il est prêt.
+    Les pages sont réparties sur un pool de processus (EXTRACT_WORKERS) ;
+    l'OCR (rendu à OCR_DPI) ne tourne que sur les pages sans couche texte.
+    """
+    dpi = dpi or settings.OCR_DPI
+    with pdfplumber.open(path) as pdf:
+        n_pages = len(pdf.pages)
+        if start_page >= n_pages:
+            return
+        n_workers = _worker_count(n_pages - start_page, workers)
+        if n_workers == 1:
+            for page in pdf.pages[start_page:]:
+                try:
+                    yield _page_text(page, lang, dpi)
+                finally:
+                    page.close()
+            return
+
+    # Fenêtre bornée de pages en vol : si le consommateur s'arrête (job annulé,
+    # erreur en aval), il ne reste au plus que `window` pages à abandonner.
+    window = n_workers * 2
+    pages = iter(range(start_page, n_pages))
+    pending = deque()
+    # forkserver : le worker a déjà des threads (producteur, HLS, progression)
+    # et des pools Redis/DB ; un fork pourrait copier un verrou tenu ailleurs.
+    pool = ProcessPoolExecutor(
+        max_workers=n_workers, initializer=_init_worker, initargs=(path,),
+        mp_context=multiprocessing.get_context("forkserver"),
+    )
+    try:
+        for i in islice(pages, window):
+            pending.append(pool.submit(_extract_page, (i, lang, dpi)))
+        while pending:
+            # Pages rendues dans l'ordre, au fur et à mesure qu'elles sont prêtes
+            text = pending.popleft().result()
+            for i in islice(pages, 1):
+                pending.append(pool.submit(_extract_page, (i, lang, dpi)))
+            yield text
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
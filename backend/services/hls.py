@@ -0,0 +1,137 @@
+# backend/services/hls.py
+"""
+Lecture progressive (HLS) pendant la synthèse.
+
+Chaque morceau terminé est encodé en segment AAC/MPEG-TS et envoyé sur S3
+(`outputs/{job_id}/hls/00001.ts`), puis la playlist `index.m3u8` est
+réécrite : elle s'allonge au fil des segments (#EXT-X-PLAYLIST-TYPE:EVENT)
+et se ferme (#EXT-X-ENDLIST) quand tous les morceaux sont synthétisés.
+
+Les morceaux finissent dans le désordre (synthèse concurrente) : seuls les
+morceaux contigus depuis le premier sont publiés, avec des horodatages
+continus (-output_ts_offset). Le volume de chaque segment est normalisé en
+une passe ; le MP3/M4B final garde sa normalisation deux passes.
+
+L'encodage et les envois se font dans un thread dédié : la boucle de
+synthèse n'attend jamais ffmpeg ni S3, et un échec HLS n'interrompt pas le job.
+"""
+import math
+import os
+import queue
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from ..settings import settings
+from .chapters import audio_duration
+from .post_audio import LOUDNORM_TARGET, SAMPLE_RATE, run
+from .storage import put_object_s3, signed_url
+
+PLAYLIST_NAME = "index.m3u8"
+
+
+def playlist_key(job_id: str) -> str:
+    return f"outputs/{job_id}/hls/{PLAYLIST_NAME}"
+
+
+def encode_segment(src_path: str, dst_path: str, offset_sec: float) -> None:
+    """Morceau -> segment AAC en MPEG-TS, horodaté à `offset_sec`."""
+    run([
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-i", src_path, "-vn",
+        "-af", f"loudnorm={LOUDNORM_TARGET}",
+        "-ar", str(SAMPLE_RATE), "-c:a", "aac", "-b:a", settings.HLS_BITRATE,
+        "-output_ts_offset", f"{offset_sec:.3f}", "-muxdelay", "0",
+        "-f", "mpegts", dst_path,
+    ])
+
+
+def render_playlist(segments: List[Tuple[str, float]], ended: bool = False) -> str:
+    target = max([math.ceil(duration) for _, duration in segments] or [1])
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        f"#EXT-X-TARGETDURATION:{target}",
+        "#EXT-X-MEDIA-SEQUENCE:0",
+        "#EXT-X-PLAYLIST-TYPE:EVENT",
+    ]
+    for uri, duration in segments:
+        lines.append(f"#EXTINF:{duration:.3f},")
+        lines.append(uri)
+    if ended:
+        lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
+
+
+class HlsPublisher:
+    """
+    Reçoit les morceaux terminés (`add`, non bloquant) et publie segments et
+    playlist depuis un thread. `close()` attend la fin des envois.
+    """
+
+    def __init__(self, job_id: str, work_dir: str):
+        self.job_id = job_id
+        self.key = playlist_key(job_id)
+        self.work_dir = os.path.join(work_dir, "hls")
+        os.makedirs(self.work_dir, exist_ok=True)
+        self.published = False  # au moins une playlist envoyée
+        self.error: Optional[BaseException] = None
+
+        self._pending: Dict[int, str] = {}
+        self._segments: List[Tuple[str, float]] = []
+        self._offset = 0.0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name=f"hls-{job_id}", daemon=True)
+        self._thread.start()
+
+    # ---------- API (thread appelant) ----------
+
+    def add(self, index: int, path: str) -> None:
+        """Morceau `index` (à partir de 1) prêt dans `path`."""
+        self._queue.put((index, path))
+
+    def close(self, ended: bool = True) -> None:
+        """Publie ce qui reste ; `ended` ferme la playlist (tous les morceaux sont là)."""
+        self._queue.put(("end", ended))
+        self._thread.join()
+
+    # ---------- thread de publication ----------
+
+    def _run(self) -> None:
+        while True:
+            index, value = self._queue.get()
+            if index == "end":
+                if value and self.error is None and self._segments:
+                    self._upload_playlist(ended=True)
+                return
+            if self.error is not None:
+                continue
+            self._pending[index] = value
+            try:
+                self._publish_ready()
+            except Exception as e:
+                self.error = e
+
+    def _publish_ready(self) -> None:
+        added = False
+        while len(self._segments) + 1 in self._pending:
+            n = len(self._segments) + 1
+            src = self._pending.pop(n)
+            duration = audio_duration(src)
+            seg_path = os.path.join(self.work_dir, f"{n:05d}.ts")
+            encode_segment(src, seg_path, self._offset)
+            seg_key = f"outputs/{self.job_id}/hls/{n:05d}.ts"
+            put_object_s3(seg_path, seg_key)
+            os.remove(seg_path)
+            self._segments.append((signed_url(seg_key), duration))
+            self._offset += duration
+            added = True
+        if added:
+            self._upload_playlist(ended=False)
+
+    def _upload_playlist(self, ended: bool) -> None:
+        path = os.path.join(self.work_dir, PLAYLIST_NAME)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(render_playlist(self._segments, ended=ended))
+        # Playlist vivante : pas de cache côté client ni CDN
+        put_object_s3(path, self.key, cache_control="no-cache")
+        self.published = True
@@ -1,60 +1,132 @@
 # backend/services/post_audio.py
+import json
+import math
 import os
 import subprocess
-from typing import List
+import time
+from typing import List, Optional
 
-def run(cmd: list[str]) -> None:
+# Cible EBU R128
+LOUDNORM_TARGET = "I=-18:TP=-1.5:LRA=11"
+SAMPLE_RATE = 44100
+MP3_BITRATE = "192k"
+AAC_BITRATE = "128k"
+
+
+def run(cmd: list[str]) -> str:
     p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
     if p.returncode != 0:
         raise RuntimeError(p.stdout)
+    return p.stdout
 
-def concat_and_normalize(inputs: List[str], out_mp3: str) -> None:
-    """
-    Concatène des morceaux MP3 puis normalise.
-    On utilise concat demuxer + loudnorm EBU R128.
-    """
-    if not inputs:
-        raise ValueError("No input pieces to concatenate")
 
-    # 1) Fichier de liste pour concat demuxer
-    lst_path = out_mp3 + ".list.txt"
+def _write_concat_list(inputs: List[str], lst_path: str) -> None:
     with open(lst_path, "w") as f:
         for p in inputs:
             f.write(f"file '{os.path.abspath(p)}'\n")
 
-    # 2) Concat + normalisation (sortie MP3)
-    # Deux passes loudnorm donneraient un meilleur résultat, ici on fait simple.
-    tmp_path = out_mp3 + ".tmp.mp3"
-    run([
-        "ffmpeg", "-y",
+
+def measure_loudness(lst_path: str) -> Optional[dict]:
+    """
+    Passe 1 de loudnorm : analyse seule (décodage, aucun encodage).
+    Renvoie les mesures, ou None si elles sont inexploitables (silence...).
+    """
+    out = run([
+        "ffmpeg", "-hide_banner", "-nostats", "-y",
         "-f", "concat", "-safe", "0", "-i", lst_path,
-        "-filter:a", "loudnorm=I=-18:TP=-1.5:LRA=11",
-        "-c:a", "libmp3lame", "-b:a", "192k",
-        tmp_path
+        "-af", f"loudnorm={LOUDNORM_TARGET}:print_format=json",
+        "-f", "null", "-",
     ])
-
-    os.replace(tmp_path, out_mp3)
+    start, end = out.rfind("{"), out.rfind("}")
+    if start < 0 or end < start:
+        return None
     try:
-        os.remove(lst_path)
-    except OSError:
-        pass
+        stats = json.loads(out[start:end + 1])
+        values = {k: float(stats[k]) for k in ("input_i", "input_tp", "input_lra", "input_thresh", "target_offset")}
+    except (KeyError, ValueError):
+        return None
+    if not all(math.isfinite(v) for v in values.values()):
+        return None
+    return values
+
+
+def _loudnorm_filter(measured: Optional[dict]) -> str:
+    if measured is None:
+        return f"loudnorm={LOUDNORM_TARGET}"
+    return (
+        f"loudnorm={LOUDNORM_TARGET}"
+        f":measured_I={measured['input_i']}"
+        f":measured_TP={measured['input_tp']}"
+        f":measured_LRA={measured['input_lra']}"
+        f":measured_thresh={measured['input_thresh']}"
+        f":offset={measured['target_offset']}"
+        ":linear=true"
+    )
 
 
-def make_m4b_from_mp3(mp3_path: str, chapters: list[str], out_m4b: str) -> None:
+def assemble_audio(
+    inputs: List[str],
+    out_mp3: Optional[str],
+    out_m4b: Optional[str] = None,
+    metadata_path: Optional[str] = None,
+) -> dict:
     """
-    Convertit un MP3 final en M4B (AAC). Le conteneur m4b (MP4) n'accepte pas MP3,
-    il faut transcoder en AAC.
+    Assemble les morceaux en une seule passe d'encodage :
+    concat -> loudnorm (paramètres mesurés en passe 1) -> asplit -> MP3 + M4B.
+    Les morceaux ne sont décodés qu'une fois pour l'encodage, et le M4B est
+    encodé depuis le même signal que le MP3 (pas de transcodage MP3 -> AAC).
+    `metadata_path` : fichier ffmetadata (chapitres) appliqué au M4B.
+    Renvoie les temps de mesure et d'encodage (secondes).
     """
-    if not os.path.exists(mp3_path):
-        raise FileNotFoundError(mp3_path)
-
-    # NB: -f ipod est adapté aux .m4b, sinon -f mp4 fonctionne aussi.
-    run([
-        "ffmpeg", "-y",
-        "-i", mp3_path,
-        "-vn",
-        "-c:a", "aac", "-b:a", "128k",
-        "-movflags", "faststart",
-        "-f", "ipod",
-        out_m4b
-    ])
+    if not inputs:
+        raise ValueError("No input pieces to concatenate")
+    outputs = [p for p in (out_mp3, out_m4b) if p]
+    if not outputs:
+        raise ValueError("No output requested")
+
+    base = outputs[0]
+    lst_path = base + ".list.txt"
+    _write_concat_list(inputs, lst_path)
+
+    timings = {}
+    try:
+        t0 = time.perf_counter()
+        measured = measure_loudness(lst_path)
+        timings["measure_sec"] = round(time.perf_counter() - t0, 3)
+
+        labels = [f"[a{i}]" for i in range(len(outputs))]
+        graph = f"[0:a]{_loudnorm_filter(measured)},aresample={SAMPLE_RATE}"
+        graph += f",asplit={len(outputs)}{''.join(labels)}" if len(outputs) > 1 else labels[0]
+
+        cmd = ["ffmpeg", "-hide_banner", "-nostats", "-y", "-f", "concat", "-safe", "0", "-i", lst_path]
+        if metadata_path and out_m4b:
+            cmd += ["-f", "ffmetadata", "-i", metadata_path]
+        cmd += ["-filter_complex", graph]
+
+        tmp_paths = []
+        for label, out in zip(labels, outputs):
+            tmp = out + ".tmp"
+            tmp_paths.append((tmp, out))
+            cmd += ["-map", label]
+            if out == out_mp3:
+                cmd += ["-c:a", "libmp3lame", "-b:a", MP3_BITRATE, "-f", "mp3"]
+            else:
+                if metadata_path:
+                    cmd += ["-map_metadata", "1", "-map_chapters", "1"]
+                # NB: -f ipod est adapté aux .m4b
+                cmd += ["-c:a", "aac", "-b:a", AAC_BITRATE, "-movflags", "faststart", "-f", "ipod"]
+            cmd.append(tmp)
+
+        t0 = time.perf_counter()
+        run(cmd)
+        timings["encode_sec"] = round(time.perf_counter() - t0, 3)
+        timings["two_pass"] = measured is not None
+
+        for tmp, out in tmp_paths:
+            os.replace(tmp, out)
+    finally:
+        try:
+            os.remove(lst_path)
+        except OSError:
+            pass
+    return timings
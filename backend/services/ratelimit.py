@@ -0,0 +1,236 @@
+# backend/services/ratelimit.py
+"""
+Limiteur des appels TTS partagé par tous les workers (état dans Redis).
+
+Par provider, trois limites s'appliquent avant chaque requête :
+  - concurrence : au plus `limit` requêtes en vol dans toute la flotte
+    (baux dans un ZSET, expirés si un worker meurt en pleine requête) ;
+  - quota de caractères : seau à jetons de TTS_LIMIT_CHARS_PER_SEC,
+    TTS_LIMIT_BURST_SEC secondes de réserve (désactivé à 0) ;
+  - pause : après un 429, plus personne n'appelle le provider avant la fin
+    du Retry-After.
+
+`limit` s'ajuste en AIMD entre TTS_LIMIT_MIN_CONCURRENCY et
+TTS_LIMIT_MAX_CONCURRENCY : +1/limit par requête réussie (≈ +1 par
+« fenêtre » de requêtes), multiplié par TTS_LIMIT_DECREASE sur un 429 ou une
+latence au-delà de TTS_LIMIT_LATENCY_SEC, au plus une fois par pause (une
+rafale de 429 ne divise pas la limite dix fois).
+
+Les latences des requêtes réussies sont gardées à côté (liste des
+TTS_HEDGE_WINDOW dernières) : le délai de relance (hedging) d'un worker RQ
+tout juste démarré repose sur l'historique de toute la flotte.
+
+Les mises à jour passent par des transactions WATCH/MULTI. Si Redis est
+indisponible, le limiteur laisse passer : il ne doit jamais faire échouer un job.
+"""
+import asyncio
+import email.utils
+import random
+import time
+import uuid
+from typing import List, Optional
+
+from redis import Redis
+from redis.exceptions import RedisError, WatchError
+
+from ..settings import settings
+
+KEY_PREFIX = "tts:limit:"
+
+
+class RateLimited(RuntimeError):
+    """Le provider refuse la requête (429/503) ; `retry_after` en secondes si annoncé."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """En-tête Retry-After : nombre de secondes ou date HTTP."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+class TtsLimiter:
+    def __init__(self, connection: Redis, provider: str):
+        self.redis = connection
+        self.provider = provider
+        self.state_key = f"{KEY_PREFIX}{provider}:state"
+        self.leases_key = f"{KEY_PREFIX}{provider}:leases"
+        self.latency_key = f"{KEY_PREFIX}{provider}:latency"
+        self.waited_sec = 0.0  # attente cumulée de ce processus (statistiques)
+
+    # ---------- API (boucle d'événements) ----------
+
+    async def acquire(self, chars: int, deadline: Optional[float] = None) -> Optional[str]:
+        """
+        Attend une place pour une requête de `chars` caractères et retourne
+        le bail à passer à `release`. Lève RateLimited si `deadline`
+        (time.monotonic()) est dépassée avant d'obtenir une place.
+        """
+        started = time.monotonic()
+        while True:
+            try:
+                lease, wait = await self._try_acquire_async(chars)
+            except RedisError:
+                return None
+            if lease is not None:
+                self.waited_sec += time.monotonic() - started
+                return lease
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise RateLimited(f"TTS {self.provider}: limite de débit, attente trop longue")
+            # Gigue : les workers en attente ne repartent pas tous ensemble
+            await asyncio.sleep(wait * random.uniform(1.0, 1.25))
+
+    async def _try_acquire_async(self, chars: int):
+        """
+        _try_acquire dans un thread. Le thread ne s'interrompt pas : si la
+        tâche est annulée (relance perdante) pendant qu'il tourne, on attend
+        sa fin et on rend le bail qu'il a pu prendre avant de propager l'annulation.
+        """
+        attempt = asyncio.ensure_future(asyncio.to_thread(self._try_acquire, chars))
+        try:
+            return await asyncio.shield(attempt)
+        except asyncio.CancelledError:
+            try:
+                lease, _ = await asyncio.shield(attempt)
+            except (asyncio.CancelledError, RedisError):
+                raise  # bail éventuel expiré avec son score (TTS_TIMEOUT_SEC + 30 s)
+            await asyncio.shield(self.release(lease))
+            raise
+
+    async def release(self, lease: Optional[str], latency: Optional[float] = None,
+                      throttled: bool = False, retry_after: Optional[float] = None) -> None:
+        """
+        Rend le bail et ajuste la limite : `latency` pour une requête réussie,
+        `throttled` (et `retry_after`) pour un refus du provider. Sans l'un ni
+        l'autre (autre erreur), la limite ne bouge pas.
+        """
+        if lease is None:
+            return
+        try:
+            await asyncio.to_thread(self._release, lease, latency, throttled, retry_after)
+        except RedisError:
+            pass
+
+    async def latencies(self) -> Optional[List[float]]:
+        """Latences récentes du provider, toute la flotte (None si Redis est indisponible)."""
+        try:
+            raw = await asyncio.to_thread(self.redis.lrange, self.latency_key, 0, -1)
+        except RedisError:
+            return None
+        return [float(v) for v in raw]
+
+    def current_limit(self) -> float:
+        raw = self.redis.hget(self.state_key, "limit")
+        return float(raw) if raw is not None else float(self._max())
+
+    # ---------- transactions Redis ----------
+
+    @staticmethod
+    def _max() -> int:
+        return max(1, settings.TTS_LIMIT_MAX_CONCURRENCY)
+
+    @staticmethod
+    def _min() -> int:
+        return max(1, min(settings.TTS_LIMIT_MIN_CONCURRENCY, settings.TTS_LIMIT_MAX_CONCURRENCY))
+
+    def _read_state(self, pipe, now: float) -> dict:
+        raw = pipe.hgetall(self.state_key)
+        state = {k.decode(): float(v) for k, v in raw.items()}
+        rate = settings.TTS_LIMIT_CHARS_PER_SEC
+        capacity = rate * settings.TTS_LIMIT_BURST_SEC
+        state.setdefault("limit", float(self._max()))
+        state.setdefault("until", 0.0)
+        state.setdefault("hold", 0.0)  # pas de nouvelle décroissance avant cette date
+        if rate > 0:
+            tokens = state.get("tokens", capacity)
+            elapsed = max(0.0, now - state.get("ts", now))
+            state["tokens"] = min(capacity, tokens + elapsed * rate)
+        state["ts"] = now
+        return state
+
+    def _try_acquire(self, chars: int):
+        """Retourne (bail, None) ou (None, secondes à attendre avant de réessayer)."""
+        rate = settings.TTS_LIMIT_CHARS_PER_SEC
+        poll = settings.TTS_LIMIT_POLL_SEC
+        while True:
+            with self.redis.pipeline() as pipe:
+                try:
+                    pipe.watch(self.state_key, self.leases_key)
+                    now = time.time()
+                    state = self._read_state(pipe, now)
+                    if state["until"] > now:
+                        return None, state["until"] - now
+                    pipe.zremrangebyscore(self.leases_key, "-inf", now)
+                    in_flight = pipe.zcard(self.leases_key)
+                    if in_flight >= int(state["limit"]):
+                        return None, poll
+                    if rate > 0:
+                        # Un morceau plus gros que la réserve passe quand le seau est plein
+                        cost = min(float(chars), rate * settings.TTS_LIMIT_BURST_SEC)
+                        if state["tokens"] < cost:
+                            return None, max(poll, (cost - state["tokens"]) / rate)
+                        state["tokens"] -= cost
+                    lease = uuid.uuid4().hex
+                    pipe.multi()
+                    pipe.zadd(self.leases_key, {lease: now + settings.TTS_TIMEOUT_SEC + 30})
+                    pipe.hset(self.state_key, mapping=state)
+                    pipe.execute()
+                    return lease, None
+                except WatchError:
+                    continue
+
+    def _release(self, lease: str, latency: Optional[float], throttled: bool,
+                 retry_after: Optional[float]) -> None:
+        while True:
+            with self.redis.pipeline() as pipe:
+                try:
+                    pipe.watch(self.state_key)
+                    now = time.time()
+                    state = self._read_state(pipe, now)
+                    limit = state["limit"]
+                    slow = latency is not None and latency > settings.TTS_LIMIT_LATENCY_SEC
+                    if throttled:
+                        pause = retry_after if retry_after is not None else settings.TTS_LIMIT_BACKOFF_SEC
+                        state["until"] = max(state["until"], now + pause)
+                    if throttled or slow:
+                        # Décroissance multiplicative, une seule fois par pause
+                        if now >= state["hold"]:
+                            state["limit"] = max(float(self._min()), limit * settings.TTS_LIMIT_DECREASE)
+                            state["hold"] = max(state["until"], now + 1.0)
+                    elif latency is not None:
+                        state["limit"] = min(float(self._max()), limit + 1.0 / max(limit, 1.0))
+                    pipe.multi()
+                    pipe.zrem(self.leases_key, lease)
+                    pipe.hset(self.state_key, mapping=state)
+                    if latency is not None and not throttled:
+                        pipe.lpush(self.latency_key, latency)
+                        pipe.ltrim(self.latency_key, 0, max(1, settings.TTS_HEDGE_WINDOW) - 1)
+                    pipe.execute()
+                    return
+                except WatchError:
+                    continue
+
+
+_limiters: dict = {}
+
+
+def get_tts_limiter(provider: str) -> Optional[TtsLimiter]:
+    if not settings.TTS_LIMIT_ENABLED:
+        return None
+    limiter = _limiters.get(provider)
+    if limiter is None:
+        limiter = _limiters[provider] = TtsLimiter(Redis.from_url(settings.REDIS_URL), provider)
+    return limiter
@@ -0,0 +1,240 @@
+# backend/services/scheduler.py
+"""
+Ordonnancement des jobs au-dessus de RQ.
+
+- Chaque job est rangé dans une file par classe de taille (small / medium /
+  large) selon son nombre de pages, estimé à l'upload. Les workers écoutent
+  les files dans cet ordre : RQ dépile toujours la première file non vide,
+  les petits documents passent donc devant les gros.
+- Un utilisateur a au plus SCHED_USER_MAX_ACTIVE jobs dans les files RQ ou en
+  cours. Au-delà, ses jobs attendent dans un ZSET Redis trié par nombre de
+  pages et ne sont mis en file qu'à la fin d'un de ses jobs (release()).
+
+Les créneaux actifs sont horodatés : un créneau plus vieux que
+SCHED_SLOT_TTL_SEC (worker tué sans release) est ignoré puis purgé.
+
+Avec JOB_PIPELINE=stages, le job est une suite de tâches RQ (extract ->
+synthesize -> assemble -> upload), chacune dans `{RQ_QUEUE_NAME}:{étape}:{taille}` :
+chaque type de worker (OCR, TTS, ...) n'écoute que les files de ses étapes.
+Le créneau de l'utilisateur est tenu jusqu'à la fin de la dernière étape.
+
+Le plafond ne doit pas laisser des workers inactifs : quand plus aucune file
+RQ n'a de job en attente et qu'un worker de la file visée est libre (ou se
+libère : celui qui termine le job appelant release()), un job en attente
+(le plus court, tous utilisateurs confondus) est mis en file malgré le plafond.
+"""
+import json
+import time
+from typing import List, Optional, Sequence
+
+from redis import Redis
+from redis.exceptions import WatchError
+from rq import Queue, Retry, Worker, get_current_job
+from rq.worker import WorkerStatus
+
+from ..settings import settings
+
+SIZE_CLASSES = ("small", "medium", "large")  # ordre de priorité des workers
+STAGES = ("extract", "synthesize", "assemble", "upload")
+
+# Chemins importables plutôt que les fonctions : pas d'import circulaire avec le worker
+PROCESS_JOB = "backend.workers.processor.process_job"
+STAGE_TASKS = {stage: f"backend.workers.processor.{stage}_stage" for stage in STAGES}
+
+
+def size_class(pages: Optional[int]) -> str:
+    if pages is None:
+        return "medium"  # PDF illisible à l'upload : ni prioritaire ni relégué
+    if pages <= settings.SCHED_SMALL_MAX_PAGES:
+        return "small"
+    if pages <= settings.SCHED_MEDIUM_MAX_PAGES:
+        return "medium"
+    return "large"
+
+
+def queue_name(size: str, stage: Optional[str] = None) -> str:
+    if stage:
+        return f"{settings.RQ_QUEUE_NAME}:{stage}:{size}"
+    return f"{settings.RQ_QUEUE_NAME}:{size}"
+
+
+def worker_queues(stages: Optional[Sequence[str]] = None) -> List[str]:
+    """
+    Files à passer à `rq worker`, par priorité. Sans `stages` : files du
+    pipeline en une tâche (la file historique en dernier). Avec `stages` :
+    files de ces étapes, dans l'ordre donné puis par taille.
+    """
+    if stages:
+        return [queue_name(size, stage) for stage in stages for size in SIZE_CLASSES]
+    return [queue_name(size) for size in SIZE_CLASSES] + [settings.RQ_QUEUE_NAME]
+
+
+def all_queues() -> List[str]:
+    """Toutes les files de jobs, pipeline par étapes puis en une tâche."""
+    return worker_queues(STAGES) + worker_queues()
+
+
+class JobScheduler:
+    _WAITING_USERS = "sched:waiting_users"  # utilisateurs ayant des jobs en attente
+
+    def __init__(self, connection: Redis, max_active: Optional[int] = None):
+        self.redis = connection
+        self.max_active = max_active if max_active is not None else settings.SCHED_USER_MAX_ACTIVE
+
+    @staticmethod
+    def _running_key(user_id: str) -> str:
+        return f"sched:user:{user_id}:running"
+
+    @staticmethod
+    def _waiting_key(user_id: str) -> str:
+        return f"sched:user:{user_id}:waiting"
+
+    def submit(self, job_id: str, user_id: str, input_path: str, voice: str, lang: str,
+               pages: Optional[int] = None) -> Optional[str]:
+        """
+        Enregistre le job puis le met en file si l'utilisateur a un créneau
+        libre. Retourne le nom de la file RQ, ou None si le job attend.
+        """
+        spec = {
+            "job_id": job_id, "user_id": user_id, "input_path": input_path,
+            "voice": voice, "lang": lang, "pages": pages,
+        }
+        score = pages if pages is not None else settings.SCHED_MEDIUM_MAX_PAGES
+        self.redis.zadd(self._waiting_key(user_id), {json.dumps(spec, sort_keys=True): score})
+        self.redis.sadd(self._WAITING_USERS, user_id)
+        queued = self._drain(user_id)
+        queued.update(self._fill_idle())
+        return queued.get(job_id)
+
+    def release(self, user_id: Optional[str], job_id: str) -> None:
+        """Libère le créneau d'un job terminé (DONE ou ERROR définitive)."""
+        if not user_id:
+            return
+        self.redis.zrem(self._running_key(user_id), job_id)
+        self._drain(user_id)
+        self._fill_idle()
+
+    def active_count(self, user_id: str) -> int:
+        return self.redis.zcount(self._running_key(user_id), time.time() - settings.SCHED_SLOT_TTL_SEC, "+inf")
+
+    def waiting_count(self, user_id: str) -> int:
+        return self.redis.zcard(self._waiting_key(user_id))
+
+    def _drain(self, user_id: str) -> dict:
+        """Met en file les jobs en attente tant que l'utilisateur a des créneaux."""
+        queued = {}
+        while True:
+            spec = self._promote_one(user_id)
+            if spec is None:
+                return queued
+            queued[spec["job_id"]] = self._enqueue(spec)
+
+    def _fill_idle(self) -> dict:
+        """Files RQ vides : un job en attente part malgré le plafond de son utilisateur."""
+        if any(self.redis.llen(Queue(name, connection=self.redis).key) for name in all_queues()):
+            return {}
+        best = None
+        for raw_user in self.redis.smembers(self._WAITING_USERS):
+            user_id = raw_user.decode()
+            head = self.redis.zrange(self._waiting_key(user_id), 0, 0, withscores=True)
+            if not head:
+                self.redis.srem(self._WAITING_USERS, user_id)
+                continue
+            if best is None or head[0][1] < best[2]:
+                best = (user_id, json.loads(head[0][0]), head[0][1])
+        if best is None or not self._worker_available(self._target_queue(best[1])):
+            return {}
+        spec = self._promote_one(best[0], force=True)
+        return {spec["job_id"]: self._enqueue(spec)} if spec else {}
+
+    def _worker_available(self, name: str) -> bool:
+        """Un worker écoutant `name` est inactif, ou c'est celui qui exécute l'appelant."""
+        current = get_current_job(connection=self.redis)
+        current_worker = current.worker_name if current is not None else None
+        for worker in Worker.all(connection=self.redis):
+            if name not in worker.queue_names():
+                continue
+            if worker.name == current_worker or worker.get_state() == WorkerStatus.IDLE:
+                return True
+        return False
+
+    def _promote_one(self, user_id: str, force: bool = False) -> Optional[dict]:
+        running = self._running_key(user_id)
+        waiting = self._waiting_key(user_id)
+        while True:
+            with self.redis.pipeline() as pipe:
+                try:
+                    pipe.watch(running, waiting)
+                    now = time.time()
+                    active = pipe.zcount(running, now - settings.SCHED_SLOT_TTL_SEC, "+inf")
+                    head = pipe.zrange(waiting, 0, 0)
+                    if not head or (active >= self.max_active and not force):
+                        return None
+                    spec = json.loads(head[0])
+                    pipe.multi()
+                    pipe.zremrangebyscore(running, "-inf", now - settings.SCHED_SLOT_TTL_SEC)
+                    pipe.zrem(waiting, head[0])
+                    pipe.zadd(running, {spec["job_id"]: now})
+                    pipe.execute()
+                    return spec
+                except WatchError:
+                    continue
+
+    @staticmethod
+    def _target_queue(spec: dict) -> str:
+        """File RQ où part un job promu (première étape avec JOB_PIPELINE=stages)."""
+        stage = STAGES[0] if settings.JOB_PIPELINE == "stages" else None
+        return queue_name(size_class(spec["pages"]), stage)
+
+    def _enqueue(self, spec: dict) -> str:
+        if settings.JOB_PIPELINE == "stages":
+            return self.enqueue_stage(STAGES[0], spec)
+        return self._enqueue_task(PROCESS_JOB, self._target_queue(spec), spec, spec["job_id"])
+
+    def enqueue_stage(self, stage: str, spec: dict) -> str:
+        """Met en file une étape du job (appelé par le worker à la fin de l'étape précédente)."""
+        name = queue_name(size_class(spec["pages"]), stage)
+        return self._enqueue_task(STAGE_TASKS[stage], name, spec, f"{spec['job_id']}:{stage}")
+
+    def _enqueue_task(self, func: str, name: str, spec: dict, rq_job_id: str) -> str:
+        # En cas d'échec, RQ relance la tâche : elle reprend à partir des points de contrôle.
+        # Relance différée : il faut des workers `rq worker --with-scheduler`.
+        Queue(name, connection=self.redis).enqueue(
+            func, spec["job_id"], spec["input_path"], spec["voice"], spec["lang"],
+            job_id=rq_job_id,
+            retry=Retry(max=settings.JOB_MAX_RETRIES, interval=30) if settings.JOB_MAX_RETRIES > 0 else None,
+        )
+        return name
+
+
+_scheduler: Optional[JobScheduler] = None
+
+
+def get_scheduler() -> JobScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = JobScheduler(Redis.from_url(settings.REDIS_URL))
+    return _scheduler
+
+
+def release_job_slot(user_id: Optional[str], job_id: str) -> None:
+    """Appelé par le worker à la fin d'un job ; ne lève jamais."""
+    try:
+        get_scheduler().release(user_id, job_id)
+    except Exception:
+        pass
+
+
+if __name__ == "__main__":
+    # Files d'un type de worker, pour `rq worker` (docker-compose.yml, start.sh) :
+    #   python -m backend.services.scheduler assemble extract --single
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("stages", nargs="*", choices=STAGES)
+    parser.add_argument("--single", action="store_true", help="ajouter les files du pipeline en une tâche")
+    args = parser.parse_args()
+    names = worker_queues(args.stages) if args.stages else []
+    if args.single or not args.stages:
+        names += worker_queues()
+    print(" ".join(names))
@@ -1,24 +1,63 @@
 # backend/services/storage.py
+import asyncio
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
+from multipart.multipart import MultipartParser, parse_options_header
 
 from ..settings import settings
+from .utils import TTLCache
 
 # ---------- S3 / Backblaze client ----------
 
+_client = None
+_client_lock = threading.Lock()
+
+
 def _s3_client():
     """
-    Crée un client S3 compatible Backblaze B2 (ou autre S3).
+    Client S3 compatible Backblaze B2 (ou autre S3), créé une fois par processus
+    (les clients boto3 sont thread-safe, contrairement aux sessions).
     Utilise les creds/region/endpoint de settings.
     """
-    session = boto3.session.Session(
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        region_name=settings.AWS_REGION,
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                session = boto3.session.Session(
+                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                    region_name=settings.AWS_REGION,
+                )
+                cfg = Config(
+                    s3={"addressing_style": "auto"},
+                    max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+                    retries={"max_attempts": 5, "mode": "adaptive"},
+                    tcp_keepalive=True,
+                )
+                _client = session.client("s3", endpoint_url=settings.S3_ENDPOINT_URL, config=cfg)
+    return _client
+
+
+def warm_up_s3() -> None:
+    """Crée le client S3 au démarrage de l'API : la première requête n'en paie pas le coût."""
+    _s3_client()
+
+
+def _transfer_config() -> TransferConfig:
+    """Upload multipart : parties envoyées en parallèle au-delà du seuil."""
+    mb = 1024 * 1024
+    return TransferConfig(
+        multipart_threshold=settings.S3_MULTIPART_THRESHOLD_MB * mb,
+        multipart_chunksize=settings.S3_MULTIPART_CHUNK_MB * mb,
+        max_concurrency=settings.S3_MAX_CONCURRENCY,
+        use_threads=True,
     )
-    cfg = Config(s3={"addressing_style": "auto"})
-    return session.client("s3", endpoint_url=settings.S3_ENDPOINT_URL, config=cfg)
 
 
 # ---------- Content-Type helper ----------
@@ -31,39 +70,63 @@ def _guess_content_type(key: str) -> str:
         return "audio/mp4"
     if k.endswith(".pdf"):
         return "application/pdf"
+    if k.endswith(".json"):
+        return "application/json"
+    if k.endswith(".m3u8"):
+        return "application/vnd.apple.mpegurl"
+    if k.endswith(".ts"):
+        return "video/mp2t"
     return "application/octet-stream"
 
 
-# ---------- Upload + URL présignée pour lecture ----------
+# ---------- Upload / téléchargement S3 ----------
 
-def put_file_s3(src_path: str, dst_path: str) -> str:
+def put_object_s3(src_path: str, key: str, cache_control: Optional[str] = None) -> None:
     """
-    Upload vers S3 et renvoie une URL présignée (lecture/stream) avec expiration.
+    Upload brut vers S3, sans URL présignée (objets internes : cache, etc.).
     """
-    client = _s3_client()
-    bucket = settings.S3_BUCKET
-
-    client.upload_file(
+    extra = {"ContentType": _guess_content_type(key)}
+    if cache_control:
+        extra["CacheControl"] = cache_control
+    _s3_client().upload_file(
         src_path,
-        bucket,
-        dst_path,
-        ExtraArgs={"ContentType": _guess_content_type(dst_path)},
+        settings.S3_BUCKET,
+        key,
+        ExtraArgs=extra,
+        Config=_transfer_config(),
     )
 
-    expires = int(os.getenv("S3_SIGN_URL_EXPIRY", "604800"))  # 7 jours par défaut
-    url = client.generate_presigned_url(
-        ClientMethod="get_object",
-        Params={"Bucket": bucket, "Key": dst_path},
-        ExpiresIn=expires,
-    )
-    return url
+
+def get_object_s3(key: str, dst_path: str) -> bool:
+    """
+    Télécharge l'objet `key` vers `dst_path`. Renvoie False s'il n'existe pas.
+    """
+    from botocore.exceptions import ClientError
+
+    try:
+        _s3_client().download_file(settings.S3_BUCKET, key, dst_path)
+        return True
+    except ClientError as e:
+        code = str(e.response.get("Error", {}).get("Code", ""))
+        if code in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
 
 
-def put_file(src_path: str, dst_path: str) -> str:
+def upload_files(items: List[Tuple[str, str]]) -> List[str]:
     """
-    Fonction utilisée ailleurs dans le code — garde la même API.
+    Upload concurrent de plusieurs fichiers [(src, clé), ...] (ex: tous les
+    livrables d'un job). Renvoie les clés : les URLs sont signées à la
+    demande (voir `signed_url`), jamais stockées.
     """
-    return put_file_s3(src_path, dst_path)
+    if len(items) <= 1:
+        for src, key in items:
+            put_object_s3(src, key)
+        return [key for _, key in items]
+    workers = max(1, min(len(items), settings.S3_UPLOAD_PARALLELISM))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda item: put_object_s3(*item), items))
+    return [key for _, key in items]
 
 
 # ---------- URL présignée dédiée au téléchargement ----------
@@ -75,9 +138,169 @@ def presign_key(key: str, filename: str, as_attachment: bool = False, expires: i
     - filename => nom proposé au téléchargement
     """
     if expires is None:
-        expires = int(os.getenv("S3_SIGN_URL_EXPIRY", "604800"))
+        expires = settings.S3_SIGN_URL_EXPIRY
     client = _s3_client()
     params = {"Bucket": settings.S3_BUCKET, "Key": key}
     if as_attachment:
         params["ResponseContentDisposition"] = f'attachment; filename="{filename}"'
     return client.generate_presigned_url("get_object", Params=params, ExpiresIn=expires)
+
+
+# ---------- Signature à la demande, mémorisée ----------
+
+_signed = TTLCache(max_entries=10000)
+
+
+def signed_url(key: str, filename: Optional[str] = None, as_attachment: bool = False) -> str:
+    """
+    URL de lecture de `key`, signée au besoin (calcul local, aucun appel S3).
+    Les signatures sont gardées la moitié de leur durée de validité : une URL
+    servie depuis le cache reste valable au moins S3_SIGN_URL_EXPIRY / 2.
+    Avec PUBLIC_CDN_BASE, on renvoie directement l'URL publique.
+    """
+    if settings.PUBLIC_CDN_BASE and not as_attachment:
+        return f"{settings.PUBLIC_CDN_BASE.rstrip('/')}/{key}"
+
+    cache_key = (key, filename if as_attachment else None, as_attachment)
+    url = _signed.get(cache_key)
+    if url is not None:
+        return url
+
+    expires = settings.S3_SIGN_URL_EXPIRY
+    url = presign_key(key, filename or os.path.basename(key), as_attachment=as_attachment, expires=expires)
+    _signed.set(cache_key, url, ttl=expires / 2)
+    return url
+
+
+def output_url(key: Optional[str], legacy_url: Optional[str] = None) -> Optional[str]:
+    """URL d'un livrable : signée depuis sa clé, ou l'URL stockée des anciens jobs."""
+    if key:
+        return signed_url(key)
+    return legacy_url
+
+
+# ---------- Upload HTTP -> disque local, en flux ----------
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class InvalidUpload(ValueError):
+    """Corps multipart illisible, ou sans fichier."""
+
+
+# Marge du corps multipart au-delà du fichier (en-têtes des parties, champs texte)
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+
+async def receive_upload(chunks: AsyncIterator[bytes], content_type: Optional[str], dst_path: str,
+                         max_bytes: int, file_field: str = "file", chunk_size: int = 1024 * 1024,
+                         hasher=None) -> dict:
+    """
+    Reçoit un formulaire multipart directement depuis le flux HTTP
+    (`request.stream()`), sans passer par l'analyse de formulaire de
+    Starlette : la partie `file_field` est écrite dans `dst_path` au fil de
+    l'eau (blocs de `chunk_size`, écritures hors de la boucle d'événements),
+    les autres champs sont gardés en mémoire (petits, bornés).
+    Lève UploadTooLarge dès que le fichier dépasse `max_bytes` ou le corps
+    `max_bytes` + UPLOAD_FORM_OVERHEAD, Content-Length annoncé ou non.
+    `hasher` (ex: hashlib.sha256()) reçoit chaque bloc du fichier au passage.
+    Renvoie {"fields", "filename", "content_type", "size"}.
+    """
+    ctype, params = parse_options_header(content_type or "")
+    boundary = params.get(b"boundary")
+    if ctype != b"multipart/form-data" or not boundary:
+        raise InvalidUpload("multipart/form-data attendu")
+
+    fields: Dict[str, str] = {}
+    upload = {"filename": None, "content_type": None, "size": 0}
+    part = {}
+    pending: List[bytes] = []
+
+    def on_part_begin():
+        part.clear()
+        part.update(headers={}, field=b"", value=b"", data=[], is_file=False)
+
+    def on_header_field(data, start, end):
+        part["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        part["value"] += data[start:end]
+
+    def on_header_end():
+        part["headers"][part["field"].lower()] = part["value"]
+        part["field"] = part["value"] = b""
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(part["headers"].get(b"content-disposition", b""))
+        part["name"] = disposition.get(b"name", b"").decode("utf-8", "replace")
+        filename = disposition.get(b"filename")
+        if part["name"] == file_field and filename is not None and upload["filename"] is None:
+            part["is_file"] = True
+            upload["filename"] = filename.decode("utf-8", "replace")
+            upload["content_type"] = part["headers"].get(b"content-type", b"").decode("latin-1")
+
+    def is_text_field() -> bool:
+        return bool(part.get("name")) and part["name"] != file_field
+
+    def on_part_data(data, start, end):
+        if part["is_file"]:
+            pending.append(data[start:end])
+        elif is_text_field():
+            part["data"].append(data[start:end])
+            if sum(map(len, part["data"])) > UPLOAD_FORM_OVERHEAD:
+                raise UploadTooLarge(part["name"])
+
+    def on_part_end():
+        if not part["is_file"] and is_text_field():
+            fields[part["name"]] = b"".join(part["data"]).decode("utf-8", "replace")
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin, "on_part_data": on_part_data, "on_part_end": on_part_end,
+        "on_header_field": on_header_field, "on_header_value": on_header_value,
+        "on_header_end": on_header_end, "on_headers_finished": on_headers_finished,
+    })
+
+    part_path = dst_path + ".part"
+    received = 0
+    f = await asyncio.to_thread(open, part_path, "wb")
+
+    async def flush(force: bool = False) -> None:
+        buffered = sum(map(len, pending))
+        if not buffered or (buffered < chunk_size and not force):
+            return
+        block = b"".join(pending)
+        pending.clear()
+        upload["size"] += len(block)
+        if upload["size"] > max_bytes:
+            raise UploadTooLarge(upload["size"])
+        if hasher is not None:
+            hasher.update(block)
+        await asyncio.to_thread(f.write, block)
+
+    try:
+        async for chunk in chunks:
+            received += len(chunk)
+            if received > max_bytes + UPLOAD_FORM_OVERHEAD:
+                raise UploadTooLarge(received)
+            try:
+                parser.write(chunk)
+            except UploadTooLarge:
+                raise
+            except Exception as e:
+                raise InvalidUpload(str(e)) from e
+            await flush()
+        parser.finalize()
+        await flush(force=True)
+        if upload["filename"] is None:
+            raise InvalidUpload(f"champ fichier `{file_field}` absent")
+        await asyncio.to_thread(f.close)
+        await asyncio.to_thread(os.replace, part_path, dst_path)
+    except BaseException:
+        f.close()
+        try:
+            os.remove(part_path)
+        except OSError:
+            pass
+        raise
+    return {"fields": fields, **upload}
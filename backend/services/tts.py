@@ -1,43 +1,578 @@
+import asyncio
+import collections
+import concurrent.futures
+import os
+import shlex
+import threading
+import time
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Sequence
+from xml.sax.saxutils import escape
+
 import httpx
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import AsyncRetrying, retry_if_exception_type, stop_after_attempt, wait_exponential
 from ..settings import settings
+from .ratelimit import RateLimited, get_tts_limiter, parse_retry_after
+from .tts_cache import cache_key, get_tts_cache
+
+ELEVENLABS_MODEL_ID = "eleven_multilingual_v2"
+ELEVENLABS_VOICE_SETTINGS = {"stability": 0.5, "similarity_boost": 0.7}
+ELEVENLABS_URL = "https://api.elevenlabs.io"
+AZURE_OUTPUT_FORMAT = "audio-24khz-96kbitrate-mono-mp3"
+
+# Taille max (caractères) d'une requête, par provider
+PROVIDER_MAX_CHARS = {
+    "elevenlabs": 5000,
+}
+DEFAULT_MAX_CHARS = 3000
+
+
+class TtsServerError(RuntimeError):
+    """Erreur 5xx du provider (hors 503, limite de débit) : passagère."""
+
+
+class TtsRequestError(RuntimeError):
+    """Requête refusée (4xx, identifiants manquants) : la rejouer n'y changera rien."""
+
+
+# Seules ces erreurs sont rejouées par synthesize ; les autres (4xx, clé
+# manquante, morceau trop long, limite de débit épuisée) ne changeront pas.
+TRANSIENT_ERRORS = (httpx.TransportError, TtsServerError, asyncio.TimeoutError)
+
+
+def max_chunk_chars(provider: Optional[str] = None) -> int:
+    """
+    Limite de découpage : la plus petite limite des providers de la chaîne
+    (un morceau doit pouvoir basculer), abaissée par TTS_MAX_CHARS si défini.
+    """
+    names = [provider] if provider else provider_chain()
+    limit = min(PROVIDER_MAX_CHARS.get(name, DEFAULT_MAX_CHARS) for name in names)
+    if settings.TTS_MAX_CHARS:
+        return min(settings.TTS_MAX_CHARS, limit)
+    return limit
 
-# Pour le debug: 1 tentative et timeout 30s (remets 3 tentatives / 120s en prod si besoin)
-@retry(stop=stop_after_attempt(1), wait=wait_exponential(min=1, max=8))
-async def elevenlabs_tts(text: str, voice_id: str, out_path: str):
-    if not settings.ELEVENLABS_API_KEY:
-        raise RuntimeError("Missing ELEVENLABS_API_KEY")
 
-    url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
+def make_http_client() -> httpx.AsyncClient:
+    """
+    Client HTTP/2 partagé par toutes les requêtes TTS d'un job :
+    une seule poule de connexions, dimensionnée sur la concurrence.
+    """
+    # Requêtes de relance (hedging) comprises
+    size = max(1, settings.TTS_CONCURRENCY) * 2
+    limits = httpx.Limits(max_connections=size, max_keepalive_connections=size)
+    return httpx.AsyncClient(http2=True, timeout=settings.TTS_TIMEOUT_SEC, limits=limits)
+
+
+# ---------- Providers ----------
+
+async def _elevenlabs_request(base_url: str, api_key: str, label: str, text: str, voice_id: str,
+                              out_path: str, client: httpx.AsyncClient):
+    """API text-to-speech d'ElevenLabs (aussi parlée par le faux serveur de benchmark)."""
+    url = f"{base_url.rstrip('/')}/v1/text-to-speech/{voice_id}"
     headers = {
-        "xi-api-key": settings.ELEVENLABS_API_KEY,
+        "xi-api-key": api_key,
         "accept": "audio/mpeg",
         "Content-Type": "application/json",
     }
     payload = {
-        "text": text[:5000],  # sécurité: limite le payload
-        "model_id": "eleven_multilingual_v2",
-        "voice_settings": {"stability": 0.5, "similarity_boost": 0.7},
+        "text": text,
+        "model_id": ELEVENLABS_MODEL_ID,
+        "voice_settings": ELEVENLABS_VOICE_SETTINGS,
     }
 
     try:
-        async with httpx.AsyncClient(timeout=30) as client:
-            r = await client.post(url, headers=headers, json=payload)
-            r.raise_for_status()
-            with open(out_path, "wb") as f:
-                f.write(r.content)
+        r = await client.post(url, headers=headers, json=payload)
+        r.raise_for_status()
+        with open(out_path, "wb") as f:
+            f.write(r.content)
     except httpx.HTTPStatusError as e:
         body = e.response.text if e.response is not None else ""
         code = e.response.status_code if e.response is not None else "?"
+        if code in (429, 503):
+            # Quota / concurrence du compte dépassés : le limiteur temporise
+            retry_after = parse_retry_after(e.response.headers.get("retry-after"))
+            raise RateLimited(f"{label} HTTP {code}: {body}", retry_after=retry_after) from e
         # Message plus clair pour le cas free-tier/401/429
         if code == 401 and "detected_unusual_activity" in body:
-            raise RuntimeError("ElevenLabs 401: compte Free bloqué (VPN/proxy ou usage serveur). Passe en plan payant ou contacte le support.") from e
-        raise RuntimeError(f"ElevenLabs HTTP {code}: {body}") from e
+            raise TtsRequestError("ElevenLabs 401: compte Free bloqué (VPN/proxy ou usage serveur). Passe en plan payant ou contacte le support.") from e
+        if isinstance(code, int) and code >= 500:
+            raise TtsServerError(f"{label} HTTP {code}: {body}") from e
+        raise TtsRequestError(f"{label} HTTP {code}: {body}") from e
+
+
+async def elevenlabs_tts(text: str, voice_id: str, out_path: str, client: Optional[httpx.AsyncClient] = None):
+    if not settings.ELEVENLABS_API_KEY:
+        raise TtsRequestError("Missing ELEVENLABS_API_KEY")
+    if len(text) > PROVIDER_MAX_CHARS["elevenlabs"]:
+        # Jamais de troncature silencieuse : le découpage doit respecter la limite
+        raise ValueError(f"Chunk too long for ElevenLabs ({len(text)} chars)")
+
+    if client is None:
+        async with make_http_client() as own_client:
+            return await elevenlabs_tts(text, voice_id, out_path, client=own_client)
+    await _elevenlabs_request(ELEVENLABS_URL, settings.ELEVENLABS_API_KEY, "ElevenLabs",
+                              text, voice_id, out_path, client)
+
+
+async def fake_tts(text: str, voice_id: str, out_path: str, client: Optional[httpx.AsyncClient] = None):
+    """
+    Faux provider déterministe : l'API ElevenLabs servie par TTS_FAKE_URL
+    (`python -m backend.benchmarks.fake_tts_server`). Aucun accès réseau externe.
+    """
+    if client is None:
+        async with make_http_client() as own_client:
+            return await fake_tts(text, voice_id, out_path, client=own_client)
+    await _elevenlabs_request(settings.TTS_FAKE_URL, "fake", "Fake TTS", text, voice_id, out_path, client)
+
+
+async def azure_tts(text: str, voice_id: str, out_path: str, client: Optional[httpx.AsyncClient] = None):
+    """Azure Speech (REST). La voix est AZURE_TTS_VOICE : les voix ElevenLabs n'y existent pas."""
+    if not settings.AZURE_TTS_KEY or not settings.AZURE_TTS_REGION:
+        raise TtsRequestError("Missing AZURE_TTS_KEY / AZURE_TTS_REGION")
+    if client is None:
+        async with make_http_client() as own_client:
+            return await azure_tts(text, voice_id, out_path, client=own_client)
+
+    voice = settings.AZURE_TTS_VOICE
+    lang = "-".join(voice.split("-")[:2])
+    ssml = (
+        f"<speak version='1.0' xml:lang='{lang}'>"
+        f"<voice name='{voice}'>{escape(text)}</voice></speak>"
+    )
+    url = f"https://{settings.AZURE_TTS_REGION}.tts.speech.microsoft.com/cognitiveservices/v1"
+    headers = {
+        "Ocp-Apim-Subscription-Key": settings.AZURE_TTS_KEY,
+        "Content-Type": "application/ssml+xml",
+        "X-Microsoft-OutputFormat": AZURE_OUTPUT_FORMAT,
+    }
+    try:
+        r = await client.post(url, headers=headers, content=ssml.encode("utf-8"))
+        r.raise_for_status()
+        with open(out_path, "wb") as f:
+            f.write(r.content)
+    except httpx.HTTPStatusError as e:
+        code = e.response.status_code
+        if code in (429, 503):
+            raise RateLimited(f"Azure TTS HTTP {code}",
+                              retry_after=parse_retry_after(e.response.headers.get("retry-after"))) from e
+        if code >= 500:
+            raise TtsServerError(f"Azure TTS HTTP {code}: {e.response.text}") from e
+        raise TtsRequestError(f"Azure TTS HTTP {code}: {e.response.text}") from e
+
+
+async def _run_process(cmd: List[str], stdin: Optional[bytes] = None) -> None:
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdin=asyncio.subprocess.PIPE if stdin is not None else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        _, err = await asyncio.wait_for(proc.communicate(stdin), timeout=settings.TTS_TIMEOUT_SEC)
+    except BaseException:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+    if proc.returncode != 0:
+        raise RuntimeError(f"{cmd[0]} exited {proc.returncode}: {err.decode(errors='replace').strip()}")
+
+
+async def local_tts(text: str, voice_id: str, out_path: str, client: Optional[httpx.AsyncClient] = None):
+    """
+    Moteur hors-ligne : TTS_LOCAL_COMMAND (espeak-ng par défaut) lit le texte
+    sur stdin et écrit un WAV dans `{out}`, converti ensuite en MP3.
+    """
+    wav_path = out_path + ".wav"
+    cmd = [arg.format(voice=settings.TTS_LOCAL_VOICE, out=wav_path) for arg in shlex.split(settings.TTS_LOCAL_COMMAND)]
+    try:
+        await _run_process(cmd, stdin=text.encode("utf-8"))
+        await _run_process([
+            "ffmpeg", "-y", "-nostdin", "-loglevel", "error", "-i", wav_path,
+            "-codec:a", "libmp3lame", "-b:a", "128k", "-f", "mp3", out_path,
+        ])
+    finally:
+        if os.path.exists(wav_path):
+            os.remove(wav_path)
+
+
+# name -> fonction (text, voice, out_path, client) ; `shared_limit` : limiteur Redis (providers réseau)
+PROVIDERS: Dict[str, dict] = {}
+
+
+def register_provider(name: str, func: Callable, max_chars: int = DEFAULT_MAX_CHARS,
+                      model: str = "", voice_settings: Optional[dict] = None, shared_limit: bool = True) -> None:
+    PROVIDERS[name] = {
+        "func": func,
+        "model": model,
+        "voice_settings": voice_settings or {},
+        "shared_limit": shared_limit,
+    }
+    PROVIDER_MAX_CHARS[name] = max_chars
+
+
+register_provider("elevenlabs", elevenlabs_tts, max_chars=5000,
+                  model=ELEVENLABS_MODEL_ID, voice_settings=ELEVENLABS_VOICE_SETTINGS)
+register_provider("fake", fake_tts, max_chars=5000,
+                  model=ELEVENLABS_MODEL_ID, voice_settings=ELEVENLABS_VOICE_SETTINGS)
+register_provider("azure", azure_tts, model=AZURE_OUTPUT_FORMAT)
+register_provider("local", local_tts, shared_limit=False)
+
+
+def _provider() -> str:
+    return (getattr(settings, "TTS_PROVIDER", "elevenlabs") or "elevenlabs").lower()
+
+
+def provider_chain() -> List[str]:
+    """Providers par ordre de préférence : TTS_PROVIDERS, sinon TTS_PROVIDER seul."""
+    if settings.TTS_PROVIDERS:
+        names = [name.strip().lower() for name in settings.TTS_PROVIDERS.split(",") if name.strip()]
+        if names:
+            return names
+    return [_provider()]
+
+
+def _model_params(provider: str):
+    """(modèle, voice_settings) utilisés par le provider — entrent dans la clé de cache."""
+    spec = PROVIDERS.get(provider)
+    if spec is None:
+        return "", {}
+    if provider == "azure":
+        return spec["model"], {"voice": settings.AZURE_TTS_VOICE}
+    if provider == "local":
+        return settings.TTS_LOCAL_COMMAND, {"voice": settings.TTS_LOCAL_VOICE}
+    return spec["model"], spec["voice_settings"]
+
+
+# ---------- Routage : limiteur, relance (hedging), bascule ----------
+
+class LatencyStats:
+    """
+    Latences récentes d'un provider et budget de relances de ce processus.
+    Avec le limiteur partagé, les latences viennent de Redis (toute la
+    flotte, relues toutes les TTS_HEDGE_SYNC_SEC) ; sans lui, seules celles
+    de ce processus comptent, et un worker RQ repart de zéro à chaque job.
+    """
+
+    def __init__(self, window: int):
+        self.samples: Deque[float] = collections.deque(maxlen=max(1, window))
+        self.shared: Optional[List[float]] = None
+        self.synced_at = 0.0
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def record(self, latency: float) -> None:
+        self.samples.append(latency)
+
+    async def sync(self, limiter) -> None:
+        """Relit les latences partagées (le limiteur les enregistre en rendant ses baux)."""
+        if limiter is None or time.monotonic() - self.synced_at < settings.TTS_HEDGE_SYNC_SEC:
+            return
+        self.synced_at = time.monotonic()
+        shared = await limiter.latencies()
+        if shared is not None:
+            self.shared = shared
+
+    def _window(self) -> Sequence[float]:
+        return self.shared if self.shared else self.samples
+
+    def quantile(self, q: float) -> Optional[float]:
+        samples = self._window()
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+    def hedge_delay(self) -> Optional[float]:
+        """Délai avant relance (p95 observé), ou None : pas assez d'historique / budget épuisé."""
+        if not settings.TTS_HEDGE_ENABLED or len(self._window()) < settings.TTS_HEDGE_MIN_SAMPLES:
+            return None
+        if self.hedges >= settings.TTS_HEDGE_MAX_RATIO * self.requests:
+            return None
+        return self.quantile(0.95)
+
+
+_latency: Dict[str, LatencyStats] = {}
+
+
+def latency_stats(provider: str) -> LatencyStats:
+    stats = _latency.get(provider)
+    if stats is None:
+        stats = _latency[provider] = LatencyStats(settings.TTS_HEDGE_WINDOW)
+    return stats
+
+
+def _shared_limiter(provider: str):
+    """Limiteur Redis du provider, ou None (désactivé, ou provider local)."""
+    spec = PROVIDERS.get(provider)
+    return get_tts_limiter(provider) if spec is not None and spec["shared_limit"] else None
+
+
+async def _synthesize_once(text: str, voice_id_or_name: str, out_path: str, client: Optional[httpx.AsyncClient] = None,
+                           provider: Optional[str] = None):
+    name = provider or _provider()
+    spec = PROVIDERS.get(name)
+    if spec is None:
+        raise NotImplementedError(f"TTS provider {name} not implemented")
+    await spec["func"](text, voice_id_or_name, out_path, client=client)
+
+
+async def _synthesize_limited(provider: str, text: str, voice_id_or_name: str, out_path: str,
+                              client: Optional[httpx.AsyncClient] = None, max_wait: Optional[float] = None):
+    """
+    Un appel au provider sous le limiteur partagé. Un refus (429) n'est pas
+    une tentative ratée : on attend le Retry-After puis on recommence, tant
+    que `max_wait` (TTS_LIMIT_MAX_WAIT_SEC) n'est pas écoulé.
+    """
+    stats = latency_stats(provider)
+    limiter = _shared_limiter(provider)
+    if limiter is None:
+        started = time.monotonic()
+        await _synthesize_once(text, voice_id_or_name, out_path, client=client, provider=provider)
+        stats.record(time.monotonic() - started)
+        return
+
+    deadline = time.monotonic() + (settings.TTS_LIMIT_MAX_WAIT_SEC if max_wait is None else max_wait)
+    while True:
+        lease = await limiter.acquire(len(text), deadline=deadline)
+        started = time.monotonic()
+        try:
+            await _synthesize_once(text, voice_id_or_name, out_path, client=client, provider=provider)
+        except RateLimited as e:
+            await limiter.release(lease, throttled=True, retry_after=e.retry_after)
+            if time.monotonic() >= deadline:
+                raise
+            continue
+        except BaseException:
+            await limiter.release(lease)
+            raise
+        latency = time.monotonic() - started
+        stats.record(latency)
+        await limiter.release(lease, latency=latency)
+        return
+
+
+def _discard(path: str) -> None:
+    if os.path.exists(path):
+        os.remove(path)
+
+
+async def _hedged(primary: str, backup: str, text: str, voice_id_or_name: str, out_path: str,
+                  client: Optional[httpx.AsyncClient], max_wait: float) -> str:
+    """
+    Appel à `primary` ; s'il dépasse le p95 de ses latences récentes, une
+    requête de relance part vers `backup` (le provider suivant, ou le même).
+    La première réponse gagne, l'autre est annulée. Retourne le provider servi.
+    """
+    stats = latency_stats(primary)
+    stats.requests += 1
+    if settings.TTS_HEDGE_ENABLED:
+        await stats.sync(_shared_limiter(primary))
+    delay = stats.hedge_delay()
+    attempts = {}  # tâche -> (provider, fichier)
+
+    def _start(name: str, suffix: str):
+        path = out_path + suffix
+        task = asyncio.create_task(_synthesize_limited(name, text, voice_id_or_name, path, client, max_wait))
+        attempts[task] = (name, path)
+        return task
+
+    try:
+        pending = {_start(primary, ".a")}
+        done, pending = await asyncio.wait(pending, timeout=delay)
+        if pending:
+            stats.hedges += 1
+            pending.add(_start(backup, ".b"))
+        error: Optional[BaseException] = None
+        while True:
+            for task in done:
+                if task.exception() is None:
+                    name, path = attempts[task]
+                    if path.endswith(".b"):
+                        stats.hedge_wins += 1
+                    os.replace(path, out_path)
+                    return name
+                error = task.exception()
+            if not pending:
+                raise error
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in attempts:
+            task.cancel()
+        await asyncio.gather(*attempts, return_exceptions=True)
+        for _, path in attempts.values():
+            _discard(path)
+
+
+async def _route(text: str, voice_id_or_name: str, out_path: str, client: Optional[httpx.AsyncClient] = None) -> str:
+    """
+    Bascule par morceau : chaque provider de la chaîne est essayé à son tour
+    (le dernier avec toute l'attente TTS_LIMIT_MAX_WAIT_SEC, les autres
+    TTS_FAILOVER_WAIT_SEC seulement). Retourne le provider qui a servi.
+    """
+    chain = provider_chain()
+    for i, name in enumerate(chain):
+        last = i == len(chain) - 1
+        backup = name if last else chain[i + 1]
+        max_wait = settings.TTS_LIMIT_MAX_WAIT_SEC if last else settings.TTS_FAILOVER_WAIT_SEC
+        try:
+            return await _hedged(name, backup, text, voice_id_or_name, out_path, client, max_wait)
+        except ValueError:
+            raise  # morceau trop long : aucun provider ne fera mieux
+        except Exception:
+            if last:
+                raise
+
+
+async def synthesize(text: str, voice_id_or_name: str, out_path: str, client: Optional[httpx.AsyncClient] = None):
+    """
+    Synthétise un morceau, avec ses propres tentatives (TTS_MAX_ATTEMPTS,
+    erreurs passagères seulement), chacune parcourant la chaîne de providers.
+    Un hit dans le cache TTS évite complètement l'appel réseau.
+    L'audio est écrit dans un fichier temporaire puis renommé : un fichier
+    présent à `out_path` est toujours complet (reprise après crash).
+    """
+    part_path = out_path + ".part"
+    cache = get_tts_cache()
+
+    def _key(provider: str) -> str:
+        model, voice_settings = _model_params(provider)
+        return cache_key(provider, text, voice_id_or_name, model, voice_settings)
+
+    if cache is not None:
+        for provider in provider_chain():
+            if await asyncio.to_thread(cache.fetch, _key(provider), part_path):
+                os.replace(part_path, out_path)
+                return
+        cache.record_miss()  # une recherche par morceau, quel que soit le nombre de providers
+
+    served = None
+    async for attempt in AsyncRetrying(
+        stop=stop_after_attempt(max(1, settings.TTS_MAX_ATTEMPTS)),
+        wait=wait_exponential(min=1, max=8),
+        # Réseau, 5xx, délai dépassé ; RateLimited : TTS_LIMIT_MAX_WAIT_SEC déjà attendu
+        retry=retry_if_exception_type(TRANSIENT_ERRORS),
+        reraise=True,
+    ):
+        with attempt:
+            served = await _route(text, voice_id_or_name, part_path, client=client)
+
+    if cache is not None:
+        try:
+            await asyncio.to_thread(cache.store, _key(served), part_path)
+        except Exception:
+            # Le cache ne doit jamais faire échouer un job
+            pass
+    os.replace(part_path, out_path)
+
+
+async def synthesize_stream(
+    chunks: Iterable[str],
+    voice_id_or_name: str,
+    out_dir: str,
+    concurrency: Optional[int] = None,
+    on_done=None,
+    is_done=None,
+) -> List[str]:
+    """
+    Synthétise des morceaux au fil de l'eau (au plus `concurrency` à la fois)
+    avec un client HTTP partagé. `chunks` peut être un générateur bloquant
+    (extraction + découpage) : il est consommé dans un thread, et chaque
+    morceau part en synthèse dès qu'il est produit.
+
+    Renvoie les chemins de sortie dans l'ordre des morceaux, quel que soit
+    l'ordre de fin. `on_done(index, path, chunk)` est appelé à chaque
+    morceau terminé (index à partir de 1), dans un thread dédié, un appel à
+    la fois : ses écritures DB/Redis ne bloquent pas les requêtes TTS en vol.
+    Les morceaux pour lesquels `is_done(index, chunk)` est vrai (reprise
+    d'un job) ne sont pas resynthétisés.
+    """
+    limit = max(1, concurrency or settings.TTS_CONCURRENCY)
+    sem = asyncio.Semaphore(limit)
+    loop = asyncio.get_running_loop()
+    # File bornée : l'extraction ne prend pas trop d'avance sur la synthèse
+    queue: asyncio.Queue = asyncio.Queue(maxsize=limit * 2)
+    stop = threading.Event()
+    end = object()
+
+    def _put(item) -> bool:
+        fut = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        while True:
+            try:
+                fut.result(timeout=0.5)
+                return True
+            except concurrent.futures.TimeoutError:
+                if stop.is_set():
+                    fut.cancel()
+                    return False
+
+    def _produce():
+        it = iter(chunks)
+        try:
+            for chunk in it:
+                if not _put(chunk):
+                    return
+            _put(end)
+        except BaseException as e:
+            _put(e)
+        finally:
+            close = getattr(it, "close", None)
+            if close is not None:
+                close()
+
+    out_paths: List[str] = []
+    errors: List[BaseException] = []
+    tasks = []
+
+    # Un seul thread : les rappels (session SQL du worker) ne sont jamais concurrents
+    callbacks = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts-on-done")
+
+    async def _done(i: int, path: str, chunk: str):
+        if on_done is not None:
+            await loop.run_in_executor(callbacks, on_done, i, path, chunk)
+
+    async with make_http_client() as client:
+        async def _one(i: int, chunk: str, path: str):
+            try:
+                await synthesize(chunk, voice_id_or_name, path, client=client)
+            except BaseException as e:
+                errors.append(e)
+                raise
+            finally:
+                sem.release()
+            await _done(i, path, chunk)
 
+        producer = loop.run_in_executor(None, _produce)
+        try:
+            while True:
+                item = await queue.get()
+                if item is end:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                if errors:
+                    raise errors[0]
+                path = os.path.join(out_dir, f"{len(out_paths) + 1:05d}.mp3")
+                out_paths.append(path)
+                if is_done is not None and is_done(len(out_paths), item):
+                    await _done(len(out_paths), path, item)
+                    continue
+                await sem.acquire()
+                if errors:
+                    sem.release()
+                    raise errors[0]
+                tasks.append(asyncio.create_task(_one(len(out_paths), item, path)))
+            await asyncio.gather(*tasks)
+        except BaseException:
+            stop.set()
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            stop.set()
+            await asyncio.gather(producer, return_exceptions=True)
+            # Rappels encore en cours (morceaux annulés) : terminés avant de rendre la main
+            await asyncio.to_thread(callbacks.shutdown, wait=True)
 
-async def synthesize(text: str, voice_id_or_name: str, out_path: str):
-    provider = (getattr(settings, "TTS_PROVIDER", "elevenlabs") or "elevenlabs").lower()
-    if provider == "elevenlabs":
-        await elevenlabs_tts(text, voice_id_or_name, out_path)
-    else:
-        raise NotImplementedError(f"TTS provider {provider} not implemented")
+    return out_paths
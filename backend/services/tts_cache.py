@@ -0,0 +1,177 @@
+# backend/services/tts_cache.py
+"""
+Cache audio TTS adressé par contenu.
+
+La clé est un sha256 de (provider, texte, voix, modèle, voice_settings) :
+un même morceau synthétisé deux fois avec les mêmes paramètres n'est payé
+qu'une fois. Deux niveaux :
+  - disque local (LRU par date d'accès, taille max TTS_CACHE_MAX_MB)
+  - S3 optionnel (TTS_CACHE_S3), partagé entre workers
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+from typing import Optional
+
+from ..settings import settings
+
+
+def cache_key(provider: str, text: str, voice: str, model: str, voice_settings: Optional[dict] = None) -> str:
+    raw = json.dumps(
+        {
+            "provider": provider,
+            "text": text,
+            "voice": voice,
+            "model": model,
+            "voice_settings": voice_settings or {},
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TTSCache:
+    def __init__(self, root: str, max_bytes: int, s3_prefix: Optional[str] = None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.s3_prefix = s3_prefix.strip("/") if s3_prefix else None
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None  # calculé au premier besoin
+        self.hits_disk = 0
+        self.hits_s3 = 0
+        self.misses = 0
+
+    # ---------- chemins ----------
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.mp3")
+
+    def _s3_key(self, key: str) -> str:
+        return f"{self.s3_prefix}/{key[:2]}/{key}.mp3"
+
+    # ---------- lecture ----------
+
+    def fetch(self, key: str, out_path: str) -> bool:
+        """
+        Copie l'audio en cache vers `out_path`. Renvoie False si absent.
+        Compte les hits ; un morceau absent sous toutes ses clés (une par
+        provider de la chaîne) est compté une fois par record_miss().
+        """
+        path = self._path(key)
+        if os.path.exists(path):
+            try:
+                shutil.copyfile(path, out_path)
+                os.utime(path)  # LRU : on rafraîchit la date d'accès
+                with self._lock:
+                    self.hits_disk += 1
+                return True
+            except OSError:
+                pass  # entrée évincée entre-temps
+
+        if self.s3_prefix:
+            from .storage import get_object_s3
+            try:
+                found = get_object_s3(self._s3_key(key), out_path)
+            except Exception:
+                found = False  # S3 indisponible : on retombe sur le provider
+            if found:
+                self._store_local(key, out_path)
+                with self._lock:
+                    self.hits_s3 += 1
+                return True
+        return False
+
+    def record_miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+    # ---------- écriture ----------
+
+    def store(self, key: str, src_path: str) -> None:
+        self._store_local(key, src_path)
+        if self.s3_prefix:
+            from .storage import put_object_s3
+            put_object_s3(src_path, self._s3_key(key))
+
+    def _store_local(self, key: str, src_path: str) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        shutil.copyfile(src_path, tmp)
+        os.replace(tmp, path)  # atomique : jamais de fichier tronqué en cache
+        size = os.path.getsize(path)
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += size
+            over = self._size > self.max_bytes
+        if over:
+            self._evict()
+
+    # ---------- éviction LRU ----------
+
+    def _entries(self):
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                if not name.endswith(".mp3"):
+                    continue
+                p = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                yield st.st_mtime, st.st_size, p
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self) -> None:
+        """Supprime les entrées les moins récemment utilisées jusqu'à 90% du budget."""
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            target = int(self.max_bytes * 0.9)
+            for _, size, p in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(p)
+                    total -= size
+                except OSError:
+                    pass
+            self._size = total
+
+    # ---------- compteurs ----------
+    # Cumulés sur la vie du processus : un job lit l'écart avant/après sa
+    # synthèse (workers/processor.py) et l'enregistre sur sa ligne.
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.hits_disk + self.hits_s3
+            lookups = hits + self.misses
+            return {
+                "hits_disk": self.hits_disk,
+                "hits_s3": self.hits_s3,
+                "misses": self.misses,
+                "hit_ratio": (hits / lookups) if lookups else 0.0,
+                "size_bytes": self._size,
+            }
+
+
+_cache: Optional[TTSCache] = None
+
+
+def get_tts_cache() -> Optional[TTSCache]:
+    """Instance process-wide, ou None si le cache est désactivé."""
+    global _cache
+    if not settings.TTS_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        root = settings.TTS_CACHE_DIR or os.path.join(settings.LOCAL_STORAGE_PATH, "cache", "tts")
+        s3_prefix = settings.TTS_CACHE_S3_PREFIX if (settings.TTS_CACHE_S3 and settings.S3_BUCKET) else None
+        _cache = TTSCache(root, settings.TTS_CACHE_MAX_MB * 1024 * 1024, s3_prefix=s3_prefix)
+    return _cache
@@ -1,4 +1,5 @@
-import shutil, subprocess, os
+import shutil, subprocess, os, threading, time
+from collections import OrderedDict
 from slugify import slugify
 
 def copy_file(src, dst):
@@ -12,3 +13,44 @@ def run(cmd: list[str]):
 
 def safe_slug(name: str) -> str:
     return slugify(name or 'file')
+
+
+class TTLCache:
+    """
+    Petit cache clé -> valeur avec expiration par entrée et taille bornée (LRU).
+    Thread-safe ; pensé pour des mémoïsations process-wide.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[object, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is None:
+                return None
+            if hit[1] <= now:
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return hit[0]
+
+    def set(self, key, value, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def pop(self, key) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
@@ -12,10 +12,16 @@ class Settings(BaseSettings):
     ENV: str = "dev"
     API_BASE_URL: str = "http://localhost:8000"
     SECRET_KEY: str = "change-me"
+    AUTH_CACHE_TTL_SEC: float = 30.0  # cache local des utilisateurs authentifiés
+    AUTH_CACHE_REDIS: bool = False  # second niveau partagé entre processus API
+    AUTH_CACHE_REDIS_TTL_SEC: int = 300
+    AUTH_THREADS: int = 8  # threads dédiés au travail bloquant des endpoints async (bcrypt, SQL)
 
     # Storage
     STORAGE_MODE: str = "local"  # "local" or "s3"
     LOCAL_STORAGE_PATH: str = "./data"
+    MAX_UPLOAD_MB: int = 200
+    UPLOAD_CHUNK_KB: int = 1024  # blocs écrits sur disque lors d'un upload (mémoire par upload)
 
     # S3 / Backblaze (S3-compatible)
     S3_ENDPOINT_URL: Optional[str] = None
@@ -23,24 +29,95 @@ class Settings(BaseSettings):
     AWS_ACCESS_KEY_ID: Optional[str] = None
     AWS_SECRET_ACCESS_KEY: Optional[str] = None
     AWS_REGION: Optional[str] = None
+    S3_SIGN_URL_EXPIRY: int = 604800  # validité des URLs présignées (7 jours)
+    S3_MAX_POOL_CONNECTIONS: int = 32
+    S3_MULTIPART_THRESHOLD_MB: int = 16
+    S3_MULTIPART_CHUNK_MB: int = 16
+    S3_MAX_CONCURRENCY: int = 8  # parties envoyées en parallèle par fichier
+    S3_UPLOAD_PARALLELISM: int = 4  # fichiers envoyés en parallèle par job
 
     # Redis / RQ
     REDIS_URL: str = "redis://localhost:6379"
-    RQ_QUEUE_NAME: str = "mvp_jobs"
+    RQ_QUEUE_NAME: str = "mvp_jobs"  # préfixe des files small / medium / large (services/scheduler.py)
+    DEDUP_ENABLED: bool = True  # réutiliser le résultat d'un même PDF (voix, langue)
+    DEDUP_CLAIM_TTL_SEC: int = 24 * 3600  # au-delà, les suiveurs d'un job de référence non terminé passent en erreur
+    PIPELINE_VERSION: str = "1"  # à augmenter quand la sortie audio change
+    JOB_PIPELINE: str = "stages"  # "stages" : une file par étape ; "single" : une tâche par job
+    SCHED_SMALL_MAX_PAGES: int = 30
+    SCHED_MEDIUM_MAX_PAGES: int = 200
+    SCHED_USER_MAX_ACTIVE: int = 2  # jobs en file ou en cours par utilisateur
+    SCHED_SLOT_TTL_SEC: int = 6 * 3600  # créneau d'un worker mort sans release
+    SSE_RESYNC_SEC: float = 30.0  # relecture DB d'un flux SSE sans événement Redis
+    SSE_POLL_SEC: float = 2.0  # relecture DB d'un flux SSE tant que l'abonnement Redis est coupé
+    JOB_MAX_RETRIES: int = 2  # relances automatiques (reprise sur points de contrôle)
+    PROGRESS_MIN_INTERVAL_SEC: float = 5.0  # écriture de la progression en DB au plus toutes les N s...
+    PROGRESS_MIN_STEP: int = 5  # ...sauf si elle a avancé d'au moins N points
 
     # Database
     DATABASE_URL: str = "sqlite:///./mvp.db"
+    DB_POOL_SIZE: int = 10  # connexions gardées ouvertes par processus
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT_SEC: float = 30.0
+    DB_POOL_RECYCLE_SEC: int = 1800
+    SQLITE_WAL: bool = True
+    SQLITE_SYNCHRONOUS: str = "NORMAL"  # sûr en WAL, bien plus rapide que FULL
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
 
     # TTS providers
-    TTS_PROVIDER: str = "elevenlabs"  # "elevenlabs" or "azure"
+    TTS_PROVIDER: str = "elevenlabs"  # "elevenlabs", "azure", "local" ou "fake"
+    TTS_PROVIDERS: Optional[str] = None  # chaîne de bascule, ex: "elevenlabs,azure,local" (défaut: TTS_PROVIDER)
     ELEVENLABS_API_KEY: Optional[str] = None
     ELEVENLABS_VOICE_ID: str = "Rachel"
 
     AZURE_TTS_KEY: Optional[str] = None
     AZURE_TTS_REGION: Optional[str] = None
+    AZURE_TTS_VOICE: str = "fr-FR-DeniseNeural"
+
+    # Moteur hors-ligne : texte sur stdin, WAV écrit dans {out}
+    TTS_LOCAL_COMMAND: str = "espeak-ng --stdin -v {voice} -w {out}"
+    TTS_LOCAL_VOICE: str = "fr"
+    # Faux provider (API ElevenLabs) : python -m backend.benchmarks.fake_tts_server
+    TTS_FAKE_URL: str = "http://127.0.0.1:8765"
 
     OPENAI_API_KEY: Optional[str] = None
 
+    # Extraction PDF
+    EXTRACT_WORKERS: int = 0  # processus d'extraction/OCR (0 = nombre de CPU)
+    OCR_DPI: int = 300
+
+    # TTS pipeline (nombre de morceaux synthétisés en parallèle par job)
+    HLS_ENABLED: bool = True  # segments HLS publiés pendant la synthèse (services/hls.py)
+    HLS_BITRATE: str = "96k"
+    TTS_CONCURRENCY: int = 4
+    TTS_MAX_ATTEMPTS: int = 3  # tentatives par morceau
+    TTS_TIMEOUT_SEC: float = 30.0
+    TTS_MAX_CHARS: Optional[int] = None  # taille max d'un morceau (défaut: limite du provider)
+    TTS_FAILOVER_WAIT_SEC: float = 10.0  # attente max du limiteur avant de basculer au provider suivant
+    TTS_HEDGE_ENABLED: bool = True  # requête de relance quand un morceau dépasse le p95 des latences
+    TTS_HEDGE_MIN_SAMPLES: int = 20
+    TTS_HEDGE_WINDOW: int = 200  # latences récentes retenues par provider
+    TTS_HEDGE_MAX_RATIO: float = 0.1  # relances max par requête
+    TTS_HEDGE_SYNC_SEC: float = 5.0  # relecture des latences partagées (Redis, avec TTS_LIMIT_ENABLED)
+
+    # Limiteur TTS partagé entre workers via Redis (services/ratelimit.py)
+    TTS_LIMIT_ENABLED: bool = True
+    TTS_LIMIT_MAX_CONCURRENCY: int = 8  # requêtes en vol, toute la flotte (plafond du provider)
+    TTS_LIMIT_MIN_CONCURRENCY: int = 1
+    TTS_LIMIT_DECREASE: float = 0.5  # facteur appliqué à la limite sur 429 / latence excessive
+    TTS_LIMIT_LATENCY_SEC: float = 20.0
+    TTS_LIMIT_CHARS_PER_SEC: float = 0.0  # quota de caractères (0 = pas de quota)
+    TTS_LIMIT_BURST_SEC: float = 10.0
+    TTS_LIMIT_BACKOFF_SEC: float = 2.0  # pause après un 429 sans Retry-After
+    TTS_LIMIT_MAX_WAIT_SEC: float = 900.0  # attente max d'un morceau avant échec
+    TTS_LIMIT_POLL_SEC: float = 0.2
+
+    # Cache audio TTS (adressé par contenu)
+    TTS_CACHE_ENABLED: bool = True
+    TTS_CACHE_DIR: Optional[str] = None  # défaut: {LOCAL_STORAGE_PATH}/cache/tts
+    TTS_CACHE_MAX_MB: int = 2048
+    TTS_CACHE_S3: bool = False  # second niveau partagé entre workers
+    TTS_CACHE_S3_PREFIX: str = "cache/tts"
+
     # Public CDN base (if you proxy S3 links)
     PUBLIC_CDN_BASE: Optional[str] = None
 
@@ -0,0 +1,22 @@
+from backend.services.chapters import ChapterTracker
+
+
+def test_repeated_page_header_stays_in_one_section():
+    tracker = ChapterTracker({}, default_title="livre")
+    pages = [
+        "Chapitre 1 Le départ\nIl était une fois...",
+        "CHAPITRE 1  le départ\nla suite du récit",  # en-tête courant
+        "Chapitre 1 Le départ\nencore la suite",
+        "Chapitre 2 Le retour\nun nouveau chapitre",
+        "Chapitre 2 Le retour\nfin",
+    ]
+    sections = [tracker.section_for(i, text) for i, text in enumerate(pages)]
+    assert sections == [0, 0, 0, 1, 1]
+    assert tracker.titles == ["Chapitre 1 Le départ", "Chapitre 2 Le retour"]
+
+
+def test_pages_before_first_heading_use_default_title():
+    tracker = ChapterTracker({}, default_title="livre")
+    assert tracker.section_for(0, "texte sans titre") == 0
+    assert tracker.section_for(1, "Prologue\nsuite") == 1
+    assert tracker.titles == ["livre", "Prologue"]
@@ -0,0 +1,131 @@
+# backend/workers/checkpoint.py
+"""
+Points de reprise d'un job, dans tmp/{job_id} :
+  - pages.jsonl    : texte extrait, une page par ligne (ajouté au fil de l'extraction)
+  - manifest.jsonl : un enregistrement par morceau synthétisé {"i", "sha1"}
+  - 00001.mp3 ...  : audio des morceaux (écrit de façon atomique)
+  - chunks.jsonl   : morceaux découpés {"section", "text"} (pipeline par étapes)
+  - <nom>.json     : état passé d'une étape à la suivante (save_state/load_state)
+
+Un job relancé après un crash relit les pages déjà extraites, reprend
+l'extraction à la première page manquante, et ne resynthétise que les
+morceaux absents ou dont le texte a changé.
+"""
+import hashlib
+import json
+import os
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+PAGES_FILE = "pages.jsonl"
+MANIFEST_FILE = "manifest.jsonl"
+CHUNKS_FILE = "chunks.jsonl"
+
+
+def _sha1(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _read_jsonl(path: str):
+    """Lit un .jsonl en ignorant une dernière ligne tronquée (crash pendant l'écriture)."""
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                return
+            try:
+                yield json.loads(line)
+            except ValueError:
+                return
+
+
+class JobCheckpoint:
+    def __init__(self, tmp_dir: str):
+        self.tmp_dir = tmp_dir
+        os.makedirs(tmp_dir, exist_ok=True)
+        self.pages_path = os.path.join(tmp_dir, PAGES_FILE)
+        self.manifest_path = os.path.join(tmp_dir, MANIFEST_FILE)
+        self.chunks_path = os.path.join(tmp_dir, CHUNKS_FILE)
+        self._done: Dict[int, str] = {
+            rec["i"]: rec["sha1"] for rec in _read_jsonl(self.manifest_path)
+        }
+
+    # ---------- pages extraites ----------
+
+    def iter_pages(self, extract_from: Callable[[int], Iterator[str]]) -> Iterator[str]:
+        """
+        Rejoue les pages déjà sauvegardées, puis continue avec
+        `extract_from(première_page_manquante)` en sauvegardant chaque page.
+        """
+        stored = 0
+        for rec in _read_jsonl(self.pages_path):
+            stored += 1
+            yield rec["text"]
+
+        # On réécrit le fichier sans l'éventuelle ligne tronquée avant d'y ajouter
+        self._truncate_jsonl(self.pages_path, stored)
+        with open(self.pages_path, "a", encoding="utf-8") as f:
+            for text in extract_from(stored):
+                f.write(json.dumps({"text": text}, ensure_ascii=False) + "\n")
+                f.flush()
+                yield text
+
+    @staticmethod
+    def _truncate_jsonl(path: str, n_lines: int) -> None:
+        if not os.path.exists(path):
+            return
+        with open(path, "rb+") as f:
+            pos = 0
+            for _ in range(n_lines):
+                line = f.readline()
+                pos += len(line)
+            f.truncate(pos)
+
+    # ---------- morceaux synthétisés ----------
+
+    def chunk_path(self, index: int) -> str:
+        return os.path.join(self.tmp_dir, f"{index:05d}.mp3")
+
+    def is_chunk_done(self, index: int, text: str) -> bool:
+        return self._done.get(index) == _sha1(text) and os.path.exists(self.chunk_path(index))
+
+    def mark_chunk_done(self, index: int, text: str) -> None:
+        sha = _sha1(text)
+        if self._done.get(index) == sha:
+            return
+        self._done[index] = sha
+        with open(self.manifest_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"i": index, "sha1": sha}) + "\n")
+
+    @property
+    def chunks_done(self) -> int:
+        return len(self._done)
+
+    # ---------- passage de relais entre étapes ----------
+
+    def _write_atomic(self, path: str, lines: Iterable[str]) -> int:
+        part = path + ".part"
+        n = 0
+        with open(part, "w", encoding="utf-8") as f:
+            for line in lines:
+                f.write(line)
+                n += 1
+        os.replace(part, path)
+        return n
+
+    def write_chunks(self, chunks: Iterable[Tuple[int, str]]) -> int:
+        """Enregistre les morceaux (section, texte) ; retourne leur nombre."""
+        return self._write_atomic(self.chunks_path, (
+            json.dumps({"section": section, "text": text}, ensure_ascii=False) + "\n"
+            for section, text in chunks
+        ))
+
+    def read_chunks(self) -> List[Tuple[int, str]]:
+        return [(rec["section"], rec["text"]) for rec in _read_jsonl(self.chunks_path)]
+
+    def save_state(self, name: str, data) -> None:
+        self._write_atomic(os.path.join(self.tmp_dir, f"{name}.json"), [json.dumps(data, ensure_ascii=False)])
+
+    def load_state(self, name: str):
+        with open(os.path.join(self.tmp_dir, f"{name}.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
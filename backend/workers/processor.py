@@ -1,86 +1,381 @@
 # backend/workers/processor.py
-import os, uuid, asyncio, traceback
-from ..services.extract import extract_text_from_pdf
-from ..services.tts import synthesize
-from ..services.post_audio import concat_and_normalize, make_m4b_from_mp3
-from ..services.storage import put_file
+import os, sys, asyncio, shutil, traceback
+from concurrent.futures import ThreadPoolExecutor
+from pdfminer.psparser import PSException
+from rq import get_current_job
+from ..services.chapters import (
+    ChapterTracker, audio_duration, build_chapters, extract_outline,
+    write_chapters_json, write_ffmetadata,
+)
+from ..services.chunking import iter_section_chunks
+from ..services.dedup import settle_followers
+from ..services.events import publish_job_event
+from ..services.extract import count_pages, iter_pages
+from ..services.hls import HlsPublisher
+from ..services.tts import TtsRequestError, max_chunk_chars, synthesize_stream
+from ..services.tts_cache import get_tts_cache
+from ..services.post_audio import assemble_audio
+from ..services.scheduler import STAGES, get_scheduler, release_job_slot
+from ..services.storage import upload_files
 from ..services.utils import safe_slug
+from .checkpoint import JobCheckpoint
+from .progress import ProgressReporter
 from ..models.db import Job, JobStatus, get_engine, get_session_maker
 from ..settings import settings
 
-engine = get_engine(settings.DATABASE_URL)
+engine = get_engine()
 Session = get_session_maker(engine)
 
-def chunk_text(text: str, max_chars: int = 1000):
-    parts, buf, count = [], [], 0
-    for line in text.splitlines():
-        if not line.strip():
-            line = "\n"
-        if count + len(line) > max_chars:
-            parts.append(" ".join(buf))
-            buf, count = [], 0
-        buf.append(line)
-        count += len(line)
-    if buf:
-        parts.append(" ".join(buf))
-    return parts
+def _tmp_dir(job_id: str) -> str:
+    return os.path.join(settings.LOCAL_STORAGE_PATH, f"tmp/{job_id}")
+
+
+def _start_hls(job_id: str) -> "HlsPublisher | None":
+    """Lecture progressive : segments HLS publiés au fil de la synthèse."""
+    return HlsPublisher(job_id, _tmp_dir(job_id)) if settings.HLS_ENABLED else None
+
+
+def _hls_chunk_done(hls, reporter, index: int, path: str) -> None:
+    if hls is None:
+        return
+    hls.add(index, path)
+    if hls.published and reporter.hls_key is None:
+        reporter.hls_key = hls.key
+        reporter.set_extra(hls_playlist_key=hls.key)
+
+
+def _close_hls(hls, reporter, ended: bool) -> None:
+    if hls is None:
+        return
+    hls.close(ended=ended)
+    if hls.published and reporter.hls_key is None:
+        reporter.hls_key = hls.key
+        reporter.set_extra(hls_playlist_key=hls.key)
+
+
+def _assemble(job_id: str, input_filename: str, wav_files, titles, chunk_sections) -> dict:
+    """Chapitres + MP3/M4B dans outputs/{job_id} ; retourne de quoi finir le job."""
+    out_dir_rel = f"outputs/{job_id}"
+    out_dir_abs = os.path.join(settings.LOCAL_STORAGE_PATH, out_dir_rel)
+    os.makedirs(out_dir_abs, exist_ok=True)
+
+    # Positions des chapitres à partir des durées réelles des morceaux
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        durations = list(pool.map(audio_duration, wav_files))
+    chapter_list = build_chapters(titles, chunk_sections, durations)
+    meta_path = os.path.join(_tmp_dir(job_id), "chapters.ffmeta")
+    write_ffmetadata(chapter_list, meta_path, title=os.path.splitext(input_filename)[0])
+    chapters_path = os.path.join(out_dir_abs, "chapters.json")
+    write_chapters_json(chapter_list, chapters_path)
+
+    # MP3 + M4B en une seule passe d'encodage (loudnorm deux passes)
+    mp3_path = os.path.join(out_dir_abs, f"{safe_slug(input_filename)}.mp3")
+    m4b_path = os.path.join(out_dir_abs, f"{safe_slug(input_filename)}.m4b")
+    timings = assemble_audio(wav_files, mp3_path, m4b_path, metadata_path=meta_path)
+    return {
+        "out_dir_rel": out_dir_rel,
+        "mp3_path": mp3_path,
+        "m4b_path": m4b_path,
+        "chapters_path": chapters_path,
+        "duration_sec": int(sum(durations)),
+        "encode_sec": timings["measure_sec"] + timings["encode_sec"],
+    }
+
+
+def _tts_cache_counts() -> tuple:
+    """(hits, misses) cumulés du cache TTS de ce processus."""
+    cache = get_tts_cache()
+    if cache is None:
+        return 0, 0
+    stats = cache.stats()
+    return stats["hits_disk"] + stats["hits_s3"], stats["misses"]
+
+
+def _tts_cache_totals(job, before: tuple) -> dict:
+    """Compteurs du job : ceux des tentatives précédentes + ceux de cette synthèse."""
+    hits, misses = _tts_cache_counts()
+    return {
+        "tts_cache_hits": (job.tts_cache_hits or 0) + hits - before[0],
+        "tts_cache_misses": (job.tts_cache_misses or 0) + misses - before[1],
+    }
+
+
+def _upload_and_finish(session, job_id: str, result: dict) -> None:
+    out_dir_rel = result["out_dir_rel"]
+    mp3_key, m4b_key, chapters_key = upload_files([
+        (result["mp3_path"], f"{out_dir_rel}/output.mp3"),
+        (result["m4b_path"], f"{out_dir_rel}/output.m4b"),
+        (result["chapters_path"], f"{out_dir_rel}/chapters.json"),
+    ])
+
+    job = session.get(Job, job_id)
+    job.status = JobStatus.DONE
+    job.output_mp3_key = mp3_key
+    job.output_m4b_key = m4b_key
+    job.chapters_json_key = chapters_key
+    # Segments HLS signés pour la durée de la synthèse : le MP3/M4B prend le relais
+    job.hls_playlist_key = None
+    job.duration_sec = result["duration_sec"]
+    job.stage = "done"
+    job.encode_sec = result["encode_sec"]
+    job.progress = 100
+    job.eta_sec = None
+    session.commit()
+    publish_job_event(job)
+    settle_followers(session, job)  # dépôts identiques arrivés pendant le traitement
+
+    shutil.rmtree(_tmp_dir(job_id), ignore_errors=True)
+
+
+# Échecs qu'une relance ne corrigera pas : le job passe en erreur sans
+# consommer les relances RQ (PDF illisible, fichier disparu, morceau trop
+# long, requête TTS refusée ou identifiants manquants, provider inconnu).
+PERMANENT_ERRORS = (PSException, FileNotFoundError, ValueError, TtsRequestError, NotImplementedError)
+
+
+def _handle_failure(session, job_id: str) -> bool:
+    """
+    Enregistre l'échec de la tâche en cours. Si RQ va la relancer (erreur
+    passagère, relances restantes), on garde les points de reprise, le job
+    repasse en attente et on retourne True (l'appelant laisse remonter
+    l'exception) ; sinon le job passe en erreur.
+    """
+    err = traceback.format_exc()
+    permanent = isinstance(sys.exc_info()[1], PERMANENT_ERRORS)
+    session.rollback()
+    job = session.get(Job, job_id)
+
+    rq_job = get_current_job()
+    if not permanent and rq_job is not None and (rq_job.retries_left or 0) > 0:
+        if job:
+            job.status = JobStatus.PENDING
+            job.error = None
+            session.commit()
+            publish_job_event(job)
+        return True
+
+    if job:
+        job.status = JobStatus.ERROR
+        job.error = err
+        job.hls_playlist_key = None
+        session.commit()
+        publish_job_event(job)
+        settle_followers(session, job)
+    return False
+
 
 def process_job(job_id: str, local_path: str, voice: str = "Rachel", lang: str = "fra"):
+    """
+    Job complet en une tâche RQ (JOB_PIPELINE=single), extraction et synthèse
+    en flux. Voir plus bas le même traitement découpé en étapes.
+    """
     session = Session()
+    user_id = None
+    retrying = False
     try:
         job = session.get(Job, job_id)
         if not job:
             return
+        user_id = job.user_id
         job.status = JobStatus.RUNNING
+        job.error = None
         session.commit()
+        input_filename = job.input_filename
+        publish_job_event(job)
+        reporter = ProgressReporter(session, job_id)
+        reporter.set_stage("extract")
 
-        text = extract_text_from_pdf(local_path, lang=lang)
-        job.preview_text = text[:1000]  # 🔹 On garde un extrait en DB
-        session.commit()
+        out_tmp_dir = _tmp_dir(job_id)
+        checkpoint = JobCheckpoint(out_tmp_dir)  # reprise après crash / relance
 
-        chunks = chunk_text(text)
-        total_chunks = len(chunks)
-        wav_files = []
-        out_tmp_dir = os.path.join(settings.LOCAL_STORAGE_PATH, f"tmp/{job_id}")
-        os.makedirs(out_tmp_dir, exist_ok=True)
-
-        for i, chunk in enumerate(chunks, start=1):
-            out_wav = os.path.join(out_tmp_dir, f"{i:05d}.mp3")
-            asyncio.run(synthesize(chunk, voice, out_wav))
-            wav_files.append(out_wav)
-
-            # 🔹 Progression en %
-            progress = int((i / total_chunks) * 100)
-            session.refresh(job)
-            job.error = f"PROGRESS::{progress}"  # Astuce : on stocke temporairement dans `error`
-            session.commit()
+        # Pipeline en flux : pages -> morceaux -> synthèse, sans attendre la fin de l'extraction
+        n_pages = count_pages(local_path)
+        state = {"pages": 0, "chunks": 0, "preview": ""}
 
-        out_dir_rel = f"outputs/{job_id}"
-        out_dir_abs = os.path.join(settings.LOCAL_STORAGE_PATH, out_dir_rel)
-        os.makedirs(out_dir_abs, exist_ok=True)
+        # Chapitres : signets du PDF, sinon titres détectés en haut de page.
+        # Un morceau n'appartient qu'à un chapitre (chunk_sections[i-1]).
+        chapters = ChapterTracker(extract_outline(local_path), default_title=os.path.splitext(input_filename)[0])
+        chunk_sections = []
 
-        mp3_path = os.path.join(out_dir_abs, f"{safe_slug(job.input_filename)}.mp3")
-        concat_and_normalize(wav_files, mp3_path)
+        def tracked_pages():
+            pages = checkpoint.iter_pages(lambda start: iter_pages(local_path, lang=lang, start_page=start))
+            for page_index, page in enumerate(pages):
+                state["pages"] += 1
+                if len(state["preview"]) < 1000:
+                    joined = state["preview"] + "\n\n" + page if state["pages"] > 1 else page
+                    state["preview"] = joined[:1000]
+                yield chapters.section_for(page_index, page), page
 
-        m4b_path = os.path.join(out_dir_abs, f"{safe_slug(job.input_filename)}.m4b")
-        make_m4b_from_mp3(mp3_path, [], m4b_path)
+        def tracked_chunks():
+            for section, chunk in iter_section_chunks(tracked_pages(), max_chars=max_chunk_chars()):
+                state["chunks"] += 1
+                chunk_sections.append(section)
+                yield chunk
 
-        mp3_url = put_file(mp3_path, f"{out_dir_rel}/output.mp3")
-        m4b_url = put_file(m4b_path, f"{out_dir_rel}/output.m4b")
+        # 🔹 Progression : le total de morceaux n'est connu qu'en fin
+        # d'extraction, on l'estime à partir des pages déjà lues.
+        done = 0
+        def on_chunk_done(i: int, path: str, chunk: str):
+            nonlocal done
+            resumed = checkpoint.is_chunk_done(i, chunk)
+            checkpoint.mark_chunk_done(i, chunk)
+            done += 1
+            if reporter.stage != "synthesize":
+                reporter.set_stage("synthesize")
+            if state["preview"] and not state.get("preview_saved"):
+                reporter.set_extra(preview_text=state["preview"])  # 🔹 On garde un extrait en DB
+                state["preview_saved"] = True
+            pages_read = max(1, state["pages"])
+            estimated_total = max(state["chunks"], int(state["chunks"] * n_pages / pages_read))
+            _hls_chunk_done(hls, reporter, i, path)
+            reporter.update(done, estimated_total, synthesized=not resumed)
 
-        job.status = JobStatus.DONE
-        job.output_mp3_url = mp3_url
-        job.output_m4b_url = m4b_url
-        job.error = None  # on efface la progression
-        session.commit()
+        hls = _start_hls(job_id)
+        cache_before = _tts_cache_counts()
+        try:
+            wav_files = asyncio.run(synthesize_stream(
+                tracked_chunks(), voice, out_tmp_dir,
+                on_done=on_chunk_done, is_done=checkpoint.is_chunk_done,
+            ))
+        except BaseException:
+            _close_hls(hls, reporter, ended=False)
+            raise
+        _close_hls(hls, reporter, ended=True)
+        reporter.chunks_done = reporter.chunks_total = len(wav_files)
+        reporter.set_stage("assemble", preview_text=state["preview"], **_tts_cache_totals(job, cache_before))
+
+        result = _assemble(job_id, input_filename, wav_files, chapters.titles, chunk_sections)
+
+        reporter.set_stage("upload")
+        _upload_and_finish(session, job_id, result)
 
     except Exception:
-        err = traceback.format_exc()
+        if _handle_failure(session, job_id):
+            retrying = True
+            raise
+    finally:
+        session.close()
+        # Fin définitive : créneau libéré, job suivant de l'utilisateur mis en file
+        if not retrying:
+            release_job_slot(user_id, job_id)
+
+
+# -------------------------------------------------
+# Pipeline par étapes (JOB_PIPELINE=stages)
+# -------------------------------------------------
+# Une tâche RQ par étape, chacune dans sa file (services/scheduler.py) :
+# l'OCR et ffmpeg (CPU) et la synthèse et l'upload (réseau) se dimensionnent
+# séparément. Les étapes se passent le relais par tmp/{job_id} (volume
+# partagé) et chaque étape réussie met la suivante en file.
+
+def _run_stage(stage: str, job_id: str, local_path: str, voice: str, lang: str, body) -> None:
+    session = Session()
+    user_id = None
+    finished = False
+    try:
         job = session.get(Job, job_id)
-        if job:
-            job.status = JobStatus.ERROR
-            job.error = err
+        if not job:
+            return
+        user_id = job.user_id
+        if job.status != JobStatus.RUNNING:
+            job.status = JobStatus.RUNNING
+            job.error = None
             session.commit()
+            publish_job_event(job)
+        reporter = ProgressReporter(session, job_id)
+        reporter.resume_from(job)
+        reporter.set_stage(stage)
+
+        body(session, job, reporter, JobCheckpoint(_tmp_dir(job_id)))
+
+        next_index = STAGES.index(stage) + 1
+        if next_index < len(STAGES):
+            get_scheduler().enqueue_stage(STAGES[next_index], {
+                "job_id": job_id, "user_id": user_id, "input_path": local_path,
+                "voice": voice, "lang": lang, "pages": job.page_count,
+            })
+        else:
+            finished = True
+    except Exception:
+        if _handle_failure(session, job_id):
+            raise
+        finished = True
     finally:
         session.close()
+        # Fin définitive : créneau libéré, job suivant de l'utilisateur mis en file
+        if finished:
+            release_job_slot(user_id, job_id)
+
+
+def extract_stage(job_id: str, local_path: str, voice: str = "Rachel", lang: str = "fra"):
+    """Texte (OCR si besoin) -> chapitres -> morceaux, enregistrés dans tmp/{job_id}."""
+    def body(session, job, reporter, checkpoint):
+        chapters = ChapterTracker(extract_outline(local_path), default_title=os.path.splitext(job.input_filename)[0])
+        preview = []
+
+        def sections():
+            pages = checkpoint.iter_pages(lambda start: iter_pages(local_path, lang=lang, start_page=start))
+            for page_index, page in enumerate(pages):
+                if sum(map(len, preview)) < 1000:
+                    preview.append(page)
+                yield chapters.section_for(page_index, page), page
+
+        n_chunks = checkpoint.write_chunks(iter_section_chunks(sections(), max_chars=max_chunk_chars()))
+        checkpoint.save_state("chapters", chapters.titles)
+        reporter.chunks_total = n_chunks
+        reporter.set_stage("extract", preview_text="\n\n".join(preview)[:1000])
+
+    _run_stage("extract", job_id, local_path, voice, lang, body)
+
+
+def synthesize_stage(job_id: str, local_path: str, voice: str = "Rachel", lang: str = "fra"):
+    """Synthèse des morceaux absents ou modifiés (reprise via le manifeste)."""
+    def body(session, job, reporter, checkpoint):
+        chunks = checkpoint.read_chunks()
+        done = 0
+
+        def on_chunk_done(i: int, path: str, chunk: str):
+            nonlocal done
+            resumed = checkpoint.is_chunk_done(i, chunk)
+            checkpoint.mark_chunk_done(i, chunk)
+            done += 1
+            _hls_chunk_done(hls, reporter, i, path)
+            reporter.update(done, len(chunks), synthesized=not resumed)
+
+        hls = _start_hls(job_id)
+        cache_before = _tts_cache_counts()
+        try:
+            asyncio.run(synthesize_stream(
+                (text for _, text in chunks), voice, checkpoint.tmp_dir,
+                on_done=on_chunk_done, is_done=checkpoint.is_chunk_done,
+            ))
+        except BaseException:
+            _close_hls(hls, reporter, ended=False)
+            raise
+        _close_hls(hls, reporter, ended=True)
+        reporter.set_extra(**_tts_cache_totals(job, cache_before))
+        reporter.flush()
+
+    _run_stage("synthesize", job_id, local_path, voice, lang, body)
+
+
+def assemble_stage(job_id: str, local_path: str, voice: str = "Rachel", lang: str = "fra"):
+    """Chapitres + encodage MP3/M4B (ffmpeg)."""
+    def body(session, job, reporter, checkpoint):
+        chunks = checkpoint.read_chunks()
+        wav_files = [checkpoint.chunk_path(i) for i in range(1, len(chunks) + 1)]
+        result = _assemble(
+            job_id, job.input_filename, wav_files,
+            checkpoint.load_state("chapters"), [section for section, _ in chunks],
+        )
+        checkpoint.save_state("assemble", result)
+
+    _run_stage("assemble", job_id, local_path, voice, lang, body)
+
+
+def upload_stage(job_id: str, local_path: str, voice: str = "Rachel", lang: str = "fra"):
+    """Envoi des livrables, job terminé."""
+    def body(session, job, reporter, checkpoint):
+        _upload_and_finish(session, job_id, checkpoint.load_state("assemble"))
 
+    _run_stage("upload", job_id, local_path, voice, lang, body)
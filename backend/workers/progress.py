@@ -0,0 +1,137 @@
+# backend/workers/progress.py
+"""
+Progression d'un job, écrite par lots.
+
+Le worker appelle `update()` à chaque morceau, mais la ligne Job n'est mise à
+jour (un seul UPDATE, sans relecture) que si le pourcentage a bougé et que
+PROGRESS_MIN_INTERVAL_SEC secondes se sont écoulées ou que le pourcentage a
+avancé d'au moins PROGRESS_MIN_STEP points. Les événements Redis, eux, partent
+à chaque appel : ils ne coûtent rien à la base.
+"""
+import time
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import update
+
+from ..models.db import Job, JobStatus
+from ..services.events import job_version, publish_payload
+from ..services.storage import output_url
+from ..settings import settings
+
+
+class ProgressReporter:
+    def __init__(self, session, job_id: str, min_interval: Optional[float] = None, min_step: Optional[int] = None):
+        self.session = session
+        self.job_id = job_id
+        self.min_interval = settings.PROGRESS_MIN_INTERVAL_SEC if min_interval is None else min_interval
+        self.min_step = settings.PROGRESS_MIN_STEP if min_step is None else min_step
+
+        self.stage: Optional[str] = None
+        self.chunks_done = 0
+        self.chunks_total: Optional[int] = None
+        self.percent = 0
+        self.eta_sec: Optional[int] = None
+        self.hls_key: Optional[str] = None  # playlist HLS déjà publiée
+        self.writes = 0
+
+        self._last_write_at = 0.0
+        self._last_written_percent = -1
+        self._rate_started_at: Optional[float] = None
+        self._rate_count = 0
+        self._extra: dict = {}
+        self._updated_at: Optional[datetime] = None
+
+    # ---------- API ----------
+
+    def resume_from(self, job) -> None:
+        """Repart de la progression déjà enregistrée (étape suivante d'un job)."""
+        self.chunks_done = job.chunks_done or 0
+        self.chunks_total = job.chunks_total
+        self.percent = job.progress or 0
+        self.hls_key = job.hls_playlist_key
+        self._last_written_percent = self.percent
+
+    def set_stage(self, stage: str, **extra) -> None:
+        """Changement d'étape : toujours écrit immédiatement."""
+        self.stage = stage
+        if stage != "synthesize":
+            self.eta_sec = None
+        self._extra.update(extra)
+        self._write()
+
+    def set_extra(self, **extra) -> None:
+        """Colonnes Job à écrire avec la prochaine mise à jour (ex: preview_text)."""
+        self._extra.update(extra)
+
+    def flush(self) -> None:
+        """Écrit tout de suite l'état courant et les colonnes en attente."""
+        self._write()
+
+    def update(self, chunks_done: int, chunks_total: Optional[int], synthesized: bool = True) -> None:
+        """
+        Un morceau de plus est prêt. `synthesized=False` pour un morceau repris
+        d'un point de contrôle (n'entre pas dans le calcul de l'ETA).
+        """
+        now = time.monotonic()
+        if synthesized:
+            if self._rate_started_at is None:
+                self._rate_started_at = now
+            self._rate_count += 1
+
+        self.chunks_done = chunks_done
+        self.chunks_total = chunks_total
+        if chunks_total:
+            self.percent = min(99, int(chunks_done * 100 / chunks_total))
+            if self._rate_count > 1:
+                per_chunk = (now - self._rate_started_at) / (self._rate_count - 1)
+                self.eta_sec = int(per_chunk * max(0, chunks_total - chunks_done))
+
+        moved = self.percent != self._last_written_percent
+        if moved and ((now - self._last_write_at) >= self.min_interval or
+                      (self.percent - self._last_written_percent) >= self.min_step):
+            self._write()
+        else:
+            self._publish()
+
+    def as_dict(self) -> dict:
+        return {
+            "stage": self.stage,
+            "chunks_done": self.chunks_done,
+            "chunks_total": self.chunks_total,
+            "percent": self.percent,
+            "eta_sec": self.eta_sec,
+        }
+
+    # ---------- écriture ----------
+
+    def _write(self) -> None:
+        values = {
+            "stage": self.stage,
+            "chunks_done": self.chunks_done,
+            "chunks_total": self.chunks_total,
+            "progress": self.percent,
+            "eta_sec": self.eta_sec,
+            **self._extra,
+            "updated_at": datetime.utcnow(),
+        }
+        self._updated_at = values["updated_at"]
+        self.session.execute(update(Job).where(Job.id == self.job_id).values(**values))
+        self.session.commit()
+        self._extra = {}
+        self.writes += 1
+        self._last_write_at = time.monotonic()
+        self._last_written_percent = self.percent
+        self._publish()
+
+    def _publish(self) -> None:
+        publish_payload(self.job_id, {
+            "id": self.job_id,
+            "status": JobStatus.RUNNING.value,
+            "mp3": None,
+            "m4b": None,
+            "hls": output_url(self.hls_key),
+            "error": None,
+            "progress": self.as_dict(),
+            "version": job_version(self._updated_at),
+        })
@@ -58,8 +58,10 @@ const PDFExtractor = ({ file, onExtractionComplete, onError }) => {
 
   const handleJobUpdate = (data) => {
     try {
-      // Extraire la progression depuis le message d'erreur (astuce du backend)
-      if (data.error && data.error.startsWith('PROGRESS::')) {
+      // Progression structurée (ancien format PROGRESS:: dans `error` en repli)
+      if (data.progress && typeof data.progress.percent === 'number') {
+        setExtractionProgress(data.progress.percent);
+      } else if (data.error && data.error.startsWith('PROGRESS::')) {
         const progress = parseInt(data.error.split('::')[1]);
         setExtractionProgress(progress);
       }
@@ -54,7 +54,9 @@ export default function Convert() {
           try {
             const d = JSON.parse(ev.data);
             if (d.status) setStatus(d.status);
-            if (typeof d.error === "string" && d.error.startsWith("PROGRESS::")) {
+            if (d.progress && typeof d.progress.percent === "number") {
+              setProgress(d.progress.percent);
+            } else if (typeof d.error === "string" && d.error.startsWith("PROGRESS::")) {
               const p = Number(d.error.split("::")[1] || "0");
               if (!Number.isNaN(p)) setProgress(p);
             }
@@ -120,7 +122,9 @@ export default function Convert() {
       const r = await fetch(`${API_BASE}/api/jobs/${jobId}`);
       const d = await r.json();
       if (d.status) setStatus(d.status);
-      if (typeof d.error === "string" && d.error.startsWith("PROGRESS::")) {
+      if (d.progress && typeof d.progress.percent === "number") {
+        setProgress(d.progress.percent);
+      } else if (typeof d.error === "string" && d.error.startsWith("PROGRESS::")) {
         const p = Number(d.error.split("::")[1] || "0");
         if (!Number.isNaN(p)) setProgress(p);
       }
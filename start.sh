@@ -1,8 +1,13 @@
 #!/usr/bin/env bash
 set -e
 
-# Lancer le worker RQ en arrière-plan
-rq worker --url "${REDIS_URL}" "${RQ_QUEUE_NAME:-mvp_jobs}" &
+# Déploiement tout-en-un (Dockerfile, Render) : API et un seul worker dans le
+# même conteneur, job en une tâche (extraction et synthèse en flux).
+# docker-compose.yml n'utilise pas ce script pour l'API (pipeline par étapes).
+export JOB_PIPELINE="${JOB_PIPELINE:-single}"
+
+# Lancer le worker RQ en arrière-plan (toutes les files, par priorité)
+rq worker --with-scheduler --url "${REDIS_URL}" $(python -m backend.services.scheduler upload assemble synthesize extract --single) &
 
 # Lancer l'API FastAPI
 exec uvicorn backend.main:app --host 0.0.0.0 --port 8000